@@ -0,0 +1,262 @@
+"""
+Asyncio-native currency converter with request coalescing
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List
+
+from currency_converter import CurrencyConverter
+from http_transport import BACKOFF_FACTOR, BACKOFF_MAX, RETRY_STATUSES, retry_delay
+from lazy_import import lazy_module
+from rate_cache import RateCache
+from rate_limiter import RateLimiter, get_default_limiter
+from rate_providers import RateProvider, RateProviderError
+from rate_snapshot import RateSnapshot
+from records import ConversionResult, HistoryRecord
+
+aiohttp = lazy_module('aiohttp')
+
+
+class AsyncCurrencyConverter:
+    def __init__(self, api_key: str = None, cache_ttl: float = 300.0, cache_size: int = 1024,
+                 pivot_currency: str = 'USD', max_concurrency: int = 8, timeout: float = 10.0,
+                 base_url: str = "https://api.exchangerate.host",
+                 provider: Optional[RateProvider] = None,
+                 db_path: str = 'currency_data.db',
+                 rate_limiter: Optional[RateLimiter] = None, max_retries: int = 3):
+        """
+        Initialize the async converter
+
+        Mirrors CurrencyConverter's API with coroutines. HTTP is non-blocking,
+        concurrent identical lookups share one upstream fetch, and SQLite work
+        runs on a single dedicated thread so the event loop never blocks on it.
+
+        Rates come from the exchangerate.host-compatible API at ``base_url``
+        through aiohttp, or from ``provider`` (any RateProvider, e.g. a
+        FileRateProvider for offline use) whose blocking calls run on worker
+        threads. Rates and history are stored in the SQLite database at
+        ``db_path``.
+
+        aiohttp requests take a token from ``rate_limiter`` (by default the
+        limiter shared with HttpTransport) without blocking the loop. A 429 or
+        Retry-After pauses the host and is retried up to ``max_retries`` times.
+        """
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.provider = provider
+        self.rate_cache = RateCache(max_size=cache_size, ttl=cache_ttl)
+        self.pivot_currency = pivot_currency.upper()
+        self.snapshot: Optional[RateSnapshot] = None
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or get_default_limiter()
+        self.max_retries = max_retries
+        self.upstream_requests = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._db_executor = ThreadPoolExecutor(max_workers=1)
+        # Queries run on the executor thread; buffered writes are flushed from the
+        # store's write-behind thread. Both borrow connections from its pool.
+        self._store: CurrencyConverter = self._db_executor.submit(
+            CurrencyConverter, api_key, cache_ttl, 0, pivot_currency, db_path=db_path).result()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _db(self, func, *args):
+        """Run a SQLite operation on the database thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, func, *args)
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit_per_host=self.max_concurrency))
+        return self._session
+
+    async def _get_json(self, url: str, params: Dict) -> Dict:
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire_async(url)
+            self.upstream_requests += 1
+            async with self._get_session().get(url, params=params) as response:
+                retry_after = response.headers.get('Retry-After')
+                if response.status == 429 or (retry_after and response.status in RETRY_STATUSES):
+                    # The next acquire waits out the pause, like every other client of the host
+                    delay = retry_delay(attempt, BACKOFF_FACTOR, BACKOFF_MAX, retry_after)
+                    self.rate_limiter.throttle(url, delay)
+                    if attempt < self.max_retries:
+                        continue
+                elif response.status < 400:
+                    self.rate_limiter.reward(url)
+                response.raise_for_status()
+                return await response.json(content_type=None)
+
+    async def _call_provider(self, func, *args):
+        """Run a blocking RateProvider call on a worker thread"""
+        self.upstream_requests += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    async def _coalesce(self, key: tuple, factory):
+        """
+        Await the in-flight task for key, starting one with factory() if none
+        is running, so simultaneous identical lookups hit upstream once
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def get_rate_snapshot(self, force_refresh: bool = False) -> Optional[RateSnapshot]:
+        """
+        Get the pivot currency rate table, refetching it once the cache TTL has
+        passed. Raises aiohttp.ClientError, asyncio.TimeoutError or
+        RateProviderError on failure.
+        """
+        if (not force_refresh and self.snapshot is not None
+                and self.snapshot.is_fresh(self.rate_cache.ttl)):
+            return self.snapshot
+
+        return await self._coalesce(('snapshot', self.pivot_currency), self._fetch_snapshot)
+
+    async def _fetch_snapshot(self) -> Optional[RateSnapshot]:
+        if self.provider is not None:
+            snapshot = await self._call_provider(self.provider.get_snapshot, self.pivot_currency)
+            if snapshot is not None:
+                self.snapshot = snapshot
+            return snapshot
+
+        data = await self._get_json(f"{self.base_url}/latest", {'base': self.pivot_currency})
+
+        if not data.get('success', False) or not data.get('rates'):
+            return None
+
+        self.snapshot = RateSnapshot(self.pivot_currency, data['rates'], data.get('date'))
+        return self.snapshot
+
+    async def get_real_time_rate(self, from_currency: str, to_currency: str) -> Optional[float]:
+        """
+        Get real-time exchange rate, triangulated from the pivot snapshot
+        """
+        return (await self._lookup_rate(from_currency, to_currency))[0]
+
+    async def _lookup_rate(self, from_currency: str, to_currency: str):
+        """
+        Resolve a rate once as (rate, source, age, timestamp), like
+        CurrencyConverter._lookup_rate
+        """
+        cached = self.rate_cache.get_with_age(from_currency, to_currency)
+        if cached is not None:
+            return cached[0], 'cache', cached[1], cached[2]
+
+        previous = self.snapshot
+        try:
+            snapshot = await self.get_rate_snapshot()
+
+        except (aiohttp.ClientError, asyncio.TimeoutError, RateProviderError) as e:
+            print(f"Error fetching real-time rate: {e}")
+            rate = await self._db(self._store._get_cached_rate, from_currency, to_currency)
+            if rate is not None:
+                self.rate_cache.set(from_currency, to_currency, rate, float('-inf'))
+            return rate, 'database', None, None
+
+        if snapshot is None:
+            return None, None, None, None
+
+        rate = snapshot.rate(from_currency, to_currency)
+        if not rate:
+            return None, None, None, None
+
+        self.rate_cache.set(from_currency, to_currency, rate, snapshot.fetched_at,
+                            snapshot.timestamp)
+        await self._db(self._store._cache_rate, from_currency, to_currency, rate)
+        return (rate, 'fetched' if snapshot is not previous else 'snapshot', snapshot.age(),
+                snapshot.timestamp)
+
+    async def convert_currency(self, amount: float, from_currency: str,
+                               to_currency: str) -> Optional[ConversionResult]:
+        """
+        Convert currency amount from one currency to another
+        """
+        rate, source, age, timestamp = await self._lookup_rate(from_currency, to_currency)
+
+        if rate is None:
+            print(f"Could not get exchange rate for {from_currency} to {to_currency}")
+            return None
+
+        converted_amount = amount * rate
+
+        await self._db(self._store._save_conversion_history,
+                       amount, from_currency, to_currency, converted_amount, rate)
+
+        return ConversionResult(amount, from_currency.upper(), to_currency.upper(),
+                                converted_amount, rate, timestamp, source, age)
+
+    async def get_historical_rates(self, base_currency: str, target_currency: str,
+                                   days: int = 30) -> List[Dict]:
+        """
+        Get historical exchange rates for the specified period
+
+        Stored dates are served from SQLite; missing dates are fetched
+        concurrently, at most max_concurrency at a time, and persisted.
+        """
+        base_currency = base_currency.upper()
+        target_currency = target_currency.upper()
+        dates = [(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+        if not dates:
+            return []
+
+        rates = await self._db(self._store._get_stored_rates,
+                               base_currency, target_currency, dates[-1], dates[0])
+        missing = [date for date in dates if date not in rates]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch(date):
+            async with semaphore:
+                return await self._coalesce(
+                    ('historical', base_currency, target_currency, date),
+                    lambda: self._fetch_historical_rate(base_currency, target_currency, date))
+
+        results = await asyncio.gather(*(fetch(date) for date in missing))
+        fetched = {date: rate for date, rate in zip(missing, results) if rate}
+
+        if fetched:
+            await self._db(self._store._store_rates, base_currency, target_currency, fetched)
+            rates.update(fetched)
+
+        return [{'date': date, 'rate': rates[date]} for date in dates if date in rates]
+
+    async def _fetch_historical_rate(self, base_currency: str, target_currency: str,
+                                     date: str) -> Optional[float]:
+        try:
+            if self.provider is not None:
+                return await self._call_provider(self.provider.get_rate,
+                                                 base_currency, target_currency, date)
+            data = await self._get_json(f"{self.base_url}/{date}",
+                                        {'base': base_currency, 'symbols': target_currency})
+        except (aiohttp.ClientError, asyncio.TimeoutError, RateProviderError) as e:
+            print(f"Error fetching historical data for {date}: {e}")
+            return None
+
+        if data.get('success', False):
+            return data['rates'].get(target_currency)
+        return None
+
+    async def get_conversion_history(self, limit: int = 10) -> List[HistoryRecord]:
+        """Get recent conversion history"""
+        return await self._db(self._store.get_conversion_history, limit)
+
+    async def close(self):
+        """Close the HTTP session and database connection"""
+        if self._session is not None:
+            await self._session.close()
+        await self._db(self._store.close)
+        self._db_executor.shutdown(wait=True)
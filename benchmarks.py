@@ -0,0 +1,395 @@
+"""
+Benchmarks for the currency converter
+
+Everything runs offline against a local mock rate server with injectable
+latency. Run with ``python benchmarks.py``; results are printed and can be
+written as JSON with ``--json results.json`` to compare releases.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Dict, List
+
+from currency_converter import CurrencyConverter
+from db_schema import MIGRATIONS, migrate
+from http_transport import HttpTransport
+from mock_rate_server import MockRateServer, StaticRateProvider
+from rate_providers import ExchangeRateHostProvider
+
+CURRENCIES = ['USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD', 'CHF', 'CNY', 'INR', 'BRL',
+              'MXN', 'SEK', 'NOK', 'DKK', 'PLN', 'ZAR', 'SGD', 'HKD', 'NZD', 'KRW']
+
+
+def _timed(func, repeat: int) -> float:
+    """Average seconds per call of func over repeat calls"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+@contextlib.contextmanager
+def _temp_workdir():
+    """Run inside a fresh directory so each benchmark gets an empty database"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            yield tmp
+        finally:
+            os.chdir(cwd)
+
+
+class _PerDateProvider(ExchangeRateHostProvider):
+    """exchangerate.host provider with the time-series endpoint disabled"""
+    supports_range = False
+
+
+def _converter(server: MockRateServer, transport: HttpTransport, per_date: bool = False,
+               **kwargs) -> CurrencyConverter:
+    provider_class = _PerDateProvider if per_date else ExchangeRateHostProvider
+    return CurrencyConverter(provider=provider_class(server.url, transport), **kwargs)
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _fill_exchange_rates(conn: sqlite3.Connection, rows: int, batch: int = 100000):
+    """Insert `rows` distinct (pair, date) rates going back from today"""
+    pairs = [(base, target) for base in CURRENCIES for target in CURRENCIES if base != target]
+    today = date.today()
+    cursor = conn.cursor()
+
+    def generate():
+        for i in range(rows):
+            base, target = pairs[i % len(pairs)]
+            day = (today - timedelta(days=i // len(pairs))).isoformat()
+            yield base, target, random.uniform(0.5, 2.0), day
+
+    data = generate()
+    while True:
+        chunk = [row for _, row in zip(range(batch), data)]
+        if not chunk:
+            break
+        cursor.executemany('''
+            INSERT OR REPLACE INTO exchange_rates (base_currency, target_currency, rate, date)
+            VALUES (?, ?, ?, ?)
+        ''', chunk)
+    conn.commit()
+
+
+def bench_rate_lookup(sizes: List[int], lookups: int = 2000, indexed: bool = True) -> List[Dict]:
+    """
+    Measure exchange_rates point and 30-day range lookup latency as the table
+    grows. With indexed=False only the original unindexed schema is used.
+    """
+    results = []
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+            if indexed:
+                migrate(conn)
+            else:
+                for statement in MIGRATIONS[0]:
+                    conn.execute(statement)
+
+            _fill_exchange_rates(conn, size)
+            today = date.today().isoformat()
+            month_ago = (date.today() - timedelta(days=30)).isoformat()
+
+            point = _timed(lambda: conn.execute('''
+                SELECT rate FROM exchange_rates
+                WHERE base_currency = ? AND target_currency = ? AND date = ?
+            ''', (random.choice(CURRENCIES[:10]), random.choice(CURRENCIES[10:]), today)).fetchone(),
+                lookups)
+            scan = _timed(lambda: conn.execute('''
+                SELECT date, rate FROM exchange_rates
+                WHERE base_currency = ? AND target_currency = ? AND date BETWEEN ? AND ?
+            ''', (random.choice(CURRENCIES[:10]), random.choice(CURRENCIES[10:]),
+                  month_ago, today)).fetchall(), max(1, lookups // 10))
+            conn.close()
+
+        results.append({
+            'benchmark': 'rate_lookup',
+            'indexed': indexed,
+            'rows': size,
+            'point_lookup_us': point * 1e6,
+            'range_30d_lookup_us': scan * 1e6
+        })
+        print(f"rate_lookup indexed={indexed} rows={size:>11,}: "
+              f"point {point * 1e6:8.1f} us, 30-day range {scan * 1e6:8.1f} us")
+
+    return results
+
+
+def bench_single_conversion(server: MockRateServer, repeat: int = 20) -> List[Dict]:
+    """Latency of one convert_currency call with a cold and a warm converter"""
+    cold, warm = [], []
+    transport = HttpTransport()
+
+    with _temp_workdir():
+        for _ in range(repeat):
+            converter = _converter(server, transport)
+            start = time.perf_counter()
+            converter.convert_currency(100, 'EUR', 'JPY')
+            cold.append(time.perf_counter() - start)
+
+            for _ in range(10):
+                start = time.perf_counter()
+                converter.convert_currency(100, 'EUR', 'JPY')
+                warm.append(time.perf_counter() - start)
+            converter.close()
+    transport.close()
+
+    results = []
+    for state, samples in (('cold', cold), ('warm', warm)):
+        results.append({
+            'benchmark': 'single_conversion',
+            'state': state,
+            'latency': server.latency,
+            'samples': len(samples),
+            'p50_us': _percentile(samples, 50) * 1e6,
+            'p99_us': _percentile(samples, 99) * 1e6
+        })
+        print(f"single_conversion {state}: p50 {results[-1]['p50_us']:10.1f} us, "
+              f"p99 {results[-1]['p99_us']:10.1f} us")
+    return results
+
+
+def bench_conversion_throughput(server: MockRateServer, count: int = 20000) -> List[Dict]:
+    """Warm conversions per second for convert_currency and convert_many"""
+    pairs = [(base, target) for base in CURRENCIES[:10] for target in CURRENCIES[:10]
+             if base != target]
+    rows = [pairs[i % len(pairs)] for i in range(count)]
+    amounts = [random.uniform(1, 1000) for _ in range(count)]
+    transport = HttpTransport()
+    results = []
+
+    with _temp_workdir():
+        converter = _converter(server, transport)
+        converter.convert_many(amounts[:len(pairs)], *zip(*pairs), save_history=False)
+
+        start = time.perf_counter()
+        for amount, (base, target) in zip(amounts, rows):
+            converter.convert_currency(amount, base, target)
+        elapsed = time.perf_counter() - start
+        results.append({'benchmark': 'conversion_throughput', 'api': 'convert_currency',
+                        'rows': count, 'rows_per_sec': count / elapsed})
+
+        from_codes, to_codes = zip(*rows)
+        start = time.perf_counter()
+        converter.convert_many(amounts, from_codes, to_codes)
+        elapsed = time.perf_counter() - start
+        results.append({'benchmark': 'conversion_throughput', 'api': 'convert_many',
+                        'rows': count, 'rows_per_sec': count / elapsed})
+        converter.close()
+    transport.close()
+
+    for result in results:
+        print(f"conversion_throughput {result['api']}: {result['rows_per_sec']:12,.0f} rows/sec")
+    return results
+
+
+def bench_historical(server: MockRateServer, days_list: List[int]) -> List[Dict]:
+    """
+    Wall time of get_historical_rates: cold with the time-series endpoint, cold
+    with one request per date, and warm (served from SQLite)
+    """
+    results = []
+    transport = HttpTransport()
+
+    for days in days_list:
+        for mode in ('timeseries', 'per_date'):
+            with _temp_workdir():
+                converter = _converter(server, transport, per_date=(mode == 'per_date'))
+                requests_before = server.requests
+                start = time.perf_counter()
+                data = converter.get_historical_rates('EUR', 'JPY', days)
+                cold = time.perf_counter() - start
+                upstream = server.requests - requests_before
+
+                start = time.perf_counter()
+                converter.get_historical_rates('EUR', 'JPY', days)
+                warm = time.perf_counter() - start
+                converter.close()
+
+            results.append({
+                'benchmark': 'historical_rates',
+                'mode': mode,
+                'days': days,
+                'rows': len(data),
+                'upstream_requests': upstream,
+                'cold_seconds': cold,
+                'warm_seconds': warm
+            })
+            print(f"historical_rates {mode:>10} days={days:>3}: cold {cold:8.3f} s "
+                  f"({upstream} requests), warm {warm * 1000:8.2f} ms")
+    transport.close()
+    return results
+
+
+def bench_history_db(rows: int = 50000, queries: int = 200) -> List[Dict]:
+    """SQLite conversion_history insert and query throughput"""
+    with _temp_workdir():
+        converter = CurrencyConverter()
+
+        start = time.perf_counter()
+        for i in range(rows):
+            converter._save_conversion_history(i, 'USD', 'EUR', i * 0.9, 0.9)
+        converter._writer.flush()
+        insert = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(queries):
+            converter.get_conversion_history(100)
+        query = time.perf_counter() - start
+        converter.close()
+
+    result = {
+        'benchmark': 'history_db',
+        'rows': rows,
+        'inserts_per_sec': rows / insert,
+        'queries_per_sec': queries / query
+    }
+    print(f"history_db: {result['inserts_per_sec']:12,.0f} inserts/sec, "
+          f"{result['queries_per_sec']:10,.0f} queries/sec (100 rows each)")
+    return [result]
+
+
+def _fill_conversion_history(conn: sqlite3.Connection, rows: int, batch: int = 100000):
+    """Insert `rows` conversions spread evenly over the last year"""
+    start = time.time() - 365 * 86400
+    step = 365 * 86400 / rows
+    cursor = conn.cursor()
+
+    def generate():
+        for i in range(rows):
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(start + i * step))
+            yield 100.0, CURRENCIES[i % len(CURRENCIES)], 'EUR', 90.0, 0.9, stamp
+
+    data = generate()
+    while True:
+        chunk = [row for _, row in zip(range(batch), data)]
+        if not chunk:
+            break
+        cursor.executemany('''
+            INSERT INTO conversion_history
+            (amount, from_currency, to_currency, converted_amount, rate, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', chunk)
+    conn.commit()
+
+
+def bench_history_export(rows: int = 200000) -> List[Dict]:
+    """Streaming history export (cli --export): whole table and one filtered month"""
+    from cli_interface import export_history
+
+    results = []
+    with _temp_workdir():
+        converter = CurrencyConverter()
+        with converter.db_pool.connection() as conn:
+            _fill_conversion_history(conn, rows)
+        month = {
+            'start': time.strftime('%Y-%m-%d', time.gmtime(time.time() - 60 * 86400)),
+            'end': time.strftime('%Y-%m-%d', time.gmtime(time.time() - 30 * 86400)),
+            'from_currency': 'USD'
+        }
+
+        for label, fmt, filters in (('all', 'csv', {}), ('all', 'jsonl', {}),
+                                    ('month_usd', 'csv', month)):
+            with open(os.devnull, 'w', encoding='utf-8') as sink:
+                start = time.perf_counter()
+                exported = export_history(converter, sink, fmt, **filters)
+                elapsed = time.perf_counter() - start
+            result = {
+                'benchmark': 'history_export',
+                'rows': rows,
+                'filter': label,
+                'format': fmt,
+                'exported': exported,
+                'rows_per_sec': exported / elapsed
+            }
+            results.append(result)
+            print(f"history_export {label:>9} {fmt:>5}: {exported:9,} rows, "
+                  f"{result['rows_per_sec']:12,.0f} rows/sec")
+        converter.close()
+    return results
+
+
+BENCHMARKS = ['single', 'throughput', 'historical', 'history_db', 'history_export', 'rate_lookup']
+
+
+def run_benchmarks(names: List[str], latency: float = 0.0, days_list: List[int] = (7, 30, 365),
+                   sizes: List[int] = (10000, 100000, 1000000), unindexed: bool = False,
+                   export_rows: int = 200000) -> Dict:
+    """Run the selected benchmarks against a local mock server"""
+    results = []
+
+    with MockRateServer(StaticRateProvider(CURRENCIES), latency=latency) as server:
+        if 'single' in names:
+            results += bench_single_conversion(server)
+        if 'throughput' in names:
+            results += bench_conversion_throughput(server)
+        if 'historical' in names:
+            results += bench_historical(server, days_list)
+
+    if 'history_db' in names:
+        results += bench_history_db()
+    if 'history_export' in names:
+        results += bench_history_export(export_rows)
+    if 'rate_lookup' in names:
+        results += bench_rate_lookup(sizes)
+        if unindexed:
+            results += bench_rate_lookup(sizes, lookups=20, indexed=False)
+
+    return {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'mock_latency': latency,
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Currency converter benchmarks')
+    parser.add_argument('benchmarks', nargs='*',
+                        help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds of injected latency per mock server request')
+    parser.add_argument('--days', type=int, nargs='+', default=[7, 30, 365],
+                        help='history lengths for the historical benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='exchange_rates table sizes for the lookup benchmark')
+    parser.add_argument('--unindexed', action='store_true',
+                        help='also run the lookup benchmark against the original schema')
+    parser.add_argument('--export-rows', type=int, default=200000,
+                        help='conversion_history size for the export benchmark')
+    parser.add_argument('--json', dest='json_path', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    report = run_benchmarks(args.benchmarks or BENCHMARKS, args.latency, args.days,
+                            args.sizes, args.unindexed, args.export_rows)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,23 +3,332 @@ Command-line interface for the currency converter
 """
 
 import argparse
+import contextlib
 from currency_converter import CurrencyConverter
+from db_maintenance import DEFAULT_RETENTION_DAYS
+from records import HistoryRecord
 from datetime import datetime
+from itertools import islice
+from operator import attrgetter
+import csv
+import json
+import math
 import sys
+import time
+
+OUTPUT_FIELDS = ['amount', 'from_currency', 'to_currency', 'converted_amount']
+
+def _detect_format(path, default='csv'):
+    """Guess the stream format from a file extension"""
+    if path and path != '-' and path.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return default
+
+def _parse_row(record):
+    """Validate one input record as an (amount, from_currency, to_currency) tuple"""
+    if not isinstance(record, dict):
+        raise ValueError("expected an object with amount, from and to")
+    
+    amount = record.get('amount')
+    try:
+        value = float(amount)
+    except (TypeError, ValueError):
+        value = math.nan
+    if not math.isfinite(value):
+        raise ValueError(f"invalid amount {amount!r}")
+    
+    codes = []
+    for name in ('from', 'to'):
+        code = record.get(f'{name}_currency') or record.get(name)
+        if not isinstance(code, str) or not code.strip():
+            raise ValueError(f"missing '{name}' currency")
+        codes.append(code)
+    return value, codes[0], codes[1]
+
+def _json_records(stream, on_reject):
+    """Yield (line number, record) for each non-blank JSONL line"""
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            on_reject(line_number, f"invalid JSON ({e})")
+            continue
+        yield line_number, record
+
+def _read_rows(stream, fmt, on_reject):
+    """
+    Yield (amount, from_currency, to_currency) tuples from CSV or JSONL
+    
+    Rows that fail validation are skipped and passed to
+    on_reject(line number, reason).
+    """
+    if fmt == 'jsonl':
+        records = _json_records(stream, on_reject)
+    else:
+        reader = csv.DictReader(stream)
+        records = ((reader.line_num, record) for record in reader)
+    
+    for line_number, record in records:
+        try:
+            row = _parse_row(record)
+        except ValueError as e:
+            on_reject(line_number, str(e))
+            continue
+        yield row
+
+def stream_conversions(converter, input_stream, output_stream, input_format='csv',
+                       output_format='csv', chunk_size=10000, save_history=False,
+                       error_stream=None):
+    """
+    Convert rows from input_stream to output_stream chunk by chunk
+    
+    Only one chunk is held in memory at a time and rate lookups go through the
+    converter's cache, so they are shared across the whole stream. Malformed
+    rows are reported on error_stream (stderr by default) and skipped.
+    Returns (rows written, rows rejected).
+    """
+    error_stream = error_stream or sys.stderr
+    rejected = 0
+    
+    def reject(line_number, reason):
+        nonlocal rejected
+        rejected += 1
+        print(f"Rejected input line {line_number}: {reason}", file=error_stream)
+    
+    rows = _read_rows(input_stream, input_format, reject)
+    writer = None
+    if output_format == 'csv':
+        writer = csv.writer(output_stream)
+        writer.writerow(OUTPUT_FIELDS)
+    
+    total = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        
+        amounts, from_currencies, to_currencies = zip(*chunk)
+        converted = converter.convert_many(amounts, from_currencies, to_currencies,
+                                           save_history=save_history)
+        
+        for (amount, from_currency, to_currency), value in zip(chunk, converted.tolist()):
+            value = None if value != value else value  # NaN -> missing rate
+            if writer is not None:
+                writer.writerow([amount, from_currency.upper(), to_currency.upper(),
+                                 '' if value is None else value])
+            else:
+                output_stream.write(json.dumps(dict(zip(OUTPUT_FIELDS, [
+                    amount, from_currency.upper(), to_currency.upper(), value]))) + '\n')
+        
+        total += len(chunk)
+    
+    return total, rejected
+
+def export_history(converter, output_stream, output_format='csv', start=None, end=None,
+                   from_currency=None, to_currency=None):
+    """
+    Write conversion history matching the filters to output_stream as it is read
+    
+    Rows come from converter.iter_conversion_history, so memory use does not
+    depend on the size of the table. Returns the number of rows written.
+    """
+    fields = HistoryRecord._keys
+    records = converter.iter_conversion_history(start, end, from_currency, to_currency)
+    rows = map(attrgetter(*fields), records)
+    if output_format == 'csv':
+        writer = csv.writer(output_stream)
+        writer.writerow(fields)
+    
+    total = 0
+    while True:
+        chunk = list(islice(rows, 1000))
+        if not chunk:
+            break
+        if output_format == 'csv':
+            writer.writerows(chunk)
+        else:
+            output_stream.write(''.join(json.dumps(dict(zip(fields, row))) + '\n' for row in chunk))
+        total += len(chunk)
+    return total
+
+def run_export_mode(converter, args):
+    """Run the --export history export mode and report throughput"""
+    output_format = args.output_format or _detect_format(args.export)
+    output_stream = _open_stream(args.export, 'w')
+    start = time.perf_counter()
+    try:
+        total = export_history(converter, output_stream, output_format, args.since, args.until,
+                               args.from_currency, args.to_currency)
+    finally:
+        if output_stream is not sys.stdout:
+            output_stream.close()
+        else:
+            output_stream.flush()
+    
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"Exported {total} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec)", file=sys.stderr)
+
+def _open_stream(path, mode):
+    if path == '-':
+        return sys.stdin if 'r' in mode else sys.stdout
+    return open(path, mode, newline='', encoding='utf-8')
+
+def run_stream_mode(converter, args):
+    """
+    Run the --input/--output bulk conversion mode and report throughput
+    
+    Returns the number of rejected input rows.
+    """
+    input_format = args.format or _detect_format(args.input)
+    output_format = args.output_format or _detect_format(args.output, input_format)
+    
+    input_stream = _open_stream(args.input, 'r')
+    output_stream = _open_stream(args.output, 'w')
+    start = time.perf_counter()
+    try:
+        # Keep converter diagnostics out of the data stream when writing to stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            total, rejected = stream_conversions(converter, input_stream, output_stream,
+                                                 input_format, output_format, args.chunk_size,
+                                                 args.save_history, sys.stderr)
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+        else:
+            output_stream.flush()
+    
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"Converted {total} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec)", file=sys.stderr)
+    if rejected:
+        print(f"Rejected {rejected} malformed rows", file=sys.stderr)
+    return rejected
+
+def describe_rate_source(result):
+    """Say where a conversion's rate came from and how old it is"""
+    if result.age is None:
+        return f"source: {result.source}"
+    return f"source: {result.source}, {result.age:.0f}s old"
+
+def print_rate_report(report, limit=None):
+    """Print an analytics report (RateAnalytics.report): summary, then one line per day"""
+    summary = report['summary']
+    if not summary['days']:
+        print("  No historical data available")
+        return
+    
+    window = report['window']
+    volatility = summary['volatility']
+    print(f"  Range {summary['min']:.4f} - {summary['max']:.4f}, mean {summary['mean']:.4f}, "
+          f"change {summary['change_pct']:+.2f}%"
+          + (f", volatility {volatility * 100:.3f}%/day" if volatility is not None else ""))
+    print(f"  {'Date':<10}  {'Rate':>10}  {f'{window}d avg':>10}  {'Change':>8}  {f'{window}d vol':>8}")
+    
+    rows = report['rows'][::-1]
+    for row in rows[:limit]:
+        average = f"{row['moving_average']:.4f}" if row['moving_average'] is not None else '-'
+        change = f"{row['change_pct']:+.2f}%" if row['change_pct'] is not None else '-'
+        vol = f"{row['volatility'] * 100:.3f}%" if row['volatility'] is not None else '-'
+        print(f"  {row['date']:<10}  {row['rate']:>10.4f}  {average:>10}  {change:>8}  {vol:>8}")
+    
+    if limit is not None and len(rows) > limit:
+        print(f"  ... and {len(rows) - limit} more days")
+
+def run_maintenance_mode(converter, args):
+    """Run the --maintain database maintenance and print what it did"""
+    result = converter.maintain(args.retention_days, args.rate_retention_days)
+    print(f"Rolled up {result['history_rows_rolled_up']} history rows older than "
+          f"{args.retention_days} days, deleted {result['rate_rows_deleted']} old rates")
+    print(f"Database {result['bytes_before'] / 1e6:.1f} MB -> {result['bytes_after'] / 1e6:.1f} MB "
+          f"({result['bytes_reclaimed'] / 1e6:.1f} MB reclaimed, {result['vacuum']} vacuum) "
+          f"in {result['seconds']:.2f}s")
+
+def print_stats(converter, fmt='text'):
+    """Print converter statistics to stderr"""
+    if fmt == 'prometheus':
+        sys.stderr.write(converter.prometheus_metrics())
+        return
+    
+    stats = converter.stats()
+    if fmt == 'json':
+        print(json.dumps(stats, indent=2), file=sys.stderr)
+        return
+    
+    print("\n=== Statistics ===", file=sys.stderr)
+    for name, summary in sorted(stats['histograms'].items()):
+        print(f"{name}: count={summary['count']} mean={summary['mean'] * 1000:.3f}ms "
+              f"p50={summary['p50'] * 1000:.3f}ms p99={summary['p99'] * 1000:.3f}ms "
+              f"max={summary['max'] * 1000:.3f}ms", file=sys.stderr)
+    for name, value in sorted(stats['counters'].items()):
+        print(f"{name}: {value}", file=sys.stderr)
+    cache = stats['cache']
+    print(f"cache: hits={cache['hits']} misses={cache['misses']} evictions={cache['evictions']} "
+          f"hit_ratio={cache['hit_ratio']:.2%}", file=sys.stderr)
+    transport = stats['transport']
+    print(f"http: requests={transport['requests']} retries={transport['retries']} "
+          f"connections_opened={transport['connections_opened']} "
+          f"connections_reused={transport['connections_reused']}", file=sys.stderr)
 
 def main():
     parser = argparse.ArgumentParser(description='Real-time Currency Converter')
-    parser.add_argument('--amount', type=float, required=True, help='Amount to convert')
-    parser.add_argument('--from', dest='from_currency', required=True, help='Source currency code (e.g., USD)')
-    parser.add_argument('--to', dest='to_currency', required=True, help='Target currency code (e.g., EUR)')
+    parser.add_argument('--amount', type=float, help='Amount to convert')
+    parser.add_argument('--from', dest='from_currency', help='Source currency code (e.g., USD)')
+    parser.add_argument('--to', dest='to_currency', help='Target currency code (e.g., EUR)')
     parser.add_argument('--historical', action='store_true', help='Show historical data (last 30 days)')
+    parser.add_argument('--days', type=int, default=30, help='Historical mode: number of days (default 30)')
+    parser.add_argument('--window', type=int, default=7,
+                        help='Historical mode: moving average/volatility window in days (default 7)')
     parser.add_argument('--history', action='store_true', help='Show conversion history')
+    parser.add_argument('--cached', action='store_true',
+                        help='Convert with the latest locally stored rate (no network access)')
+    parser.add_argument('--input', help="Bulk mode: CSV/JSONL file of amount,from,to rows ('-' for stdin)")
+    parser.add_argument('--output', default='-', help="Bulk mode: output file ('-' for stdout, default)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='Bulk input format (default: from extension, else csv)')
+    parser.add_argument('--output-format', choices=['csv', 'jsonl'], help='Bulk/export output format (default: from extension, else as input)')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Bulk mode: rows converted per batch')
+    parser.add_argument('--save-history', action='store_true', help='Bulk mode: record conversions in history')
+    parser.add_argument('--export', metavar='FILE',
+                        help="Export conversion history to a CSV/JSONL file ('-' for stdout); "
+                             "--from/--to filter by currency")
+    parser.add_argument('--since', help='Export: first timestamp to include (YYYY-MM-DD[ HH:MM:SS], UTC)')
+    parser.add_argument('--until', help='Export: timestamp to stop before (YYYY-MM-DD[ HH:MM:SS], UTC)')
+    parser.add_argument('--maintain', action='store_true',
+                        help='Roll up old history, prune old rates and reclaim database space')
+    parser.add_argument('--retention-days', type=int, default=DEFAULT_RETENTION_DAYS,
+                        help=f'Maintenance: keep individual history rows this many days (default {DEFAULT_RETENTION_DAYS})')
+    parser.add_argument('--rate-retention-days', type=int,
+                        help='Maintenance: delete stored rates older than this (default: keep all)')
+    parser.add_argument('--stats', nargs='?', const='text', choices=['text', 'json', 'prometheus'],
+                        help='Print latency/cache statistics to stderr when done (default format: text)')
     
     args = parser.parse_args()
     
+    if (not args.history and not args.input and not args.export and not args.maintain
+            and None in (args.amount, args.from_currency, args.to_currency)):
+        parser.error('--amount, --from and --to are required unless --history, --input, '
+                     '--export or --maintain is given')
+    
     converter = CurrencyConverter()
     
     try:
+        if args.input:
+            if run_stream_mode(converter, args):
+                sys.exit(1)
+            return
+        
+        if args.export:
+            run_export_mode(converter, args)
+            return
+        
+        if args.maintain:
+            run_maintenance_mode(converter, args)
+            return
+        
         if args.history:
             # Show conversion history
             history = converter.get_conversion_history(10)
@@ -29,37 +338,43 @@ def main():
                       f"{entry['converted_amount']:.2f} {entry['to_currency']} (Rate: {entry['rate']:.4f})")
             return
         
+        if args.cached:
+            stored = converter.get_stored_rate(args.from_currency, args.to_currency)
+            if stored is None:
+                print(f"No stored rate for {args.from_currency.upper()} to {args.to_currency.upper()}")
+                sys.exit(1)
+            print(f"{args.amount} {args.from_currency.upper()} = {args.amount * stored['rate']:.2f} "
+                  f"{args.to_currency.upper()} (stored rate {stored['rate']:.4f} from {stored['date']})")
+            return
+        
         # Perform conversion
         result = converter.convert_currency(args.amount, args.from_currency, args.to_currency)
         
         if result is not None:
             print(f"\n💰 Conversion Result:")
-            print(f"{args.amount} {args.from_currency.upper()} = {result:.2f} {args.to_currency.upper()}")
-            
-            # Get current rate for display
-            current_rate = converter.get_real_time_rate(args.from_currency, args.to_currency)
-            if current_rate:
-                print(f"Current Exchange Rate: 1 {args.from_currency.upper()} = {current_rate:.4f} {args.to_currency.upper()}")
+            print(f"{args.amount} {result.from_currency} = {result.converted_amount:.2f} {result.to_currency}")
+            print(f"Current Exchange Rate: 1 {result.from_currency} = {result.rate:.4f} {result.to_currency}"
+                  f" ({describe_rate_source(result)})")
         else:
             print("Error: Could not perform conversion. Please check currency codes.")
             sys.exit(1)
         
         if args.historical:
             # Show historical data
-            print(f"\n📊 Historical Rates (Last 30 days) for {args.from_currency.upper()} to {args.to_currency.upper()}:")
-            historical_data = converter.get_historical_rates(args.from_currency, args.to_currency)
-            
-            for data in historical_data[:10]:  # Show first 10 entries
-                print(f"  {data['date']}: {data['rate']:.4f}")
-            
-            if len(historical_data) > 10:
-                print(f"  ... and {len(historical_data) - 10} more days")
+            print(f"\n📊 Historical Rates (Last {args.days} days) for {args.from_currency.upper()} to {args.to_currency.upper()}:")
+            report = converter.analytics.report(args.from_currency, args.to_currency,
+                                                args.days, args.window)
+            print_rate_report(report, limit=10)  # Show the latest 10 days
     
     except KeyboardInterrupt:
         print("\nOperation cancelled by user")
     except Exception as e:
-        print(f"An error occurred: {e}")
+        # stderr: stdout may be the bulk/export data stream
+        print(f"An error occurred: {e}", file=sys.stderr)
+        sys.exit(1)
     finally:
+        if args.stats:
+            print_stats(converter, args.stats)
         converter.close()
 
 if __name__ == "__main__":
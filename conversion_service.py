@@ -0,0 +1,261 @@
+"""
+Long-running HTTP conversion service backed by one warm CurrencyConverter
+
+Endpoints:
+    GET  /convert?amount=100&from=USD&to=EUR
+    POST /convert/batch      JSON array (or JSONL) of {"amount", "from", "to"}
+    GET  /history?limit=10
+    GET  /stats              converter.stats() as JSON
+    GET  /metrics            Prometheus text
+    GET  /health
+"""
+
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+BATCH_CHUNK_SIZE = 5000
+MAX_BATCH_BYTES = 64 * 1024 * 1024
+WORKERS = 8
+# Idle keep-alive connections give their worker back after this many seconds
+KEEPALIVE_TIMEOUT = 5.0
+
+
+class WorkerPoolHTTPServer(HTTPServer):
+    """HTTPServer that handles connections on a fixed pool of worker threads"""
+
+    def __init__(self, server_address, handler_class, workers: int = WORKERS):
+        super().__init__(server_address, handler_class)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers),
+                                            thread_name_prefix='conversion-service')
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False)
+
+
+class ConversionService:
+    def __init__(self, converter, host: str = '127.0.0.1', port: int = 8080,
+                 batch_chunk_size: int = BATCH_CHUNK_SIZE, workers: int = WORKERS):
+        """
+        Serve conversions over HTTP from a shared converter
+
+        The converter's rate snapshot is loaded before the first request, so
+        every request is answered from memory while the snapshot is fresh.
+        Batch responses are streamed in chunks of ``batch_chunk_size`` rows.
+        Connections are handled by ``workers`` long-lived threads, so threads
+        and the converter's database connections are reused across requests.
+        """
+        self.converter = converter
+        self.batch_chunk_size = batch_chunk_size
+        self._server = WorkerPoolHTTPServer((host, port), self._handler_class(), workers)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def warm_up(self):
+        """Fetch the rate snapshot now instead of on the first request"""
+        try:
+            self.converter.get_rate_snapshot()
+        except Exception as e:
+            print(f"Could not preload rates, will retry on demand: {e}")
+
+    def serve_forever(self):
+        self.warm_up()
+        print(f"Currency conversion service listening on {self.url}")
+        self._server.serve_forever()
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def convert_one(self, query: Dict[str, str]):
+        amount = _parse_amount(query['amount'])
+        from_currency = query['from'].upper()
+        to_currency = query['to'].upper()
+        result = self.converter.convert_currency(amount, from_currency, to_currency)
+        if result is None:
+            return 404, {'error': f"No exchange rate for {from_currency} to {to_currency}"}
+
+        return 200, {
+            'amount': result.amount,
+            'from_currency': result.from_currency,
+            'to_currency': result.to_currency,
+            'converted_amount': result.converted_amount,
+            'rate': result.rate,
+            'source': result.source,
+            'age': result.age
+        }
+
+    def convert_chunk(self, rows: List[Dict], save_history: bool) -> List[Dict]:
+        """Convert one chunk of batch rows with a single vectorized pass"""
+        amounts = [_parse_amount(row['amount']) for row in rows]
+        from_codes = [str(row.get('from') or row['from_currency']).upper() for row in rows]
+        to_codes = [str(row.get('to') or row['to_currency']).upper() for row in rows]
+        converted = self.converter.convert_many(amounts, from_codes, to_codes,
+                                                save_history=save_history)
+
+        results = []
+        for amount, from_currency, to_currency, value in zip(amounts, from_codes, to_codes,
+                                                             converted.tolist()):
+            results.append({
+                'amount': amount,
+                'from_currency': from_currency,
+                'to_currency': to_currency,
+                'converted_amount': None if math.isnan(value) else value
+            })
+        return results
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+            timeout = KEEPALIVE_TIMEOUT
+
+            def _send_json(self, status: int, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_text(self, status: int, text: str):
+                body = text.encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _write_chunk(self, data: bytes):
+                if data:
+                    self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+
+                try:
+                    if parsed.path == '/convert':
+                        self._send_json(*service.convert_one(query))
+                    elif parsed.path == '/history':
+                        limit = int(query.get('limit', 10))
+                        history = service.converter.get_conversion_history(limit)
+                        self._send_json(200, [record.as_dict() for record in history])
+                    elif parsed.path == '/stats':
+                        self._send_json(200, service.converter.stats())
+                    elif parsed.path == '/metrics':
+                        self._send_text(200, service.converter.prometheus_metrics())
+                    elif parsed.path == '/health':
+                        self._send_json(200, {'status': 'ok'})
+                    else:
+                        self._send_json(404, {'error': 'not found'})
+                except (KeyError, ValueError) as e:
+                    self._send_json(400, {'error': f"Invalid request: {e}"})
+
+            def do_POST(self):
+                parsed = urlparse(self.path)
+                if parsed.path != '/convert/batch':
+                    self._send_json(404, {'error': 'not found'})
+                    return
+
+                query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+                save_history = query.get('save_history', 'true').lower() not in ('0', 'false', 'no')
+
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    if length > MAX_BATCH_BYTES:
+                        self._send_json(413, {'error': 'batch too large'})
+                        return
+                    rows = _parse_batch(self.rfile.read(length))
+                    # Validate the first chunk before committing to a 200 response
+                    first = service.convert_chunk(rows[:service.batch_chunk_size], save_history)
+                except (KeyError, TypeError, ValueError) as e:
+                    self._send_json(400, {'error': f"Invalid batch: {e}"})
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+                self._write_chunk(b'[')
+                separator = b''
+                for start in range(0, len(rows), service.batch_chunk_size):
+                    if start == 0:
+                        chunk = first
+                    else:
+                        try:
+                            chunk = service.convert_chunk(
+                                rows[start:start + service.batch_chunk_size], save_history)
+                        except (KeyError, TypeError, ValueError):
+                            # Headers are already sent; drop the connection so the
+                            # client sees a truncated response instead of bad data
+                            self.close_connection = True
+                            return
+                    body = ', '.join(json.dumps(result) for result in chunk).encode()
+                    self._write_chunk(separator + body)
+                    separator = b', '
+                self._write_chunk(b']')
+                self.wfile.write(b"0\r\n\r\n")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def _parse_amount(value) -> float:
+    """Parse an amount, rejecting NaN and infinities (they are not valid JSON)"""
+    amount = float(value)
+    if not math.isfinite(amount):
+        raise ValueError(f"amount must be a finite number, got {value!r}")
+    return amount
+
+
+def _parse_batch(body: bytes) -> List[Dict]:
+    """Accept a JSON array, {"conversions": [...]}, or JSON lines"""
+    text = body.decode('utf-8').strip()
+    if not text:
+        return []
+    if text[0] in '[{':
+        try:
+            data = json.loads(text)
+            if isinstance(data, dict):
+                data = data['conversions']
+            if not isinstance(data, list):
+                raise ValueError('expected a list of conversions')
+            return data
+        except json.JSONDecodeError:
+            if text[0] == '[':
+                raise
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def serve(converter, host: str = '127.0.0.1', port: int = 8080,
+          service: Optional[ConversionService] = None, workers: int = WORKERS):
+    """Run the conversion service until interrupted"""
+    service = service or ConversionService(converter, host, port, workers=workers)
+    try:
+        service.serve_forever()
+    finally:
+        service._server.server_close()
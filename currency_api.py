@@ -3,92 +3,144 @@ Currency API module for fetching real-time and historical exchange rates
 Uses free API from exchangerate-api.com
 """
 
-import requests
 import json
+from collections import OrderedDict
 from datetime import datetime, timedelta
-import time
+from concurrent.futures import ThreadPoolExecutor
+from http_transport import get_default_transport
+from rate_providers import ExchangeRateApiProvider, RateProviderError
+from rate_snapshot import RateSnapshot
+from records import ConversionResult
 
 class CurrencyAPI:
-    def __init__(self):
-        self.base_url = "https://api.exchangerate-api.com/v4/latest/"
-        self.historical_base_url = "https://api.exchangerate.host/"
+    def __init__(self, pivot_currency="USD", snapshot_ttl=300, transport=None, provider=None,
+                 historical_cache_size=4096):
+        self.transport = transport or get_default_transport()
+        self.provider = provider or ExchangeRateApiProvider(transport=self.transport)
+        self.pivot_currency = pivot_currency
+        self.snapshot_ttl = snapshot_ttl
+        self.snapshot = None
+        # (base, target, date) -> rate, least recently used first
+        self.historical_cache_size = historical_cache_size
+        self._historical_cache = OrderedDict()
         
     def get_real_time_rates(self, base_currency="USD"):
         """
         Get real-time exchange rates for a base currency
         """
         try:
-            response = requests.get(f"{self.base_url}{base_currency}")
-            if response.status_code == 200:
-                data = response.json()
+            snapshot = self.provider.get_snapshot(base_currency)
+            if snapshot is not None:
                 return {
                     'success': True,
-                    'base_currency': data['base'],
-                    'rates': data['rates'],
-                    'timestamp': data['time_last_updated']
+                    'base_currency': snapshot.base_currency,
+                    'rates': snapshot.rates,
+                    'timestamp': snapshot.timestamp
                 }
             else:
                 return {'success': False, 'error': 'API request failed'}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def get_historical_rates(self, base_currency, target_currency, days_back=30):
+    def get_rate_snapshot(self, force_refresh=False):
+        """
+        Get the pivot currency rate table, fetching it at most once per TTL
+        """
+        if (not force_refresh and self.snapshot is not None
+                and self.snapshot.is_fresh(self.snapshot_ttl)):
+            return {'success': True, 'snapshot': self.snapshot}
+        
+        rates_data = self.get_real_time_rates(self.pivot_currency)
+        if not rates_data['success']:
+            return rates_data
+        
+        self.snapshot = RateSnapshot(rates_data['base_currency'], rates_data['rates'],
+                                     rates_data['timestamp'])
+        return {'success': True, 'snapshot': self.snapshot}
+    
+    def get_historical_rates(self, base_currency, target_currency, days_back=30, max_workers=8):
         """
         Get historical exchange rates for the last N days
+        
+        Past dates never change, so fetched (pair, date) rates are kept in a
+        bounded LRU cache and only dates not seen before are requested: with
+        one time-series request where the provider supports it, otherwise
+        concurrently by at most max_workers threads.
         """
-        historical_data = []
+        dates = [(datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
+                 for i in range(days_back)]
+        cache = self._historical_cache
+        rates = {}
+        for date_str in dates:
+            key = (base_currency, target_currency, date_str)
+            if key in cache:
+                cache.move_to_end(key)
+                rates[date_str] = cache[key]
+        missing = [date_str for date_str in dates if date_str not in rates]
         
-        for i in range(days_back):
-            date = datetime.now() - timedelta(days=i)
-            date_str = date.strftime("%Y-%m-%d")
-            
+        if missing:
+            fetched = self._fetch_historical_range(base_currency, target_currency, missing,
+                                                   max_workers)
+            for date_str in missing:
+                rate = fetched.get(date_str)
+                if rate:
+                    rates[date_str] = rate
+                    # Today's rate can still move, so only past dates are kept
+                    if date_str != dates[0]:
+                        cache[(base_currency, target_currency, date_str)] = rate
+            while len(cache) > self.historical_cache_size:
+                cache.popitem(last=False)
+        
+        return [{'date': date_str, 'rate': rates[date_str]}
+                for date_str in dates if date_str in rates]
+    
+    def _fetch_historical_range(self, base_currency, target_currency, dates, max_workers):
+        """
+        Fetch the rates for some dates as {date: rate}
+        """
+        if self.provider.supports_range:
             try:
-                url = f"{self.historical_base_url}{date_str}"
-                params = {
-                    'base': base_currency,
-                    'symbols': target_currency
-                }
-                
-                response = requests.get(url, params=params)
-                if response.status_code == 200:
-                    data = response.json()
-                    if data['success']:
-                        rate = data['rates'].get(target_currency)
-                        if rate:
-                            historical_data.append({
-                                'date': date_str,
-                                'rate': rate
-                            })
-                
-                # Be nice to the API
-                time.sleep(0.1)
-                
-            except Exception as e:
-                print(f"Error fetching data for {date_str}: {e}")
-                continue
+                return self.provider.get_range(base_currency, target_currency,
+                                               min(dates), max(dates))
+            except RateProviderError as e:
+                print(f"Error fetching data for {min(dates)} to {max(dates)}: {e}")
+                return {}
         
-        return historical_data
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(dates)))) as pool:
+            results = pool.map(lambda date_str: self._fetch_historical_rate(
+                base_currency, target_currency, date_str), dates)
+            return dict(zip(dates, results))
+    
+    def _fetch_historical_rate(self, base_currency, target_currency, date_str):
+        """
+        Fetch the rate for a single date
+        """
+        try:
+            return self.provider.get_rate(base_currency, target_currency, date_str)
+        except Exception as e:
+            print(f"Error fetching data for {date_str}: {e}")
+            return None
     
     def convert_currency(self, amount, from_currency, to_currency):
         """
         Convert currency amount from one currency to another
+        
+        The rate is triangulated from the cached pivot snapshot, so converting
+        between any pair costs no extra request while the snapshot is fresh.
         """
-        rates_data = self.get_real_time_rates(from_currency)
+        snapshot_data = self.get_rate_snapshot()
         
-        if rates_data['success']:
-            rate = rates_data['rates'].get(to_currency)
+        if snapshot_data['success']:
+            snapshot = snapshot_data['snapshot']
+            if from_currency not in snapshot:
+                return {'success': False, 'error': f"Currency {from_currency} not found"}
+            
+            rate = snapshot.rate(from_currency, to_currency)
             if rate:
                 converted_amount = amount * rate
-                return {
-                    'success': True,
-                    'original_amount': amount,
-                    'from_currency': from_currency,
-                    'to_currency': to_currency,
-                    'converted_amount': converted_amount,
-                    'exchange_rate': rate,
-                    'timestamp': rates_data['timestamp']
-                }
+                return ConversionResult(amount, from_currency, to_currency, converted_amount,
+                                        rate, snapshot.timestamp, 'snapshot', snapshot.age())
             else:
                 return {'success': False, 'error': f"Currency {to_currency} not found"}
         else:
-            return {'success': False, 'error': rates_data['error']}
\ No newline at end of file
+            return {'success': False, 'error': snapshot_data['error']}
@@ -2,203 +2,862 @@
 Main currency converter module with real-time conversion and historical data
 """
 
-import requests
+import bisect
+import contextlib
 import json
-from datetime import datetime, timedelta
-import sqlite3
-from typing import Optional, Dict, List
+from datetime import date as date_type, datetime, timedelta
+from typing import Optional, Dict, List, Iterable, Iterator, Set, Tuple, Union
+import threading
 import time
+from http_transport import HttpTransport, get_default_transport
+from date_policy import resolve_dates
+from db_maintenance import DEFAULT_RETENTION_DAYS, MaintenanceScheduler, run_maintenance
+from instrumentation import Metrics
+from lazy_import import lazy_module
+from rate_analytics import RateAnalytics
+from rate_cache import RateCache
+from rate_providers import RateProvider, RateProviderError, ExchangeRateHostProvider
+from rate_refresher import RateRefresher
+from rate_snapshot import RateSnapshot, CURRENCIES
+from records import ConversionResult, HistoryRecord
+from snapshot_file import RateSnapshotFile
+from sqlite_pool import SQLiteConnectionPool
+from write_behind import WriteBehindBuffer
+
+np = lazy_module('numpy')
+
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+INSERT_RATE_SQL = '''
+    INSERT OR REPLACE INTO exchange_rates 
+    (base_currency, target_currency, rate, date)
+    VALUES (?, ?, ?, ?)
+'''
+
+INSERT_MISSING_SQL = '''
+    INSERT OR IGNORE INTO missing_rates (base_currency, target_currency, date)
+    VALUES (?, ?, ?)
+'''
+
+INSERT_HISTORY_SQL = '''
+    INSERT INTO conversion_history 
+    (amount, from_currency, to_currency, converted_amount, rate)
+    VALUES (?, ?, ?, ?, ?)
+'''
 
 class CurrencyConverter:
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, cache_ttl: float = 300.0, cache_size: int = 1024,
+                 pivot_currency: str = 'USD', transport: Optional[HttpTransport] = None,
+                 provider: Optional[RateProvider] = None,
+                 write_batch_size: int = 100, write_flush_interval: float = 0.5,
+                 synchronous: str = 'NORMAL', metrics: Optional[Metrics] = None,
+                 db_path: str = 'currency_data.db', background_refresh: bool = False,
+                 snapshot_file: Optional[str] = None, max_stale: Optional[float] = 3600.0):
         """
         Initialize currency converter with API key for real-time rates
+
+        Every pair is triangulated from one ``pivot_currency`` table, fetched
+        from ``provider`` (exchangerate.host over ``transport`` by default) and
+        cached for ``cache_ttl`` seconds, at most ``cache_size`` pairs. Rates
+        and history go to ``db_path``, written behind in batches of
+        ``write_batch_size`` rows or every ``write_flush_interval`` seconds with
+        the given ``synchronous`` mode (OFF, NORMAL, FULL or EXTRA). Timings
+        and counters go to ``metrics``. ``background_refresh`` renews the table
+        before it expires and serves an expired one for at most ``max_stale``
+        seconds past its TTL (None: no limit); ``snapshot_file`` shares the
+        table with other processes. An instance can be shared by threads.
         """
         self.api_key = api_key
-        self.base_url = "https://api.exchangerate.host"
-        self.db_connection = self._init_database()
-        
-    def _init_database(self) -> sqlite3.Connection:
-        """Initialize SQLite database for caching rates"""
-        conn = sqlite3.connect('currency_data.db')
-        cursor = conn.cursor()
-        
-        # Create table for historical rates
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS exchange_rates (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                base_currency TEXT NOT NULL,
-                target_currency TEXT NOT NULL,
-                rate REAL NOT NULL,
-                date TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create table for conversion history
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS conversion_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                amount REAL NOT NULL,
-                from_currency TEXT NOT NULL,
-                to_currency TEXT NOT NULL,
-                converted_amount REAL NOT NULL,
-                rate REAL NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        return conn
+        self.metrics = metrics or Metrics()
+        self.transport = transport or get_default_transport()
+        self.provider = provider or ExchangeRateHostProvider(transport=self.transport,
+                                                             api_key=api_key)
+        self.rate_cache = RateCache(max_size=cache_size, ttl=cache_ttl)
+        self.max_stale = max_stale
+        self.pivot_currency = pivot_currency.upper()
+        self.snapshot: Optional[RateSnapshot] = None
+        # The last installed table and the cache generation its rates belong to
+        self._installed: Tuple[Optional[RateSnapshot], int] = (None, 0)
+        self._snapshot_lock = threading.Lock()
+        self.snapshot_file = RateSnapshotFile(snapshot_file) if snapshot_file else None
+        self.db_path = db_path
+        self.synchronous = synchronous.upper()
+        if self.synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous must be one of {', '.join(SYNCHRONOUS_MODES)}")
+        self.db_pool = self._init_database()
+        self._writer = WriteBehindBuffer(self.db_pool, write_batch_size, write_flush_interval,
+                                         self.metrics)
+        self.refresher: Optional[RateRefresher] = None
+        self._analytics: Optional[RateAnalytics] = None
+        self.maintenance: Optional[MaintenanceScheduler] = None
+        if background_refresh:
+            self.start_refresher()
+        
+    def _init_database(self) -> SQLiteConnectionPool:
+        """Initialize SQLite database for caching rates, upgrading its schema"""
+        return SQLiteConnectionPool(self.db_path, self.synchronous)
     
-    def get_real_time_rate(self, from_currency: str, to_currency: str) -> Optional[float]:
+    @property
+    def analytics(self) -> RateAnalytics:
+        """Rolling analytics over the stored rates (see rate_analytics), kept per converter"""
+        if self._analytics is None:
+            self._analytics = RateAnalytics(self)
+        return self._analytics
+    
+    def start_refresher(self, refresh_ahead: float = 0.8,
+                        retry_interval: float = 5.0) -> RateRefresher:
+        """Start refreshing the rate snapshot in the background (see RateRefresher)"""
+        if self.refresher is None or not self.refresher.is_running():
+            self.refresher = RateRefresher(self, refresh_ahead, retry_interval)
+            self.refresher.start()
+        return self.refresher
+    
+    def start_maintenance(self, interval: float = 86400.0,
+                          retention_days: int = DEFAULT_RETENTION_DAYS,
+                          rate_retention_days: Optional[int] = None) -> MaintenanceScheduler:
+        """Run maintain() now and then every ``interval`` seconds in the background"""
+        if self.maintenance is None or not self.maintenance.is_running():
+            self.maintenance = MaintenanceScheduler(self, interval, retention_days=retention_days,
+                                                    rate_retention_days=rate_retention_days)
+            self.maintenance.start()
+        return self.maintenance
+    
+    def get_rate_snapshot(self, force_refresh: bool = False) -> Optional[RateSnapshot]:
         """
-        Get real-time exchange rate using exchangerate.host API
+        Get the full rate table for the pivot currency, refetching it once the
+        cache TTL has passed. Raises RateProviderError if the fetch fails.
+        While a background refresher runs, an expired table is served as is
+        for up to ``max_stale`` seconds; after that RateProviderError is
+        raised until the refresher succeeds, so callers fall back to stored
+        rates instead of converting at an arbitrarily old table.
         """
-        try:
-            url = f"{self.base_url}/latest"
-            params = {
-                'base': from_currency.upper(),
-                'symbols': to_currency.upper()
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            if data.get('success', False):
-                rate = data['rates'].get(to_currency.upper())
-                if rate:
-                    self._cache_rate(from_currency, to_currency, rate)
-                    return rate
+        snapshot = self.snapshot
+        if not force_refresh and snapshot is not None:
+            if snapshot.is_fresh(self.rate_cache.ttl):
+                return snapshot
+            if self.refresher is not None and self.refresher.is_running():
+                if (self.max_stale is not None
+                        and snapshot.age() > self.rate_cache.ttl + self.max_stale):
+                    self.metrics.inc('stale_snapshot_rejections')
+                    raise RateProviderError(
+                        f"Rate snapshot expired more than {self.max_stale:.0f}s ago "
+                        f"and the background refresh has not replaced it")
+                self.metrics.inc('stale_snapshot_reads')
+                return snapshot
+        
+        # One thread refreshes; the others wait and reuse its result
+        with self._snapshot_lock:
+            if self.snapshot is not snapshot and self.snapshot is not None:
+                return self.snapshot
             
+            shared_file = self.snapshot_file
+            # Other processes wait here while one of them fetches the table
+            with shared_file.lock() if shared_file else contextlib.nullcontext():
+                if shared_file is not None:
+                    shared = self._load_shared_snapshot(snapshot)
+                    if shared is not None:
+                        self._install_snapshot(shared)
+                        return shared
+                
+                with self.metrics.timer('http_fetch_seconds'):
+                    fetched = self.provider.get_snapshot(self.pivot_currency)
+                if fetched is None:
+                    return None
+                
+                if shared_file is not None:
+                    try:
+                        shared_file.write(fetched)
+                    except OSError as e:
+                        # Other processes fetch for themselves until a write succeeds
+                        print(f"Could not write rate snapshot file: {e}")
+                        self.metrics.inc('snapshot_file_errors')
+                self._install_snapshot(fetched)
+                return fetched
+    
+    def _install_snapshot(self, snapshot: RateSnapshot):
+        """Swap in a new rate table, then drop pair rates derived from the old one"""
+        self.snapshot = snapshot
+        # Lookups that read the old table started in the old cache generation,
+        # so their late rate_cache.set() calls are dropped
+        self.rate_cache.clear()
+        self._installed = (snapshot, self.rate_cache.generation)
+    
+    def _load_shared_snapshot(self, current: Optional[RateSnapshot]) -> Optional[RateSnapshot]:
+        """Get the snapshot file's table if it is fresh and newer than ``current``"""
+        try:
+            shared = self.snapshot_file.snapshot()
+        except (OSError, ValueError) as e:
+            print(f"Could not read rate snapshot file: {e}")
+            return None
+        
+        if shared is None or not shared.is_fresh(self.rate_cache.ttl):
+            return None
+        # A second of slack keeps our own write (read back through the wall clock) out
+        if current is not None and shared.fetched_at <= current.fetched_at + 1.0:
             return None
+        if shared.base_currency != self.pivot_currency:
+            shared = shared.rebase(self.pivot_currency)
+        if shared is not None:
+            self.metrics.inc('snapshot_file_loads')
+        return shared
+    
+    def get_real_time_rate(self, from_currency: str, to_currency: str) -> Optional[float]:
+        """
+        Get real-time exchange rate from the configured rate provider
+        
+        The rate is derived from the pivot currency snapshot, so any pair is
+        served from a single table fetch per refresh.
+        """
+        return self._lookup_rate(from_currency, to_currency)[0]
+    
+    def _lookup_rate(self, from_currency: str, to_currency: str
+                     ) -> Tuple[Optional[float], Optional[str], Optional[float], Optional[str]]:
+        """
+        Resolve a rate once as (rate, source, age in seconds, timestamp), see
+        ConversionResult; age and timestamp belong to the table the rate came from
+        """
+        cached = self.rate_cache.get_with_age(from_currency, to_currency)
+        if cached is not None:
+            return cached[0], 'cache', cached[1], cached[2]
+        
+        generation = self.rate_cache.generation
+        previous = self.snapshot
+        try:
+            snapshot = self.get_rate_snapshot()
             
-        except requests.RequestException as e:
+        except RateProviderError as e:
             print(f"Error fetching real-time rate: {e}")
-            return self._get_cached_rate(from_currency, to_currency)
+            self.metrics.inc('upstream_errors')
+            self.metrics.inc('db_fallbacks')
+            rate = self._get_cached_rate(from_currency, to_currency)
+            if rate is not None:
+                self.rate_cache.set(from_currency, to_currency, rate, float('-inf'))
+            return rate, 'database', None, None
+        
+        if snapshot is None:
+            return None, None, None, None
+        
+        rate = snapshot.rate(from_currency, to_currency)
+        if not rate:
+            return None, None, None, None
+        
+        installed, installed_generation = self._installed
+        if installed is snapshot:
+            generation = installed_generation
+        self.rate_cache.set(from_currency, to_currency, rate, snapshot.fetched_at,
+                            snapshot.timestamp, generation)
+        self._cache_rate(from_currency, to_currency, rate)
+        
+        age = snapshot.age()
+        if snapshot is not previous:
+            source = 'fetched'
+        elif age <= self.rate_cache.ttl:
+            source = 'snapshot'
+        else:
+            source = 'stale_snapshot'
+        return rate, source, age if age != float('inf') else None, snapshot.timestamp
     
     def _cache_rate(self, base_currency: str, target_currency: str, rate: float):
-        """Cache the exchange rate in database"""
-        cursor = self.db_connection.cursor()
+        """Cache the exchange rate in database (written behind)"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        self._writer.add(INSERT_RATE_SQL,
+                         (base_currency.upper(), target_currency.upper(), rate, today))
+    
+    def _store_snapshot(self, snapshot: RateSnapshot):
+        """Persist a rate table as today's rates from its base (written behind)"""
         today = datetime.now().strftime('%Y-%m-%d')
+        self._writer.add_many(INSERT_RATE_SQL, [
+            (snapshot.base_currency, code, rate, today)
+            for code, rate in snapshot.rates.items() if code != snapshot.base_currency])
+    
+    def _load_stored_snapshot(self) -> Optional[RateSnapshot]:
+        """Rebuild the most recent stored rate table for the pivot currency"""
+        self._writer.flush()
+        
+        with self.metrics.timer('sqlite_read_seconds'), self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT target_currency, rate, date FROM exchange_rates
+                WHERE base_currency = ? AND date = (
+                    SELECT MAX(date) FROM exchange_rates WHERE base_currency = ?)
+            ''', (self.pivot_currency, self.pivot_currency))
+            rows = cursor.fetchall()
         
-        cursor.execute('''
-            INSERT OR REPLACE INTO exchange_rates 
-            (base_currency, target_currency, rate, date)
-            VALUES (?, ?, ?, ?)
-        ''', (base_currency.upper(), target_currency.upper(), rate, today))
+        if not rows:
+            return None
         
-        self.db_connection.commit()
+        snapshot = RateSnapshot(self.pivot_currency, {code: rate for code, rate, _ in rows},
+                                timestamp=rows[0][2])
+        # Stored rates are never fresh, so the provider is retried on next use
+        snapshot.fetched_at = float('-inf')
+        return snapshot
+    
+    def _get_fallback_rate(self, base_currency: str, target_currency: str) -> Optional[float]:
+        """Rate from the in-memory cache or today's stored rates, without the provider"""
+        rate = self.rate_cache.get(base_currency, target_currency)
+        if rate is None:
+            self.metrics.inc('db_fallbacks')
+            rate = self._get_cached_rate(base_currency, target_currency)
+            if rate is not None:
+                self.rate_cache.set(base_currency, target_currency, rate, float('-inf'))
+        return rate
     
     def _get_cached_rate(self, base_currency: str, target_currency: str) -> Optional[float]:
         """Get cached exchange rate from database"""
-        cursor = self.db_connection.cursor()
+        self._writer.flush()
         today = datetime.now().strftime('%Y-%m-%d')
         
-        cursor.execute('''
-            SELECT rate FROM exchange_rates 
-            WHERE base_currency = ? AND target_currency = ? AND date = ?
-            ORDER BY timestamp DESC LIMIT 1
-        ''', (base_currency.upper(), target_currency.upper(), today))
-        
-        result = cursor.fetchone()
+        with self.metrics.timer('sqlite_read_seconds'), self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT rate FROM exchange_rates 
+                WHERE base_currency = ? AND target_currency = ? AND date = ?
+            ''', (base_currency.upper(), target_currency.upper(), today))
+            
+            result = cursor.fetchone()
         return result[0] if result else None
     
-    def convert_currency(self, amount: float, from_currency: str, to_currency: str) -> Optional[float]:
+    def get_stored_rate(self, base_currency: str, target_currency: str) -> Optional[Dict]:
+        """
+        Get the most recent rate stored for a pair as {'rate', 'date'}, without
+        any network access
+        """
+        self._writer.flush()
+        
+        with self.metrics.timer('sqlite_read_seconds'), self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT rate, date FROM exchange_rates 
+                WHERE base_currency = ? AND target_currency = ?
+                ORDER BY date DESC LIMIT 1
+            ''', (base_currency.upper(), target_currency.upper()))
+            
+            result = cursor.fetchone()
+        return {'rate': result[0], 'date': result[1]} if result else None
+    
+    def convert_currency(self, amount: float, from_currency: str,
+                         to_currency: str) -> Optional[ConversionResult]:
         """
         Convert currency amount from one currency to another
+        
+        The result carries the converted amount together with the rate used,
+        where it came from and how old it is, all from a single lookup.
+        Returns None when no rate is available.
         """
-        rate = self.get_real_time_rate(from_currency, to_currency)
+        with self.metrics.timer('conversion_seconds'):
+            rate, source, age, timestamp = self._lookup_rate(from_currency, to_currency)
+            
+            if rate is None:
+                print(f"Could not get exchange rate for {from_currency} to {to_currency}")
+                self.metrics.inc('conversion_failures')
+                return None
+            
+            converted_amount = amount * rate
+            
+            # Save conversion to history
+            self._save_conversion_history(amount, from_currency, to_currency, converted_amount, rate)
+            self.metrics.inc('conversions')
+            
+            return ConversionResult(amount, from_currency.upper(), to_currency.upper(),
+                                    converted_amount, rate, timestamp, source, age)
+    
+    def _save_conversion_history(self, amount: float, from_currency: str, to_currency: str, 
+                               converted_amount: float, rate: float):
+        """Save conversion to history table (written behind)"""
+        if converted_amount != converted_amount or rate != rate:
+            return  # NaN would break the NOT NULL columns
+        self._writer.add(INSERT_HISTORY_SQL, (amount, from_currency.upper(), to_currency.upper(),
+                                              converted_amount, rate))
+    
+    def convert_many(self, amounts: Iterable[float], from_currencies: Union[str, Iterable[str]],
+                     to_currencies: Union[str, Iterable[str]],
+                     save_history: bool = True) -> "np.ndarray":
+        """
+        Convert many amounts at once
         
-        if rate is None:
-            print(f"Could not get exchange rate for {from_currency} to {to_currency}")
-            return None
+        Currency codes may be a single code applied to every row or one code per
+        row. Each distinct pair is resolved once and all rows are computed in a
+        single vectorized pass; rows without a rate come back as NaN. Pairs
+        covered by the rate snapshot are resolved together from its rate array.
+        """
+        start = time.perf_counter()
+        amounts = np.asarray(amounts, dtype=np.float64).ravel()
+        from_names, from_idx = self._currency_index(from_currencies, len(amounts))
+        to_names, to_idx = self._currency_index(to_currencies, len(amounts))
         
-        converted_amount = amount * rate
+        if len(amounts) == 0:
+            return np.empty(0, dtype=np.float64)
         
-        # Save conversion to history
-        self._save_conversion_history(amount, from_currency, to_currency, converted_amount, rate)
+        # Each (from, to) pair gets one integer id; rates are resolved per id
+        pair_ids = from_idx * len(to_names) + to_idx
+        used = np.flatnonzero(np.bincount(pair_ids, minlength=len(from_names) * len(to_names)))
+        pair_rates = np.full(len(from_names) * len(to_names), np.nan)
         
-        return converted_amount
+        try:
+            snapshot = self.get_rate_snapshot()
+            provider_down = False
+        except RateProviderError as e:
+            print(f"Error fetching real-time rates: {e}")
+            self.metrics.inc('upstream_errors')
+            snapshot = None
+            provider_down = True
+        if snapshot is not None:
+            # Input codes are only looked up: unknown ones must not get ids
+            from_ids = np.array([CURRENCIES.lookup(code) for code in from_names.tolist()])
+            to_ids = np.array([CURRENCIES.lookup(code) for code in to_names.tolist()])
+            pair_rates[used] = snapshot.cross_rates(from_ids[used // len(to_names)],
+                                                    to_ids[used % len(to_names)])
+        
+        # Anything the snapshot cannot answer goes through the per-pair fallbacks
+        for pair_id in used[np.isnan(pair_rates[used])]:
+            from_currency = str(from_names[pair_id // len(to_names)])
+            to_currency = str(to_names[pair_id % len(to_names)])
+            if provider_down:
+                # Retrying the provider per pair would repeat the failed fetch
+                # (and its backoff) for every pair of the call
+                rate = self._get_fallback_rate(from_currency, to_currency)
+            else:
+                rate = self.get_real_time_rate(from_currency, to_currency)
+            if rate is not None:
+                pair_rates[pair_id] = rate
+            else:
+                print(f"Could not get exchange rate for {from_currency} to {to_currency}")
+        
+        rates = pair_rates[pair_ids]
+        converted = amounts * rates
+        
+        if save_history:
+            self._save_conversion_history_many(amounts, from_names[from_idx], to_names[to_idx],
+                                               converted, rates)
+        
+        self.metrics.observe('batch_conversion_seconds', time.perf_counter() - start)
+        self.metrics.inc('batch_rows', len(amounts))
+        return converted
     
-    def _save_conversion_history(self, amount: float, from_currency: str, to_currency: str, 
-                               converted_amount: float, rate: float):
-        """Save conversion to history table"""
-        cursor = self.db_connection.cursor()
+    @staticmethod
+    def _currency_index(currencies: Union[str, Iterable[str]], size: int):
+        """
+        Map one code or a sequence of codes to (upper-case names, per-row index)
+        """
+        if isinstance(currencies, str):
+            return np.array([currencies.upper()]), np.zeros(size, dtype=np.int64)
         
-        cursor.execute('''
-            INSERT INTO conversion_history 
-            (amount, from_currency, to_currency, converted_amount, rate)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (amount, from_currency.upper(), to_currency.upper(), converted_amount, rate))
+        codes = currencies if isinstance(currencies, np.ndarray) else np.asarray(list(currencies))
+        codes = codes.astype(str).ravel()
+        if len(codes) != size:
+            raise ValueError(f"Expected {size} currency codes, got {len(codes)}")
         
-        self.db_connection.commit()
+        # Normalize case on the distinct codes only, then merge duplicates
+        names, idx = np.unique(codes, return_inverse=True)
+        names, remap = np.unique(np.char.upper(names), return_inverse=True)
+        return names, remap[idx].astype(np.int64)
+    
+    def _save_conversion_history_many(self, amounts: "np.ndarray", from_codes: "np.ndarray",
+                                      to_codes: "np.ndarray", converted: "np.ndarray",
+                                      rates: "np.ndarray"):
+        """Save a batch of conversions to history (written behind)"""
+        valid = ~np.isnan(converted)
+        rows = zip(amounts[valid].tolist(), from_codes[valid].tolist(), to_codes[valid].tolist(),
+                   converted[valid].tolist(), rates[valid].tolist())
+        
+        self._writer.add_many(INSERT_HISTORY_SQL, rows)
+    
+    def convert_historical_many(self, amounts: Iterable[float],
+                                from_currencies: Union[str, Iterable[str]],
+                                to_currencies: Union[str, Iterable[str]],
+                                dates: Union[str, Iterable],
+                                date_policy: str = 'previous_business_day',
+                                holidays: Optional[Iterable[str]] = None,
+                                lookback_days: int = 7, save_history: bool = False,
+                                max_workers: int = 8) -> "np.ndarray":
+        """
+        Convert many amounts, each at the rate of its own booking date
+        
+        ``dates`` holds one date per row (YYYY-MM-DD strings, date/datetime
+        objects or datetime64) or a single date for every row. Booking dates
+        are mapped to rate dates by ``date_policy`` (see date_policy): with
+        previous_business_day, weekends and ``holidays`` use the business day
+        before, and a date the provider has no rate for falls back to the last
+        rate within ``lookback_days``. Each distinct (pair, rate date) is loaded
+        once from exchange_rates or backfilled like get_historical_rates, so a
+        year of bookings costs at most one fetch per pair and business day.
+        Rows without a rate come back as NaN.
+        """
+        start = time.perf_counter()
+        amounts = np.asarray(amounts, dtype=np.float64).ravel()
+        from_names, from_idx = self._currency_index(from_currencies, len(amounts))
+        to_names, to_idx = self._currency_index(to_currencies, len(amounts))
+        date_names, date_idx = self._date_index(dates, len(amounts))
+        
+        if len(amounts) == 0:
+            return np.empty(0, dtype=np.float64)
+        
+        rate_dates, remap = np.unique(
+            np.array(resolve_dates(date_names.tolist(), date_policy, holidays)), return_inverse=True)
+        row_dates = remap[date_idx]
+        
+        # One key per (pair, rate date); rates are resolved per key, then joined back
+        pair_ids = from_idx * len(to_names) + to_idx
+        keys, key_idx = np.unique(pair_ids * len(rate_dates) + row_dates, return_inverse=True)
+        key_rates = np.full(len(keys), np.nan)
+        key_pairs = keys // len(rate_dates)
+        lookback = lookback_days if date_policy != 'exact' else 0
+        
+        for pair_id in np.unique(key_pairs).tolist():
+            selected = np.flatnonzero(key_pairs == pair_id)
+            base_currency = str(from_names[pair_id // len(to_names)])
+            target_currency = str(to_names[pair_id % len(to_names)])
+            pair_dates = rate_dates[keys[selected] % len(rate_dates)].tolist()
+            
+            if base_currency == target_currency:
+                key_rates[selected] = 1.0
+                continue
+            
+            rates = self._rates_for_dates(base_currency, target_currency, pair_dates,
+                                          max_workers, lookback)
+            key_rates[selected] = [rates.get(date, np.nan) for date in pair_dates]
+        
+        rates = key_rates[key_idx.ravel()]
+        converted = amounts * rates
+        
+        if save_history:
+            self._save_conversion_history_many(amounts, from_names[from_idx], to_names[to_idx],
+                                               converted, rates)
+        
+        self.metrics.observe('historical_batch_seconds', time.perf_counter() - start)
+        self.metrics.inc('historical_batch_rows', len(amounts))
+        return converted
+    
+    def convert_on_date(self, amount: float, from_currency: str, to_currency: str, date,
+                        date_policy: str = 'previous_business_day') -> Optional[float]:
+        """Convert one amount at the rate of ``date`` (see convert_historical_many)"""
+        converted = self.convert_historical_many([amount], from_currency, to_currency, date,
+                                                 date_policy)[0]
+        return None if np.isnan(converted) else float(converted)
+    
+    @staticmethod
+    def _date_index(dates, size: int):
+        """
+        Map one date or a sequence of dates to (YYYY-MM-DD names, per-row index)
+        """
+        if isinstance(dates, (str, datetime, date_type)):
+            return np.array([str(dates)[:10]]), np.zeros(size, dtype=np.int64)
+        
+        values = dates if isinstance(dates, np.ndarray) else np.asarray(list(dates))
+        values = values.ravel()
+        if len(values) != size:
+            raise ValueError(f"Expected {size} dates, got {len(values)}")
+        
+        # Normalize the distinct values only, then merge duplicates
+        names, idx = np.unique(values, return_inverse=True)
+        if names.dtype.kind == 'M':
+            names = np.datetime_as_string(names.astype('datetime64[D]'))
+        else:
+            names = np.array([str(name)[:10] for name in names.tolist()])
+        names, remap = np.unique(names, return_inverse=True)
+        return names, remap[idx].astype(np.int64)
     
     def get_historical_rates(self, base_currency: str, target_currency: str, 
-                           days: int = 30) -> List[Dict]:
+                           days: int = 30, max_workers: int = 8) -> List[Dict]:
         """
         Get historical exchange rates for the specified period
+        
+        Dates already stored in the exchange_rates table are served locally.
+        Missing dates are fetched with one time-series request where the API
+        supports it, otherwise concurrently by at most ``max_workers`` threads,
+        and then persisted so repeat queries need no network.
         """
-        historical_data = []
+        base_currency = base_currency.upper()
+        target_currency = target_currency.upper()
+        dates = [(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+        if not dates:
+            return []
         
-        for i in range(days):
-            date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-            
-            try:
-                url = f"{self.base_url}/{date}"
-                params = {
-                    'base': base_currency.upper(),
-                    'symbols': target_currency.upper()
-                }
-                
-                response = requests.get(url, params=params, timeout=10)
-                response.raise_for_status()
-                
-                data = response.json()
-                
-                if data.get('success', False):
-                    rate = data['rates'].get(target_currency.upper())
+        rates = self._rates_for_dates(base_currency, target_currency, dates, max_workers)
+        return [{'date': date, 'rate': rates[date]} for date in dates if date in rates]
+    
+    def _rates_for_dates(self, base_currency: str, target_currency: str, dates: List[str],
+                         max_workers: int = 8, lookback_days: int = 0) -> Dict[str, float]:
+        """
+        Get a pair's rate for each date, from the store first, then the provider
+        
+        With ``lookback_days`` a date the provider has no rate for takes the
+        closest known rate at most that many days earlier. Past dates the
+        provider answered without a rate are remembered in ``missing_rates``
+        and not requested again.
+        """
+        first, last = min(dates), max(dates)
+        if lookback_days:
+            first = (datetime.strptime(first, '%Y-%m-%d')
+                     - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
+        
+        rates = self._get_stored_rates(base_currency, target_currency, first, last)
+        unavailable = self._get_missing_dates(base_currency, target_currency, first, last)
+        missing = sorted(set(date for date in dates
+                             if date not in rates and date not in unavailable), reverse=True)
+        fetched = {}
+        no_rate = []
+        
+        if len(missing) > 1:
+            fetched = self._fetch_timeseries(base_currency, target_currency, missing[-1], missing[0])
+            wanted = set(missing)
+            fetched = {date: rate for date, rate in fetched.items() if date in wanted}
+            missing = [date for date in missing if date not in fetched]
+        
+        if missing:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as pool:
+                results = pool.map(lambda date: self._try_fetch_historical_rate(
+                    base_currency, target_currency, date), missing)
+                for date, (rate, answered) in zip(missing, results):
                     if rate:
-                        historical_data.append({
-                            'date': date,
-                            'rate': rate
-                        })
-                        
-                time.sleep(0.1)  # Rate limiting
-                
-            except requests.RequestException as e:
-                print(f"Error fetching historical data for {date}: {e}")
-                continue
+                        fetched[date] = rate
+                    elif answered:
+                        no_rate.append(date)
+        
+        if fetched:
+            self._store_rates(base_currency, target_currency, fetched)
+            rates.update(fetched)
         
-        return historical_data
+        # Today's rate may simply not be published yet
+        today = datetime.now().strftime('%Y-%m-%d')
+        no_rate = [date for date in no_rate if date < today]
+        if no_rate:
+            self._writer.add_many(INSERT_MISSING_SQL, [
+                (base_currency.upper(), target_currency.upper(), date) for date in no_rate])
+        
+        if lookback_days:
+            known = sorted(rates)
+            for date in dates:
+                if date in rates:
+                    continue
+                earlier = bisect.bisect_left(known, date) - 1
+                oldest = (datetime.strptime(date, '%Y-%m-%d')
+                          - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
+                if earlier >= 0 and known[earlier] >= oldest:
+                    rates[date] = rates[known[earlier]]
+        
+        return rates
+    
+    def _try_fetch_historical_rate(self, base_currency: str, target_currency: str,
+                                   date: str) -> Tuple[Optional[float], bool]:
+        """Fetch one date's rate as (rate, whether the provider answered)"""
+        try:
+            with self.metrics.timer('http_fetch_seconds'):
+                return self.provider.get_rate(base_currency, target_currency, date), True
+        except RateProviderError as e:
+            print(f"Error fetching historical data for {date}: {e}")
+            self.metrics.inc('upstream_errors')
+            return None, False
+    
+    def _fetch_timeseries(self, base_currency: str, target_currency: str,
+                          start_date: str, end_date: str) -> Dict[str, float]:
+        """Fetch a date range in one request; empty if the provider does not support it"""
+        if not self.provider.supports_range:
+            return {}
+        
+        try:
+            with self.metrics.timer('http_fetch_seconds'):
+                return self.provider.get_range(base_currency, target_currency, start_date, end_date)
+        except RateProviderError as e:
+            print(f"Time-series request failed, fetching dates individually: {e}")
+            self.metrics.inc('upstream_errors')
+            return {}
+    
+    def _get_stored_rates(self, base_currency: str, target_currency: str,
+                          start_date: str, end_date: str) -> Dict[str, float]:
+        """Get stored rates by date for a pair within a date range"""
+        self._writer.flush()
+        
+        with self.metrics.timer('sqlite_read_seconds'), self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT date, rate FROM exchange_rates 
+                WHERE base_currency = ? AND target_currency = ? AND date BETWEEN ? AND ?
+            ''', (base_currency.upper(), target_currency.upper(), start_date, end_date))
+            
+            return {date: rate for date, rate in cursor.fetchall()}
+    
+    def _get_missing_dates(self, base_currency: str, target_currency: str,
+                           start_date: str, end_date: str) -> Set[str]:
+        """Get the dates in a range the provider is known to have no rate for"""
+        
+        with self.metrics.timer('sqlite_read_seconds'), self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT date FROM missing_rates
+                WHERE base_currency = ? AND target_currency = ? AND date BETWEEN ? AND ?
+            ''', (base_currency.upper(), target_currency.upper(), start_date, end_date))
+            
+            return {row[0] for row in cursor.fetchall()}
+    
+    def _store_rates(self, base_currency: str, target_currency: str, rates: Dict[str, float]):
+        """Persist rates by date for a pair (written behind)"""
+        self._writer.add_many(INSERT_RATE_SQL, [
+            (base_currency.upper(), target_currency.upper(), rate, date)
+            for date, rate in rates.items()])
+    
+    def get_conversion_history(self, limit: int = 10) -> List[HistoryRecord]:
+        """Get recent conversion history as records (``record['amount']`` also works)"""
+        self._writer.flush()
+        
+        with self.metrics.timer('sqlite_read_seconds'), self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT amount, from_currency, to_currency, converted_amount, rate, timestamp
+                FROM conversion_history 
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ?
+            ''', (limit,))
+            rows = cursor.fetchall()
+        
+        return [HistoryRecord(*row) for row in rows]
     
-    def get_conversion_history(self, limit: int = 10) -> List[Dict]:
-        """Get recent conversion history"""
-        cursor = self.db_connection.cursor()
+    def iter_conversion_history(self, start: Union[str, datetime, None] = None,
+                                end: Union[str, datetime, None] = None,
+                                from_currency: Optional[str] = None,
+                                to_currency: Optional[str] = None,
+                                batch_size: int = 5000) -> Iterator[HistoryRecord]:
+        """
+        Yield conversion history oldest first, ``start <= timestamp < end``
+        
+        Rows are read in pages of ``batch_size`` with keyset pagination on
+        (timestamp, id) over the timestamp index, so memory stays constant and
+        every page is a short indexed range scan however large the table is.
+        No read transaction is held between pages. Rows recorded after the
+        export started are included if they fall inside the range.
+        """
+        self._writer.flush()
+        
+        def bound(value):
+            if isinstance(value, (datetime, date_type)):
+                return value.strftime('%Y-%m-%d %H:%M:%S')
+            return value
+        
+        conditions = ['(timestamp, id) > (?, ?)']
+        params = [bound(start) or '', 0]
+        if end is not None:
+            conditions.append('timestamp < ?')
+            params.append(bound(end))
+        if from_currency:
+            conditions.append('from_currency = ?')
+            params.append(from_currency.upper())
+        if to_currency:
+            conditions.append('to_currency = ?')
+            params.append(to_currency.upper())
         
-        cursor.execute('''
-            SELECT amount, from_currency, to_currency, converted_amount, rate, timestamp
-            FROM conversion_history 
-            ORDER BY timestamp DESC 
+        # (start, 0) sorts before every row at ``start`` itself
+        query = f'''
+            SELECT amount, from_currency, to_currency, converted_amount, rate, timestamp, id
+            FROM conversion_history
+            WHERE {' AND '.join(conditions)}
+            ORDER BY timestamp, id
             LIMIT ?
-        ''', (limit,))
+        '''
+        params.append(batch_size)
+        
+        while True:
+            with self.metrics.timer('sqlite_read_seconds'), self.db_pool.connection() as conn:
+                rows = conn.execute(query, params).fetchall()
+            for row in rows:
+                yield HistoryRecord(*row[:6])
+            if len(rows) < batch_size:
+                return
+            params[0], params[1] = rows[-1][5], rows[-1][6]
+    
+    def get_daily_history(self, start: Optional[str] = None, end: Optional[str] = None,
+                          from_currency: Optional[str] = None,
+                          to_currency: Optional[str] = None) -> List[Dict]:
+        """
+        Get the daily per-pair totals of rolled-up history (see maintain()),
+        oldest first, ``start <= date < end``
+        """
+        conditions = ['date >= ?']
+        params = [start or '']
+        if end is not None:
+            conditions.append('date < ?')
+            params.append(end)
+        if from_currency:
+            conditions.append('from_currency = ?')
+            params.append(from_currency.upper())
+        if to_currency:
+            conditions.append('to_currency = ?')
+            params.append(to_currency.upper())
         
-        history = []
-        for row in cursor.fetchall():
-            history.append({
-                'amount': row[0],
-                'from_currency': row[1],
-                'to_currency': row[2],
-                'converted_amount': row[3],
-                'rate': row[4],
-                'timestamp': row[5]
-            })
+        with self.metrics.timer('sqlite_read_seconds'), self.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT date, from_currency, to_currency, conversions, total_amount,
+                       total_converted, min_rate, max_rate
+                FROM conversion_history_daily
+                WHERE {' AND '.join(conditions)}
+                ORDER BY date, from_currency, to_currency
+            ''', params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    def maintain(self, retention_days: int = DEFAULT_RETENTION_DAYS,
+                 rate_retention_days: Optional[int] = None, vacuum: bool = True) -> Dict:
+        """
+        Roll conversion history older than ``retention_days`` up into daily
+        per-pair totals, drop rates older than ``rate_retention_days`` (None
+        keeps them) and vacuum the freed pages (see db_maintenance)
         
-        return history
+        Returns the rows affected, bytes reclaimed and seconds taken.
+        """
+        self._writer.flush()
+        with self.metrics.timer('maintenance_seconds'), self.db_pool.connection() as conn:
+            result = run_maintenance(conn, retention_days, rate_retention_days, vacuum=vacuum)
+        self.metrics.inc('maintenance_bytes_reclaimed', max(0, result['bytes_reclaimed']))
+        return result
+    
+    def cache_stats(self) -> Dict:
+        """Get hit/miss/eviction counters of the in-memory rate cache"""
+        return self.rate_cache.stats()
+    
+    def stats(self) -> Dict:
+        """
+        Get latency histograms (seconds), counters, rate cache, HTTP
+        transport and SQLite pool statistics in one dictionary
+        """
+        stats = self.metrics.snapshot()
+        stats['cache'] = self.rate_cache.stats()
+        stats['transport'] = self.transport.stats()
+        stats['pending_writes'] = self._writer.pending()
+        stats['sqlite_pool'] = self.db_pool.stats()
+        if self.refresher is not None:
+            stats['refresher'] = self.refresher.stats()
+        if self.maintenance is not None:
+            stats['maintenance'] = self.maintenance.stats()
+        return stats
+    
+    def prometheus_metrics(self) -> str:
+        """Get stats() in the Prometheus text exposition format"""
+        cache = self.rate_cache.stats()
+        transport = self.transport.stats()
+        return self.metrics.to_prometheus(extra_counters={
+            'cache_hits': cache['hits'],
+            'cache_misses': cache['misses'],
+            'cache_evictions': cache['evictions'],
+            'http_connections_opened': transport['connections_opened'],
+            'http_connections_reused': transport['connections_reused'],
+            'sqlite_connections_opened': self.db_pool.connections_opened
+        }, extra_gauges={
+            'cache_size': cache['size'],
+            'pending_writes': self._writer.pending(),
+            'sqlite_connections_open': len(self.db_pool)
+        })
+    
+    def run(self, host: str = '127.0.0.1', port: int = 8080, workers: int = 8):
+        """Serve conversions over HTTP until interrupted (see conversion_service)"""
+        from conversion_service import serve
+        serve(self, host, port, workers=workers)
     
     def close(self):
-        """Close database connection"""
-        if self.db_connection:
-            self.db_connection.close()
\ No newline at end of file
+        """Stop background threads, flush buffered writes and close database connections"""
+        if self.refresher is not None:
+            self.refresher.close()
+        if self.maintenance is not None:
+            self.maintenance.close()
+        self._writer.close()
+        self.db_pool.close()
\ No newline at end of file
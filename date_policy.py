@@ -0,0 +1,32 @@
+"""
+Rate-date policies for conversions booked on weekends and holidays
+"""
+
+from datetime import date as date_type, datetime, timedelta
+from typing import Iterable, List, Optional
+
+# exact: use the booking date as is
+# previous_business_day: weekends and listed holidays use the business day before
+DATE_POLICIES = ('exact', 'previous_business_day')
+
+
+def previous_business_day(day: date_type, holidays: frozenset = frozenset()) -> date_type:
+    """Get ``day`` itself if it is a business day, else the closest one before it"""
+    while day.weekday() >= 5 or day.isoformat() in holidays:
+        day -= timedelta(days=1)
+    return day
+
+
+def resolve_dates(dates: Iterable[str], policy: str = 'previous_business_day',
+                  holidays: Optional[Iterable[str]] = None) -> List[str]:
+    """Map booking dates (YYYY-MM-DD) to the dates whose rates apply"""
+    if policy not in DATE_POLICIES:
+        raise ValueError(f"date policy must be one of {', '.join(DATE_POLICIES)}")
+
+    dates = list(dates)
+    if policy == 'exact':
+        return dates
+
+    holidays = frozenset(str(day)[:10] for day in (holidays or ()))
+    return [previous_business_day(datetime.strptime(day, '%Y-%m-%d').date(), holidays).isoformat()
+            for day in dates]
@@ -0,0 +1,209 @@
+"""
+Retention, roll-up and space reclamation for the currency database
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+# conversion_history rows older than this many days are rolled up into
+# conversion_history_daily
+DEFAULT_RETENTION_DAYS = 90
+
+ROLLUP_SQL = '''
+    INSERT INTO conversion_history_daily
+    (date, from_currency, to_currency, conversions, total_amount, total_converted,
+     min_rate, max_rate)
+    SELECT date(timestamp), from_currency, to_currency, COUNT(*), SUM(amount),
+           SUM(converted_amount), MIN(rate), MAX(rate)
+    FROM conversion_history
+    WHERE {condition}
+    GROUP BY date(timestamp), from_currency, to_currency
+    ON CONFLICT (date, from_currency, to_currency) DO UPDATE SET
+        conversions = conversions + excluded.conversions,
+        total_amount = total_amount + excluded.total_amount,
+        total_converted = total_converted + excluded.total_converted,
+        min_rate = MIN(min_rate, excluded.min_rate),
+        max_rate = MAX(max_rate, excluded.max_rate)
+'''
+
+
+def database_bytes(conn: sqlite3.Connection) -> int:
+    """Size of the database in bytes, pages in the WAL included"""
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    return page_count * page_size
+
+
+def _cutoff(days: int) -> str:
+    """Midnight (UTC) ``days`` days ago, so whole days are rolled up together"""
+    day = datetime.now(timezone.utc).date() - timedelta(days=days)
+    return f"{day.isoformat()} 00:00:00"
+
+
+def roll_up_history(conn: sqlite3.Connection, retention_days: int = DEFAULT_RETENTION_DAYS,
+                    batch_rows: int = 50000) -> int:
+    """
+    Move conversion_history rows older than ``retention_days`` into daily
+    per-pair totals; returns the number of rows rolled up
+
+    Rows are processed oldest first in transactions of ``batch_rows`` so the
+    write lock is never held for long. A day split across batches or runs is
+    merged into the same conversion_history_daily row.
+    """
+    cutoff = _cutoff(retention_days)
+    total = 0
+
+    while True:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            last = conn.execute('''
+                SELECT timestamp, id FROM conversion_history
+                WHERE timestamp < ?
+                ORDER BY timestamp, id
+                LIMIT 1 OFFSET ?
+            ''', (cutoff, batch_rows - 1)).fetchone()
+            if last is None:
+                condition, params = 'timestamp < ?', (cutoff,)
+            else:
+                condition, params = '(timestamp, id) <= (?, ?)', last
+
+            conn.execute(ROLLUP_SQL.format(condition=condition), params)
+            deleted = conn.execute(f'DELETE FROM conversion_history WHERE {condition}',
+                                   params).rowcount
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+        total += deleted
+        if last is None:
+            return total
+
+
+def prune_rates(conn: sqlite3.Connection, retention_days: Optional[int] = None) -> int:
+    """
+    Delete exchange_rates older than ``retention_days`` (None keeps them all);
+    returns the number of rows deleted
+
+    The table already holds one row per pair and date (migration 2), so age
+    is the only thing left to compact.
+    """
+    if retention_days is None:
+        return 0
+
+    cutoff = (datetime.now(timezone.utc).date() - timedelta(days=retention_days)).isoformat()
+    try:
+        deleted = conn.execute('DELETE FROM exchange_rates WHERE date < ?', (cutoff,)).rowcount
+        conn.execute('DELETE FROM missing_rates WHERE date < ?', (cutoff,))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return deleted
+
+
+def reclaim_space(conn: sqlite3.Connection) -> str:
+    """
+    Return free pages to the file system; returns 'incremental' or 'full'
+
+    Databases created before auto_vacuum was enabled are rebuilt once with a
+    full VACUUM, which switches them to incremental vacuuming.
+    """
+    conn.commit()
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+        mode = 'full'
+    else:
+        # executescript steps the pragma to completion; execute() frees one page
+        conn.executescript('PRAGMA incremental_vacuum;')
+        mode = 'incremental'
+
+    # Shrink the WAL too; a busy checkpoint just leaves it for later
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+    return mode
+
+
+def run_maintenance(conn: sqlite3.Connection, retention_days: int = DEFAULT_RETENTION_DAYS,
+                    rate_retention_days: Optional[int] = None, batch_rows: int = 50000,
+                    vacuum: bool = True) -> Dict:
+    """
+    Roll up old history, prune old rates and reclaim the freed space
+
+    Returns the rows affected, the database size before and after, the
+    bytes reclaimed and the seconds taken.
+    """
+    start = time.perf_counter()
+    bytes_before = database_bytes(conn)
+
+    history_rows = roll_up_history(conn, retention_days, batch_rows)
+    rate_rows = prune_rates(conn, rate_retention_days)
+    vacuum_mode = reclaim_space(conn) if vacuum else None
+
+    bytes_after = database_bytes(conn)
+    return {
+        'history_rows_rolled_up': history_rows,
+        'rate_rows_deleted': rate_rows,
+        'vacuum': vacuum_mode,
+        'bytes_before': bytes_before,
+        'bytes_after': bytes_after,
+        'bytes_reclaimed': bytes_before - bytes_after,
+        'seconds': time.perf_counter() - start
+    }
+
+
+class MaintenanceScheduler:
+    def __init__(self, converter, interval: float = 86400.0, **options):
+        """
+        Run ``converter.maintain(**options)`` every ``interval`` seconds
+
+        The first run starts right away. A failed run is logged and retried
+        at the next interval.
+        """
+        self.converter = converter
+        self.interval = interval
+        self.options = options
+        self.runs = 0
+        self.failures = 0
+        self.last_result: Optional[Dict] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='db-maintenance', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def is_running(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def run_once(self) -> Optional[Dict]:
+        try:
+            self.last_result = self.converter.maintain(**self.options)
+        except sqlite3.Error as e:
+            print(f"Database maintenance failed: {e}")
+            self.failures += 1
+            return None
+        self.runs += 1
+        return self.last_result
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            if self._stop.wait(self.interval):
+                return
+
+    def stats(self) -> Dict:
+        return {
+            'running': self.is_running(),
+            'runs': self.runs,
+            'failures': self.failures,
+            'last_result': self.last_result
+        }
+
+    def close(self):
+        """Stop the maintenance thread"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
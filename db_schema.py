@@ -0,0 +1,125 @@
+"""
+Versioned schema migrations for the currency SQLite database
+"""
+
+import sqlite3
+from typing import List
+
+# Each entry upgrades the schema by one version; PRAGMA user_version records
+# how many have been applied. Never edit a released migration, append a new one.
+MIGRATIONS: List[List[str]] = [
+    # 1: base tables
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS exchange_rates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            base_currency TEXT NOT NULL,
+            target_currency TEXT NOT NULL,
+            rate REAL NOT NULL,
+            date TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS conversion_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount REAL NOT NULL,
+            from_currency TEXT NOT NULL,
+            to_currency TEXT NOT NULL,
+            converted_amount REAL NOT NULL,
+            rate REAL NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ],
+    # 2: one rate per (base, target, date), keeping the most recently stored row
+    [
+        '''
+        DELETE FROM exchange_rates WHERE id NOT IN (
+            SELECT MAX(id) FROM exchange_rates
+            GROUP BY base_currency, target_currency, date
+        )
+        ''',
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_exchange_rates_pair_date
+        ON exchange_rates (base_currency, target_currency, date)
+        ''',
+        # Covering index: rate lookups and date-range scans never touch the table
+        '''
+        CREATE INDEX IF NOT EXISTS idx_exchange_rates_lookup
+        ON exchange_rates (base_currency, target_currency, date, rate)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_conversion_history_timestamp
+        ON conversion_history (timestamp)
+        ''',
+    ],
+    # 3: token buckets shared by processes (see rate_limiter.SQLiteTokenBucket)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            host TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL,
+            blocked_until REAL NOT NULL,
+            rate REAL
+        )
+        ''',
+    ],
+    # 4: daily per-pair totals of conversions rolled up by db_maintenance
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS conversion_history_daily (
+            date TEXT NOT NULL,
+            from_currency TEXT NOT NULL,
+            to_currency TEXT NOT NULL,
+            conversions INTEGER NOT NULL,
+            total_amount REAL NOT NULL,
+            total_converted REAL NOT NULL,
+            min_rate REAL NOT NULL,
+            max_rate REAL NOT NULL,
+            PRIMARY KEY (date, from_currency, to_currency)
+        )
+        ''',
+    ],
+    # 5: past dates the provider has no rate for, so they are not refetched
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS missing_rates (
+            base_currency TEXT NOT NULL,
+            target_currency TEXT NOT NULL,
+            date TEXT NOT NULL,
+            PRIMARY KEY (base_currency, target_currency, date)
+        ) WITHOUT ROWID
+        ''',
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending migrations, each in its own transaction
+
+    Returns the schema version the database ends up at.
+    """
+    version = get_schema_version(conn)
+
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN')
+            for statement in MIGRATIONS[number - 1]:
+                cursor.execute(statement)
+            cursor.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+    return get_schema_version(conn)
@@ -0,0 +1,182 @@
+"""
+Pooled HTTP transport shared by the rate clients: keep-alive, retries and backoff
+"""
+
+import random
+import threading
+import time
+from typing import Optional, Dict
+
+from lazy_import import lazy_module
+from rate_limiter import RateLimiter, get_default_limiter
+
+requests = lazy_module('requests')
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+BACKOFF_FACTOR = 0.5
+BACKOFF_MAX = 10.0
+
+
+def retry_delay(attempt: int, backoff_factor: float, backoff_max: float,
+                retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential delay, never shorter than a Retry-After header"""
+    delay = random.uniform(0, min(backoff_max, backoff_factor * (2 ** attempt)))
+
+    if retry_after:
+        try:
+            delay = max(delay, min(float(retry_after), backoff_max))
+        except ValueError:
+            pass
+
+    return delay
+
+
+class HttpTransport:
+    def __init__(self, timeout: float = 10.0, pool_connections: int = 10, pool_maxsize: int = 10,
+                 host_pool_sizes: Optional[Dict[str, int]] = None, max_retries: int = 3,
+                 backoff_factor: float = BACKOFF_FACTOR, backoff_max: float = BACKOFF_MAX,
+                 rate_limiter: Optional[RateLimiter] = None):
+        """
+        Initialize a keep-alive session with connection pooling
+
+        ``pool_maxsize`` is the number of connections kept per host;
+        ``host_pool_sizes`` overrides it for individual hosts. Requests failing
+        with a connection error or a 429/5xx status are retried up to
+        ``max_retries`` times with jittered exponential backoff. The session
+        (and the requests import) is created on first use.
+
+        Every request first takes a token from ``rate_limiter`` (by default the
+        limiter shared by all transports in the process) for its host. A 429
+        or Retry-After pauses the whole host and lowers its rate, so other
+        threads back off too instead of piling more requests on.
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter or get_default_limiter()
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.host_pool_sizes = dict(host_pool_sizes or {})
+        self._session = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+
+    @property
+    def session(self) -> "requests.Session":
+        session = self._session
+        if session is not None:
+            return session
+
+        with self._lock:
+            if self._session is None:
+                self._session = self._create_session()
+            return self._session
+
+    def _create_session(self) -> "requests.Session":
+        session = requests.Session()
+        HTTPAdapter = requests.adapters.HTTPAdapter
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        for host, size in self.host_pool_sizes.items():
+            host_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+            session.mount(f'http://{host}', host_adapter)
+            session.mount(f'https://{host}', host_adapter)
+        return session
+
+    def get(self, url: str, params: Optional[Dict] = None,
+            timeout: Optional[float] = None) -> "requests.Response":
+        """
+        Send a GET request through the pool, retrying transient failures
+
+        The last response is returned once retries are exhausted; connection
+        errors and timeouts are re-raised as requests.RequestException.
+        """
+        timeout = self.timeout if timeout is None else timeout
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(url)
+            self._count('requests')
+            try:
+                response = self.session.get(url, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count('errors')
+                if attempt == self.max_retries:
+                    raise
+                self._count('retries')
+                time.sleep(self._backoff(attempt))
+                continue
+
+            retry_after = response.headers.get('Retry-After')
+            if response.status_code == 429 or (retry_after and response.status_code in RETRY_STATUSES):
+                # The limiter makes every thread wait out the pause, this one included
+                self.rate_limiter.throttle(url, self._backoff(attempt, retry_after))
+                if attempt < self.max_retries:
+                    self._count('retries')
+                    response.close()
+                    continue
+            elif response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                self._count('retries')
+                delay = self._backoff(attempt)
+                response.close()
+                time.sleep(delay)
+                continue
+            elif response.status_code < 400:
+                self.rate_limiter.reward(url)
+
+            return response
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        return retry_delay(attempt, self.backoff_factor, self.backoff_max, retry_after)
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict:
+        """Get request/retry counters and connections opened versus reused"""
+        opened = 0
+        pooled_requests = 0
+        session = self._session
+        adapters = {id(adapter): adapter
+                    for adapter in (session.adapters.values() if session else ())}
+
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    opened += pool.num_connections
+                    pooled_requests += pool.num_requests
+
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'errors': self.errors,
+            'connections_opened': opened,
+            'connections_reused': max(0, pooled_requests - opened),
+            'rate_limits': self.rate_limiter.stats()
+        }
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+
+
+_default_transport: Optional[HttpTransport] = None
+_default_lock = threading.Lock()
+
+
+def get_default_transport() -> HttpTransport:
+    """Get the process-wide transport shared by all converters"""
+    global _default_transport
+
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = HttpTransport()
+        return _default_transport
@@ -0,0 +1,142 @@
+"""
+Lightweight counters and latency histograms for the converter hot paths
+"""
+
+import bisect
+import threading
+import time
+from typing import Dict, List
+
+# Exponential bucket bounds from 1 microsecond to ~134 seconds
+DEFAULT_BUCKETS: List[float] = [1e-6 * (2 ** i) for i in range(28)]
+
+
+class Histogram:
+    def __init__(self, buckets: List[float] = None):
+        """
+        Fixed-bucket latency histogram
+
+        Recording is one bisect and two additions, cheap enough to leave on in
+        production. Quantiles are reported as the upper bound of their bucket.
+        """
+        self.buckets = buckets or DEFAULT_BUCKETS
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'max': self.max
+        }
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True):
+        """Registry of named counters and histograms"""
+        self.enabled = enabled
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: int = 1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        if self.enabled:
+            with self._lock:
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram()
+                histogram.observe(seconds)
+
+    def timer(self, name: str) -> "_Timer":
+        """Record the duration of a with-block in histogram `name`"""
+        return _Timer(self, name)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {name: histogram.summary()
+                               for name, histogram in self.histograms.items()}
+            }
+
+    def to_prometheus(self, prefix: str = 'currency_converter',
+                      extra_gauges: Dict[str, float] = None,
+                      extra_counters: Dict[str, int] = None) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format
+
+        ``extra_counters`` are monotonic totals kept elsewhere (exported with
+        a _total suffix), ``extra_gauges`` values that can go down.
+        """
+        lines = []
+        with self._lock:
+            counters = dict(self.counters)
+            counters.update(extra_counters or {})
+            for name, value in sorted(counters.items()):
+                metric = f"{prefix}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+
+            for name, histogram in sorted(self.histograms.items()):
+                metric = f"{prefix}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {histogram.count}')
+                lines.append(f"{metric}_sum {histogram.sum:.9f}")
+                lines.append(f"{metric}_count {histogram.count}")
+
+        for name, value in sorted((extra_gauges or {}).items()):
+            metric = f"{prefix}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+
+        return "\n".join(lines) + "\n"
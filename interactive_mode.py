@@ -3,11 +3,15 @@ Interactive mode for the currency converter
 """
 
 from currency_converter import CurrencyConverter
+from cli_interface import describe_rate_source, print_rate_report
 import sys
 
 def interactive_mode():
     """Run currency converter in interactive mode"""
     converter = CurrencyConverter()
+    # Fetch the rate table while the user types and keep it fresh between prompts,
+    # so conversions for any base are answered from memory
+    converter.start_refresher(retry_interval=60.0)
     
     print("🎯 Real-time Currency Converter - Interactive Mode")
     print("Type 'quit' to exit, 'history' to see conversion history")
@@ -40,9 +44,9 @@ def interactive_mode():
                     result = converter.convert_currency(amount, from_currency, to_currency)
                     
                     if result is not None:
-                        rate = converter.get_real_time_rate(from_currency, to_currency)
-                        print(f"✅ {amount} {from_currency} = {result:.2f} {to_currency}")
-                        print(f"   Exchange Rate: 1 {from_currency} = {rate:.4f} {to_currency}")
+                        print(f"✅ {amount} {from_currency} = {result.converted_amount:.2f} {to_currency}")
+                        print(f"   Exchange Rate: 1 {from_currency} = {result.rate:.4f} {to_currency}"
+                              f" ({describe_rate_source(result)})")
                     else:
                         print("❌ Error: Could not perform conversion. Please check currency codes.")
                         
@@ -84,13 +88,12 @@ def show_historical_menu(converter: CurrencyConverter):
     
     try:
         days = int(days) if days else 30
-        historical_data = converter.get_historical_rates(from_currency, to_currency, days)
+        report = converter.analytics.report(from_currency, to_currency, days)
         
-        if historical_data:
+        if report['rows']:
             print(f"\nHistorical Rates for {from_currency} to {to_currency} (Last {days} days):")
-            print("-" * 40)
-            for data in historical_data:
-                print(f"📅 {data['date']}: {data['rate']:.4f}")
+            print("-" * 60)
+            print_rate_report(report)
         else:
             print("❌ No historical data available for the specified currencies.")
             
@@ -0,0 +1,30 @@
+"""
+Deferred imports for heavy dependencies (numpy, requests, aiohttp)
+
+The CLI is started from shell pipelines many times a minute, and commands such
+as ``--history`` never touch the network or NumPy. Modules bind these packages
+through ``lazy_module`` so their import cost is paid on first real use.
+"""
+
+import importlib
+import threading
+from types import ModuleType
+
+
+class _LazyModule(ModuleType):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+    def __getattr__(self, attr: str):
+        # Only reached while the real module has not been loaded yet
+        with self.__dict__['_lazy_lock']:
+            if '__file__' not in self.__dict__:
+                module = importlib.import_module(self.__name__)
+                self.__dict__.update(module.__dict__)
+        return getattr(importlib.import_module(self.__name__), attr)
+
+
+def lazy_module(name: str) -> ModuleType:
+    """Get a stand-in for module ``name`` that imports it on first attribute access"""
+    return _LazyModule(name)
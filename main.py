@@ -2,17 +2,37 @@
 Main entry point for the Currency Converter application
 """
 
+import argparse
+
 from currency_converter import CurrencyConverter
+from db_maintenance import DEFAULT_RETENTION_DAYS
 
 def main():
     """Main function to start the application"""
+    parser = argparse.ArgumentParser(description='Currency conversion HTTP service')
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Number of threads handling requests (default 8)')
+    parser.add_argument('--maintain-every', type=float, metavar='HOURS',
+                        help='Run database maintenance at start-up and then every HOURS hours')
+    parser.add_argument('--retention-days', type=int, default=DEFAULT_RETENTION_DAYS,
+                        help=f'Maintenance: keep individual history rows this many days (default {DEFAULT_RETENTION_DAYS})')
+    args = parser.parse_args()
+    
+    converter = None
     try:
-        converter = CurrencyConverter()
-        converter.run()
+        converter = CurrencyConverter(background_refresh=True)
+        if args.maintain_every:
+            converter.start_maintenance(args.maintain_every * 3600, args.retention_days)
+        converter.run(args.host, args.port, args.workers)
     except KeyboardInterrupt:
         print("\n\nApplication interrupted by user. Goodbye!")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+    finally:
+        if converter is not None:
+            converter.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,195 @@
+"""
+Local stub HTTP rate server for tests, load tests and offline development
+
+Serves the exchangerate.host endpoints (/latest, /<date>, /timeseries) and the
+exchangerate-api.com /v4/latest/<base> endpoint from any RateProvider, with
+optional injected latency. Run standalone with:
+
+    python mock_rate_server.py --rates ./fixtures --port 8765 --latency 0.05
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from datetime import date as date_type
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, List, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from rate_providers import RateProvider, RateProviderError, FileRateProvider
+from rate_snapshot import RateSnapshot
+
+DEFAULT_CURRENCIES = ['USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD', 'CHF', 'CNY', 'INR', 'BRL']
+
+
+class StaticRateProvider(RateProvider):
+    """
+    Deterministic synthetic rates for any date, generated in memory
+
+    Each currency gets a base level against USD plus a small daily wave, so
+    every date has a distinct but reproducible table.
+    """
+
+    name = 'static'
+    supports_range = True
+
+    def __init__(self, currencies: Optional[List[str]] = None, today: Optional[str] = None):
+        self.currencies = [code.upper() for code in (currencies or DEFAULT_CURRENCIES)]
+        self.today = today or date_type.today().isoformat()
+
+    def _table(self, day: str) -> Dict[str, float]:
+        ordinal = date_type.fromisoformat(day).toordinal()
+        rates = {}
+        for i, code in enumerate(self.currencies):
+            level = 1.0 if code == 'USD' else 0.5 + (i * 7 % 23) * 0.35
+            rates[code] = round(level * (1 + 0.01 * math.sin(ordinal / 5.0 + i)), 6)
+        rates['USD'] = 1.0
+        return rates
+
+    def get_snapshot(self, base_currency: str) -> Optional[RateSnapshot]:
+        return RateSnapshot('USD', self._table(self.today), self.today).rebase(base_currency)
+
+    def get_rate(self, base_currency: str, target_currency: str, date: str) -> Optional[float]:
+        return RateSnapshot('USD', self._table(date), date).rate(base_currency, target_currency)
+
+
+class MockRateServer:
+    def __init__(self, provider: Optional[RateProvider] = None, latency: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0):
+        """
+        Create a stub rate server; port 0 picks a free port
+
+        ``latency`` seconds are slept before answering each request.
+        """
+        self.provider = provider or StaticRateProvider()
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL in the exchangerate.host layout"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockRateServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def respond(self, path: str, query: Dict[str, str]) -> Tuple[int, Dict]:
+        """Build the JSON response for a request path"""
+        with self._lock:
+            self.requests += 1
+
+        base = query.get('base', 'USD').upper()
+        symbols = [code for code in query.get('symbols', '').upper().split(',') if code]
+        parts = [part for part in path.split('/') if part]
+
+        def pick(snapshot):
+            if snapshot is None:
+                return None
+            if not symbols:
+                return dict(snapshot.rates)
+            return {code: snapshot.rate(base, code) for code in symbols if code in snapshot}
+
+        try:
+            if parts[:2] == ['v4', 'latest'] and len(parts) == 3:
+                snapshot = self.provider.get_snapshot(parts[2])
+                if snapshot is None:
+                    return 404, {'result': 'error', 'error-type': 'unsupported-code'}
+                return 200, {'base': snapshot.base_currency, 'date': snapshot.timestamp,
+                             'time_last_updated': int(time.time()), 'rates': dict(snapshot.rates)}
+
+            if parts == ['latest']:
+                snapshot = self.provider.get_snapshot(base)
+                rates = pick(snapshot)
+                return 200, {'success': rates is not None, 'base': base,
+                             'date': snapshot.timestamp if snapshot else None, 'rates': rates or {}}
+
+            if parts == ['timeseries']:
+                series = {}
+                for symbol in symbols:
+                    for day, rate in self.provider.get_range(
+                            base, symbol, query['start_date'], query['end_date']).items():
+                        series.setdefault(day, {})[symbol] = rate
+                return 200, {'success': True, 'timeseries': True, 'base': base, 'rates': series}
+
+            if len(parts) == 1:
+                day = date_type.fromisoformat(parts[0]).isoformat()
+                rates = {code: self.provider.get_rate(base, code, day) for code in symbols}
+                rates = {code: rate for code, rate in rates.items() if rate}
+                return 200, {'success': bool(rates), 'base': base, 'date': day, 'rates': rates}
+
+        except (ValueError, KeyError) as e:
+            return 400, {'success': False, 'error': str(e)}
+        except RateProviderError as e:
+            return 502, {'success': False, 'error': str(e)}
+
+        return 404, {'success': False, 'error': 'not found'}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as separate writes; avoid delayed-ACK stalls
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+
+                parsed = urlparse(self.path)
+                query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+                status, payload = server.respond(parsed.path, query)
+
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock exchange rate server')
+    parser.add_argument('--rates', help='Directory or file of rate snapshots (default: synthetic rates)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of delay per request')
+    args = parser.parse_args()
+
+    provider = FileRateProvider(args.rates) if args.rates else StaticRateProvider()
+    server = MockRateServer(provider, args.latency, args.host, args.port)
+    print(f"Serving mock rates on {server.url} (Ctrl+C to stop)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
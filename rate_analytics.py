@@ -0,0 +1,369 @@
+"""
+Rolling analytics over the stored exchange_rates series
+
+Windows count observations (stored days), not calendar days. Volatility is the
+sample standard deviation of daily log returns, not annualized.
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+
+class RateSeries:
+    def __init__(self, base_currency: str, target_currency: str):
+        """
+        Array-backed daily rate series for one pair, oldest first
+
+        Points are appended in date order; storage grows by doubling so a
+        daily append is amortized O(1). ``dates``/``rates`` are views.
+        """
+        self.base_currency = base_currency.upper()
+        self.target_currency = target_currency.upper()
+        self._dates = np.empty(0, dtype='datetime64[D]')
+        self._rates = np.empty(0, dtype=np.float64)
+        self._size = 0
+
+    @property
+    def dates(self) -> "np.ndarray":
+        return self._dates[:self._size]
+
+    @property
+    def rates(self) -> "np.ndarray":
+        return self._rates[:self._size]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def last_date(self) -> Optional[str]:
+        return str(self._dates[self._size - 1]) if self._size else None
+
+    def extend(self, dates: List[str], rates: List[float]) -> int:
+        """
+        Add points dated on or after the last one; a point for the last date
+        replaces it. Returns the index of the first changed point.
+        """
+        start = self._size
+        if not dates:
+            return start
+
+        new_dates = np.array(dates, dtype='datetime64[D]')
+        new_rates = np.asarray(rates, dtype=np.float64)
+        if self._size and new_dates[0] == self._dates[self._size - 1]:
+            start = self._size - 1
+        elif self._size and new_dates[0] < self._dates[self._size - 1]:
+            raise ValueError('points must be appended in date order')
+        return self._write(start, new_dates, new_rates)
+
+    def merge(self, dates: List[str], rates: List[float]) -> int:
+        """
+        Add points at any date; a point for a date already held replaces it.
+        Returns the index of the first changed point (``len(self)`` if none).
+        """
+        if not dates:
+            return self._size
+
+        new_dates = np.array(dates, dtype='datetime64[D]')
+        new_rates = np.asarray(rates, dtype=np.float64)
+        if not self._size or new_dates.min() >= self._dates[self._size - 1]:
+            return self.extend(dates, rates)
+
+        # Re-sort the held points from the earliest new date on with the new
+        # ones; of equal dates the new point (later in the stable sort) wins
+        start = int(np.searchsorted(self.dates, new_dates.min()))
+        merged_dates = np.concatenate((self.dates[start:], new_dates))
+        merged_rates = np.concatenate((self.rates[start:], new_rates))
+        order = np.argsort(merged_dates, kind='stable')
+        merged_dates, merged_rates = merged_dates[order], merged_rates[order]
+        last = np.append(merged_dates[1:] != merged_dates[:-1], True)
+        merged_dates, merged_rates = merged_dates[last], merged_rates[last]
+
+        if (len(merged_dates) == self._size - start
+                and (merged_dates == self.dates[start:]).all()
+                and (merged_rates == self.rates[start:]).all()):
+            return self._size
+        return self._write(start, merged_dates, merged_rates)
+
+    def _write(self, start: int, dates: "np.ndarray", rates: "np.ndarray") -> int:
+        """Replace the points from ``start`` on, growing storage by doubling"""
+        size = start + len(dates)
+        if size > len(self._rates):
+            capacity = max(size, 2 * len(self._rates), 64)
+            self._dates = np.resize(self._dates, capacity)
+            self._rates = np.resize(self._rates, capacity)
+        self._dates[start:size] = dates
+        self._rates[start:size] = rates
+        self._size = size
+        return start
+
+    def tail(self, count: int) -> "RateSeries":
+        """Get a copy holding only the last ``count`` points"""
+        series = RateSeries(self.base_currency, self.target_currency)
+        series._dates = self.dates[-count:].copy() if count else self._dates[:0].copy()
+        series._rates = self.rates[-count:].copy() if count else self._rates[:0].copy()
+        series._size = len(series._rates)
+        return series
+
+    def moving_average(self, window: int) -> "np.ndarray":
+        """Mean of the last ``window`` rates at each point (NaN until full)"""
+        rates = self.rates
+        result = np.full(len(rates), np.nan)
+        if window <= len(rates):
+            sums = np.concatenate(([0.0], np.cumsum(rates)))
+            result[window - 1:] = (sums[window:] - sums[:-window]) / window
+        return result
+
+    def log_returns(self) -> "np.ndarray":
+        return np.diff(np.log(self.rates))
+
+    def volatility(self, window: int) -> "np.ndarray":
+        """Std of the last ``window`` daily log returns at each point (NaN until full)"""
+        returns = self.log_returns()
+        result = np.full(len(self.rates), np.nan)
+        if window >= 2 and window <= len(returns):
+            sums = np.concatenate(([0.0], np.cumsum(returns)))
+            squares = np.concatenate(([0.0], np.cumsum(returns * returns)))
+            total = sums[window:] - sums[:-window]
+            total_sq = squares[window:] - squares[:-window]
+            variance = (total_sq - total * total / window) / (window - 1)
+            result[window:] = np.sqrt(np.maximum(variance, 0.0))
+        return result
+
+    def percent_change(self, periods: int = 1) -> "np.ndarray":
+        """Change against the rate ``periods`` points earlier, in percent"""
+        rates = self.rates
+        result = np.full(len(rates), np.nan)
+        if 0 < periods < len(rates):
+            result[periods:] = (rates[periods:] / rates[:-periods] - 1.0) * 100.0
+        return result
+
+    def _sliding(self, window: int):
+        return np.lib.stride_tricks.sliding_window_view(self.rates, window)
+
+    def rolling_min(self, window: int) -> "np.ndarray":
+        result = np.full(len(self.rates), np.nan)
+        if window <= len(self.rates):
+            result[window - 1:] = self._sliding(window).min(axis=1)
+        return result
+
+    def rolling_max(self, window: int) -> "np.ndarray":
+        result = np.full(len(self.rates), np.nan)
+        if window <= len(self.rates):
+            result[window - 1:] = self._sliding(window).max(axis=1)
+        return result
+
+
+class RollingWindow:
+    def __init__(self, size: int):
+        """
+        Latest mean, min, max, change and volatility over ``size`` points
+
+        Each push is O(1) amortized: running sums for the mean and the
+        returns' variance, monotonic deques for min and max.
+        """
+        self.size = size
+        self.count = 0
+        self._values = deque()
+        self._returns = deque()
+        self._sum = 0.0
+        self._return_sum = 0.0
+        self._return_sq = 0.0
+        self._last: Optional[float] = None
+        self._minimums = deque()
+        self._maximums = deque()
+
+    def push(self, rate: float):
+        index = self.count
+        self.count += 1
+
+        self._values.append(rate)
+        self._sum += rate
+        if len(self._values) > self.size:
+            self._sum -= self._values.popleft()
+
+        if self._last is not None:
+            log_return = math.log(rate / self._last)
+            self._returns.append(log_return)
+            self._return_sum += log_return
+            self._return_sq += log_return * log_return
+            if len(self._returns) > self.size:
+                old = self._returns.popleft()
+                self._return_sum -= old
+                self._return_sq -= old * old
+        self._last = rate
+
+        oldest = index - self.size + 1
+        for extremes, beaten in ((self._minimums, lambda v: v >= rate),
+                                 (self._maximums, lambda v: v <= rate)):
+            while extremes and beaten(extremes[-1][1]):
+                extremes.pop()
+            extremes.append((index, rate))
+            while extremes[0][0] < oldest:
+                extremes.popleft()
+
+    def stats(self) -> Dict:
+        values = self._values
+        if not values:
+            return {'window': self.size, 'count': 0}
+
+        returns = len(self._returns)
+        volatility = None
+        if returns >= 2:
+            variance = (self._return_sq - self._return_sum ** 2 / returns) / (returns - 1)
+            volatility = math.sqrt(max(variance, 0.0))
+
+        return {
+            'window': self.size,
+            'count': len(values),
+            'last': values[-1],
+            'mean': self._sum / len(values),
+            'min': self._minimums[0][1],
+            'max': self._maximums[0][1],
+            'change_pct': (values[-1] / values[0] - 1.0) * 100.0,
+            'volatility': volatility
+        }
+
+
+class RateAnalytics:
+    def __init__(self, converter):
+        """
+        Analytics over ``converter``'s stored rates
+
+        Each pair's series is loaded from exchange_rates once; later calls
+        only read rows on or after the last date already held, and feed them
+        to the rolling windows instead of recomputing them. Reports re-read
+        the range they cover, so dates stored out of order (a backfill) are
+        merged in.
+        """
+        self.converter = converter
+        self._series: Dict[Tuple[str, str], RateSeries] = {}
+        self._windows: Dict[Tuple[str, str, int], RollingWindow] = {}
+        self._lock = threading.RLock()
+
+    def series(self, base_currency: str, target_currency: str,
+               since: Optional[str] = None) -> RateSeries:
+        """
+        Get the pair's stored series, bringing it up to date incrementally
+
+        Rows dated on or after ``since`` are read again and merged, to pick up
+        dates stored before the last one held ('' re-reads every row).
+        """
+        key = (base_currency.upper(), target_currency.upper())
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = RateSeries(*key)
+
+            last = series.last_date()
+            if since is not None and (last is None or since < last):
+                dates, rates = self._load(key, since)
+                changed = series.merge(dates, rates)
+            else:
+                dates, rates = self._load(key, last)
+                changed = series.extend(dates, rates)
+            if changed < len(series):
+                self._update_windows(key, series, changed)
+            return series
+
+    def _load(self, key: Tuple[str, str], since: Optional[str]):
+        self.converter._writer.flush()
+        with self.converter.metrics.timer('sqlite_read_seconds'), \
+                self.converter.db_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT date, rate FROM exchange_rates
+                WHERE base_currency = ? AND target_currency = ? AND date >= ?
+                ORDER BY date
+            ''', (key[0], key[1], since or ''))
+            rows = cursor.fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def _update_windows(self, key: Tuple[str, str], series: RateSeries, changed: int):
+        rates = series.rates
+        for (base, target, size), window in list(self._windows.items()):
+            if (base, target) != key:
+                continue
+            if changed < window.count:
+                # The last point was revised: rebuild from the points in range
+                window = self._windows[(base, target, size)] = RollingWindow(size)
+                start = max(0, len(rates) - size - 1)
+                window.count = start
+            else:
+                start = window.count
+            for rate in rates[start:].tolist():
+                window.push(rate)
+
+    def latest(self, base_currency: str, target_currency: str, window: int = 30) -> Dict:
+        """Get the current rolling stats over the last ``window`` points"""
+        series = self.series(base_currency, target_currency)
+        key = (series.base_currency, series.target_currency, window)
+        with self._lock:
+            rolling = self._windows.get(key)
+            if rolling is None:
+                rolling = self._windows[key] = RollingWindow(window)
+                start = max(0, len(series) - window - 1)
+                rolling.count = start
+                for rate in series.rates[start:].tolist():
+                    rolling.push(rate)
+            return rolling.stats()
+
+    def report(self, base_currency: str, target_currency: str, days: int = 30,
+               window: int = 7, backfill: bool = True) -> Dict:
+        """
+        Get the last ``days`` points with moving average, volatility, percent
+        change and rolling min/max columns plus a summary
+
+        With ``backfill`` missing dates are fetched first (get_historical_rates).
+        """
+        if backfill:
+            self.converter.get_historical_rates(base_currency, target_currency, days)
+
+        # Enough history before the first row to fill its windows. Those rows
+        # are read again: the backfill (or another writer) may have stored
+        # dates before the last one held, or before the first
+        count = days + window
+        key = (base_currency.upper(), target_currency.upper())
+        with self._lock:
+            held = self._series.get(key)
+            since = str(held.dates[-count]) if held is not None and len(held) >= count else ''
+        series = self.series(base_currency, target_currency, since).tail(count)
+        first = max(0, len(series) - days)
+        columns = {
+            'date': series.dates[first:].astype(str).tolist(),
+            'rate': series.rates[first:].tolist()
+        }
+        for name, values in (('moving_average', series.moving_average(window)),
+                             ('volatility', series.volatility(window)),
+                             ('change_pct', series.percent_change(1)),
+                             ('min', series.rolling_min(window)),
+                             ('max', series.rolling_max(window))):
+            columns[name] = [None if value != value else value
+                             for value in values[first:].tolist()]
+        rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+        shown = series.tail(len(rows))
+        summary = {'days': len(rows)}
+        if rows:
+            rates = shown.rates
+            summary.update({
+                'first': float(rates[0]),
+                'last': float(rates[-1]),
+                'min': float(rates.min()),
+                'max': float(rates.max()),
+                'mean': float(rates.mean()),
+                'change_pct': (float(rates[-1]) / float(rates[0]) - 1.0) * 100.0,
+                'volatility': float(np.std(shown.log_returns(), ddof=1)) if len(rows) > 2 else None
+            })
+
+        return {
+            'base_currency': series.base_currency,
+            'target_currency': series.target_currency,
+            'window': window,
+            'summary': summary,
+            'rows': rows
+        }
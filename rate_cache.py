@@ -0,0 +1,116 @@
+"""
+In-memory rate cache with TTL expiry and LRU eviction
+"""
+
+from collections import OrderedDict
+from typing import Any, Optional, Dict, Tuple
+import threading
+import time
+
+
+class RateCache:
+    def __init__(self, max_size: int = 1024, ttl: float = 300.0):
+        """
+        Initialize a bounded cache of exchange rates keyed by (base, target).
+
+        Entries cached more than ``ttl`` seconds ago are treated as missing;
+        once ``max_size`` entries are stored the least recently used one is
+        evicted. Each entry keeps when its rate was fetched (which may be
+        earlier than when it was cached) and the provider's timestamp. The
+        cache is safe to share between threads.
+
+        clear() starts a new ``generation``: a set() passing the generation
+        read before its rate was looked up is dropped if the cache was cleared
+        in between, so rates from a replaced table are not cached again.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, float, float, Any]]" = \
+            OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, base_currency: str, target_currency: str) -> Optional[float]:
+        """Return a fresh cached rate, or None on a miss"""
+        entry = self.get_with_age(base_currency, target_currency)
+        return entry[0] if entry is not None else None
+
+    def get_with_age(self, base_currency: str,
+                     target_currency: str) -> Optional[Tuple[float, Optional[float], Any]]:
+        """
+        Return (rate, seconds since the rate was fetched, provider timestamp)
+        for a fresh entry, or None. The age is None when it is unknown.
+        """
+        key = (base_currency.upper(), target_currency.upper())
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            rate, stored_at, fetched_at, timestamp = entry
+            now = time.monotonic()
+            if now - stored_at > self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            age = now - fetched_at
+            return rate, age if age != float('inf') else None, timestamp
+
+    def set(self, base_currency: str, target_currency: str, rate: float,
+            fetched_at: Optional[float] = None, timestamp=None,
+            generation: Optional[int] = None):
+        """
+        Store a rate, evicting the least recently used entry when full
+
+        ``fetched_at`` is the time.monotonic() the rate was fetched (default
+        now, -inf when unknown); ``timestamp`` is the provider's timestamp.
+        With ``generation``, the rate is only stored if the cache has not been
+        cleared since that generation was read.
+        """
+        if self.max_size <= 0:
+            return
+
+        key = (base_currency.upper(), target_currency.upper())
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            now = time.monotonic()
+            self._entries[key] = (rate, now, now if fetched_at is None else fetched_at,
+                                  timestamp)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all cached rates and start a new generation (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self) -> Dict:
+        """Get hit/miss/eviction counters for sizing the cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,298 @@
+"""
+Per-host token-bucket rate limiting with adaptive backoff on 429 responses
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+# Requests per second allowed by default for the public rate APIs; other
+# hosts are unlimited until they answer 429
+DEFAULT_HOST_RATES: Dict[str, float] = {
+    'api.exchangerate.host': 10.0,
+    'api.exchangerate-api.com': 10.0,
+}
+
+# After a 429 the allowed rate is halved (never below MIN_RATE) and then
+# grows back by RECOVERY_STEP of the configured rate per successful request
+MIN_RATE = 0.2
+RECOVERY_STEP = 0.05
+
+
+class TokenBucket:
+    def __init__(self, rate: Optional[float], burst: Optional[float] = None):
+        """
+        Allow ``rate`` requests per second with bursts of up to ``burst``
+
+        ``rate=None`` never waits except while throttled by a 429. The bucket
+        is safe to share between threads.
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.waited = 0.0
+        self.throttles = 0
+        self._lock = threading.Lock()
+
+    def _now(self) -> float:
+        return time.monotonic()
+
+    def _reserve(self) -> float:
+        """Take a token and return 0, or return the seconds to wait for one"""
+        with self._lock:
+            now = self._now()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if self.rate is None:
+                return 0.0
+
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return 0.0
+            return (1.0 - self.tokens) / self.rate
+
+    def acquire(self) -> float:
+        """Block until a request may be sent; returns the seconds waited"""
+        waited = 0.0
+        while True:
+            delay = self._reserve()
+            if delay <= 0:
+                break
+            time.sleep(delay)
+            waited += delay
+
+        if waited:
+            with self._lock:
+                self.waited += waited
+        return waited
+
+    async def acquire_async(self) -> float:
+        """Like acquire(), but waits on the event loop instead of blocking it"""
+        import asyncio
+
+        waited = 0.0
+        while True:
+            delay = await self._reserve_async()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+            waited += delay
+
+        if waited:
+            with self._lock:
+                self.waited += waited
+        return waited
+
+    async def _reserve_async(self) -> float:
+        return self._reserve()
+
+    def throttle(self, delay: float):
+        """Pause the host for ``delay`` seconds and halve its rate"""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, self._now() + delay)
+            self.tokens = 0.0
+            self.throttles += 1
+            if self.rate is not None:
+                self.rate = max(MIN_RATE, self.rate / 2)
+
+    def reward(self):
+        """Grow a throttled rate back towards the configured one"""
+        if self.rate is None or self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_STEP)
+
+    def stats(self) -> Dict:
+        return {
+            'rate': self.rate,
+            'max_rate': self.max_rate,
+            'waited_seconds': self.waited,
+            'throttles': self.throttles
+        }
+
+
+class SQLiteTokenBucket(TokenBucket):
+    def __init__(self, pool, host: str, rate: Optional[float], burst: Optional[float] = None):
+        """
+        Token bucket whose state lives in the ``rate_limits`` table
+
+        Every process using the same database file draws from one bucket per
+        host. Each reservation is one short BEGIN IMMEDIATE transaction.
+        """
+        super().__init__(rate, burst)
+        self.pool = pool
+        self.host = host
+
+    def _now(self) -> float:
+        # Wall clock: monotonic clocks are not comparable between processes
+        return time.time()
+
+    def _reserve(self) -> float:
+        with self.pool.connection() as conn:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute('''
+                    SELECT tokens, updated, blocked_until, rate FROM rate_limits WHERE host = ?
+                ''', (self.host,)).fetchone()
+                now = self._now()
+                if row is None:
+                    tokens, updated, blocked_until, rate = self.burst, now, 0.0, self.max_rate
+                else:
+                    tokens, updated, blocked_until, rate = row
+
+                if now < blocked_until:
+                    delay = blocked_until - now
+                elif rate is None:
+                    delay = 0.0
+                else:
+                    tokens = min(self.burst, tokens + max(0.0, now - updated) * rate)
+                    updated = now
+                    if tokens >= 1.0:
+                        tokens -= 1.0
+                        delay = 0.0
+                    else:
+                        delay = (1.0 - tokens) / rate
+
+                self._save(conn, tokens, updated, blocked_until, rate)
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        self.rate = rate
+        return delay
+
+    async def _reserve_async(self) -> float:
+        import asyncio
+
+        # The reservation is a SQLite transaction that may wait on other processes
+        return await asyncio.get_running_loop().run_in_executor(None, self._reserve)
+
+    def _save(self, conn: sqlite3.Connection, tokens: float, updated: float,
+              blocked_until: float, rate: Optional[float]):
+        conn.execute('''
+            INSERT OR REPLACE INTO rate_limits (host, tokens, updated, blocked_until, rate)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (self.host, tokens, updated, blocked_until, rate))
+
+    def _update(self, change):
+        with self.pool.connection() as conn:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute('''
+                    SELECT tokens, updated, blocked_until, rate FROM rate_limits WHERE host = ?
+                ''', (self.host,)).fetchone()
+                state = list(row) if row else [self.burst, self._now(), 0.0, self.max_rate]
+                change(state)
+                self._save(conn, *state)
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        self.rate = state[3]
+
+    def throttle(self, delay: float):
+        def change(state):
+            state[0] = 0.0
+            state[2] = max(state[2], self._now() + delay)
+            if state[3] is not None:
+                state[3] = max(MIN_RATE, state[3] / 2)
+
+        with self._lock:
+            self.throttles += 1
+        self._update(change)
+
+    def reward(self):
+        if self.max_rate is None or (self.rate is not None and self.rate >= self.max_rate):
+            return
+
+        def change(state):
+            if state[3] is not None:
+                state[3] = min(self.max_rate, state[3] + self.max_rate * RECOVERY_STEP)
+
+        self._update(change)
+
+
+class RateLimiter:
+    def __init__(self, default_rate: Optional[float] = None, burst: Optional[float] = None,
+                 host_rates: Optional[Dict[str, Optional[float]]] = None,
+                 shared_db: Optional[str] = None):
+        """
+        Keep one token bucket per host (``host`` or ``host:port``)
+
+        Hosts in ``host_rates`` (merged over DEFAULT_HOST_RATES) get their own
+        requests-per-second limit, all others ``default_rate`` (None means
+        unlimited). With ``shared_db`` the buckets are stored in that SQLite
+        file and shared by every process pointing at it.
+        """
+        self.default_rate = default_rate
+        self.burst = burst
+        self.host_rates = dict(DEFAULT_HOST_RATES, **(host_rates or {}))
+        self._pool = None
+        if shared_db is not None:
+            from sqlite_pool import SQLiteConnectionPool
+            self._pool = SQLiteConnectionPool(shared_db)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        """Get the bucket for the host of ``url``"""
+        parts = urlsplit(url)
+        host = parts.netloc or url
+        bucket = self._buckets.get(host)
+        if bucket is not None:
+            return bucket
+
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate = self.host_rates.get(host, self.host_rates.get(parts.hostname,
+                                                                     self.default_rate))
+                if self._pool is not None:
+                    bucket = SQLiteTokenBucket(self._pool, host, rate, self.burst)
+                else:
+                    bucket = TokenBucket(rate, self.burst)
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url: str) -> float:
+        """Wait for the host's bucket; returns the seconds waited"""
+        return self.bucket(url).acquire()
+
+    async def acquire_async(self, url: str) -> float:
+        """Wait for the host's bucket from a coroutine; returns the seconds waited"""
+        return await self.bucket(url).acquire_async()
+
+    def throttle(self, url: str, delay: float):
+        """Record a 429 (or Retry-After) from the host of ``url``"""
+        self.bucket(url).throttle(delay)
+
+    def reward(self, url: str):
+        self.bucket(url).reward()
+
+    def stats(self) -> Dict[str, Dict]:
+        return {host: bucket.stats() for host, bucket in list(self._buckets.items())}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+
+
+_default_limiter: Optional[RateLimiter] = None
+_default_lock = threading.Lock()
+
+
+def get_default_limiter() -> RateLimiter:
+    """Get the process-wide limiter shared by all transports"""
+    global _default_limiter
+
+    with _default_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
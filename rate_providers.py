@@ -0,0 +1,252 @@
+"""
+Pluggable exchange rate providers: HTTP APIs and file-backed snapshots
+"""
+
+import csv
+import json
+import os
+from abc import ABC, abstractmethod
+from datetime import date as date_type, timedelta
+from typing import Optional, Dict
+
+from http_transport import HttpTransport, get_default_transport
+from lazy_import import lazy_module
+from rate_snapshot import RateSnapshot
+
+requests = lazy_module('requests')
+
+
+class RateProviderError(Exception):
+    """Raised when a provider cannot be reached or returns an unusable response"""
+
+
+class RateProvider(ABC):
+    """
+    Interface for rate sources
+
+    ``get_snapshot`` returns the full table for a base, ``get_rate`` the rate
+    of a pair on one date and ``get_range`` a pair's rates for a date range.
+    Methods return None / {} when the source has no data and raise
+    RateProviderError when it cannot be reached or its response is malformed.
+    Only ``get_snapshot`` is required.
+    """
+
+    name = 'provider'
+    supports_range = False
+
+    @abstractmethod
+    def get_snapshot(self, base_currency: str) -> Optional[RateSnapshot]:
+        """Get the latest rate table for a base currency"""
+
+    def get_rate(self, base_currency: str, target_currency: str, date: str) -> Optional[float]:
+        """Default: today's rate from the latest table; past dates are unavailable"""
+        if date != date_type.today().isoformat():
+            raise RateProviderError(f"{self.name} has no rates for past dates")
+        snapshot = self.get_snapshot(base_currency)
+        return snapshot.rate(base_currency, target_currency) if snapshot else None
+
+    def get_range(self, base_currency: str, target_currency: str,
+                  start_date: str, end_date: str) -> Dict[str, float]:
+        """Default: one get_rate call per date"""
+        rates = {}
+        for day in _date_range(start_date, end_date):
+            rate = self.get_rate(base_currency, target_currency, day)
+            if rate:
+                rates[day] = rate
+        return rates
+
+
+def _parse_snapshot(base_currency, rates, timestamp) -> RateSnapshot:
+    """Build a snapshot from a response's base and rates, or raise RateProviderError"""
+    if not isinstance(base_currency, str) or not isinstance(rates, dict):
+        raise RateProviderError('Malformed response: missing base or rates')
+    try:
+        return RateSnapshot(base_currency, rates, timestamp)
+    except (TypeError, ValueError) as e:
+        raise RateProviderError(f"Malformed rates: {e}") from e
+
+
+def _date_range(start_date: str, end_date: str):
+    day = date_type.fromisoformat(start_date)
+    end = date_type.fromisoformat(end_date)
+    while day <= end:
+        yield day.isoformat()
+        day += timedelta(days=1)
+
+
+class ExchangeRateHostProvider(RateProvider):
+    """exchangerate.host: /latest, /<date> and /timeseries endpoints"""
+
+    name = 'exchangerate.host'
+    supports_range = True
+
+    def __init__(self, base_url: str = "https://api.exchangerate.host",
+                 transport: Optional[HttpTransport] = None, api_key: str = None):
+        self.base_url = base_url.rstrip('/')
+        self.transport = transport or get_default_transport()
+        self.api_key = api_key
+
+    def _get_json(self, path: str, params: Dict) -> Dict:
+        if self.api_key:
+            params = dict(params, access_key=self.api_key)
+        try:
+            response = self.transport.get(f"{self.base_url}/{path}", params=params)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise RateProviderError(str(e)) from e
+        if not isinstance(data, dict):
+            raise RateProviderError('Malformed response: expected a JSON object')
+        return data
+
+    def get_snapshot(self, base_currency: str) -> Optional[RateSnapshot]:
+        data = self._get_json('latest', {'base': base_currency.upper()})
+
+        if not data.get('success', False) or not data.get('rates'):
+            return None
+        return _parse_snapshot(base_currency, data['rates'], data.get('date'))
+
+    def get_rate(self, base_currency: str, target_currency: str, date: str) -> Optional[float]:
+        data = self._get_json(date, {'base': base_currency.upper(),
+                                     'symbols': target_currency.upper()})
+
+        if not data.get('success', False):
+            return None
+        rates = data.get('rates')
+        if not isinstance(rates, dict):
+            raise RateProviderError(f"Malformed response for {date}: no rates")
+        return rates.get(target_currency.upper())
+
+    def get_range(self, base_currency: str, target_currency: str,
+                  start_date: str, end_date: str) -> Dict[str, float]:
+        data = self._get_json('timeseries', {
+            'start_date': start_date,
+            'end_date': end_date,
+            'base': base_currency.upper(),
+            'symbols': target_currency.upper()
+        })
+
+        if not data.get('success', False) or not isinstance(data.get('rates'), dict):
+            return {}
+
+        series = {}
+        for day, day_rates in data['rates'].items():
+            rate = day_rates.get(target_currency.upper()) if isinstance(day_rates, dict) else None
+            if rate:
+                series[day] = rate
+        return series
+
+
+class ExchangeRateApiProvider(RateProvider):
+    """exchangerate-api.com for latest tables, exchangerate.host for past dates"""
+
+    name = 'exchangerate-api.com'
+    supports_range = True
+
+    def __init__(self, base_url: str = "https://api.exchangerate-api.com/v4/latest/",
+                 historical_base_url: str = "https://api.exchangerate.host/",
+                 transport: Optional[HttpTransport] = None):
+        self.base_url = base_url
+        self.transport = transport or get_default_transport()
+        self.historical = ExchangeRateHostProvider(historical_base_url, self.transport)
+
+    def get_snapshot(self, base_currency: str) -> Optional[RateSnapshot]:
+        try:
+            response = self.transport.get(f"{self.base_url}{base_currency.upper()}")
+            if response.status_code != 200:
+                raise RateProviderError('API request failed')
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise RateProviderError(str(e)) from e
+
+        if not isinstance(data, dict):
+            raise RateProviderError('Malformed response: expected a JSON object')
+        if not data.get('rates'):
+            return None
+        return _parse_snapshot(data.get('base'), data['rates'], data.get('time_last_updated'))
+
+    def get_rate(self, base_currency: str, target_currency: str, date: str) -> Optional[float]:
+        return self.historical.get_rate(base_currency, target_currency, date)
+
+    def get_range(self, base_currency: str, target_currency: str,
+                  start_date: str, end_date: str) -> Dict[str, float]:
+        return self.historical.get_range(base_currency, target_currency, start_date, end_date)
+
+
+class FileRateProvider(RateProvider):
+    """
+    Rates from snapshot files on disk, for offline use and load tests
+
+    ``path`` is a directory of ``YYYY-MM-DD.json`` / ``YYYY-MM-DD.csv`` files
+    (the newest date, or ``latest.json``/``latest.csv``, is the latest table)
+    or a single snapshot file. JSON files hold ``{"base": "USD", "rates":
+    {...}}``; CSV files have ``base,currency,rate`` columns. Any base currency
+    is served by rebasing the stored table.
+    """
+
+    name = 'file'
+    supports_range = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._loaded: Dict[str, Optional[RateSnapshot]] = {}
+
+    def _files_by_date(self) -> Dict[str, str]:
+        if os.path.isfile(self.path):
+            return {'latest': self.path}
+
+        try:
+            filenames = os.listdir(self.path)
+        except OSError as e:
+            raise RateProviderError(f"Cannot read rate directory {self.path}: {e}") from e
+
+        files = {}
+        for filename in filenames:
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() in ('.json', '.csv'):
+                files[stem] = os.path.join(self.path, filename)
+        return files
+
+    def _load(self, key: str) -> Optional[RateSnapshot]:
+        """Read the snapshot for a date; 'latest' is re-read so file updates show up"""
+        if key in self._loaded:
+            return self._loaded[key]
+
+        files = self._files_by_date()
+        if key == 'latest' and 'latest' not in files:
+            dated = sorted(stem for stem in files if stem != 'latest')
+            key_file = files[dated[-1]] if dated else None
+        else:
+            key_file = files.get(key)
+
+        snapshot = self._read(key_file, None if key == 'latest' else key) if key_file else None
+        if key != 'latest':
+            self._loaded[key] = snapshot
+        return snapshot
+
+    @staticmethod
+    def _read(file_path: str, day: Optional[str]) -> Optional[RateSnapshot]:
+        try:
+            with open(file_path, newline='', encoding='utf-8') as f:
+                if file_path.lower().endswith('.json'):
+                    data = json.load(f)
+                    base, rates = data['base'], data['rates']
+                    day = data.get('date', day)
+                else:
+                    rows = list(csv.DictReader(f))
+                    if not rows:
+                        return None
+                    base = rows[0]['base']
+                    rates = {row['currency']: float(row['rate']) for row in rows}
+        except (OSError, ValueError, KeyError) as e:
+            raise RateProviderError(f"Cannot read rate file {file_path}: {e}") from e
+
+        return _parse_snapshot(base, rates, day)
+
+    def get_snapshot(self, base_currency: str) -> Optional[RateSnapshot]:
+        snapshot = self._load('latest')
+        return snapshot.rebase(base_currency) if snapshot else None
+
+    def get_rate(self, base_currency: str, target_currency: str, date: str) -> Optional[float]:
+        snapshot = self._load(date)
+        return snapshot.rate(base_currency, target_currency) if snapshot else None
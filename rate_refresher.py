@@ -0,0 +1,89 @@
+"""
+Background refresher that keeps a converter's rate snapshot warm
+"""
+
+import threading
+from typing import Dict
+
+from rate_providers import RateProviderError
+
+
+class RateRefresher:
+    def __init__(self, converter, refresh_ahead: float = 0.8, retry_interval: float = 5.0):
+        """
+        Refresh ``converter``'s pivot snapshot before its TTL runs out
+
+        A refresh is started once the snapshot is ``refresh_ahead`` of the way
+        to expiry, so readers keep using the last-good table and never wait on
+        the network. Every refreshed table is also stored in ``exchange_rates``.
+        When the provider fails, the refresh is retried every ``retry_interval``
+        seconds; with no table in memory yet, the latest stored one is loaded
+        from SQLite instead (it is only served while the converter's
+        ``max_stale`` is None, since its age is unknown).
+        """
+        self.converter = converter
+        self.refresh_ahead = refresh_ahead
+        self.retry_interval = retry_interval
+        self.refreshes = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rate-refresher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def is_running(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def refresh(self) -> bool:
+        """Fetch a new snapshot now; returns False if the provider failed"""
+        converter = self.converter
+        try:
+            snapshot = converter.get_rate_snapshot(force_refresh=True)
+        except RateProviderError as e:
+            print(f"Background rate refresh failed: {e}")
+            snapshot = None
+
+        if snapshot is None:
+            self.failures += 1
+            converter.metrics.inc('refresh_failures')
+            if converter.snapshot is None:
+                stored = converter._load_stored_snapshot()
+                if stored is not None:
+                    converter._install_snapshot(stored)
+                    converter.metrics.inc('db_fallbacks')
+            return False
+
+        # get_rate_snapshot() swapped the table in and invalidated the pair cache
+        converter._store_snapshot(snapshot)
+        self.refreshes += 1
+        converter.metrics.inc('snapshot_refreshes')
+        return True
+
+    def _next_delay(self) -> float:
+        snapshot = self.converter.snapshot
+        if snapshot is None:
+            return self.retry_interval
+        refresh_at = self.converter.rate_cache.ttl * self.refresh_ahead
+        return max(0.01, refresh_at - snapshot.age())
+
+    def _run(self):
+        while not self._stop.is_set():
+            delay = self._next_delay() if self.refresh() else self.retry_interval
+            if self._stop.wait(delay):
+                return
+
+    def stats(self) -> Dict:
+        snapshot = self.converter.snapshot
+        return {
+            'running': self.is_running(),
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'snapshot_age': snapshot.age() if snapshot is not None else None
+        }
+
+    def close(self):
+        """Stop the refresher thread"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
@@ -0,0 +1,185 @@
+"""
+Rate snapshot engine: one base rate table per refresh, any pair by triangulation
+"""
+
+from typing import Optional, Dict, List, Iterable
+import threading
+import time
+
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+
+class CurrencyIndex:
+    def __init__(self):
+        """
+        Intern currency codes as small integer ids
+
+        Ids are assigned on first sight and never change, so rate tables from
+        different snapshots line up position for position. Only rate tables
+        assign ids; codes from user input are looked up without adding them.
+        """
+        self.ids: Dict[str, int] = {}
+        self.codes: List[str] = []
+        self._lock = threading.Lock()
+
+    def id(self, code: str) -> int:
+        """Get the id of a code, assigning the next free one if it is new"""
+        currency_id = self.ids.get(code)
+        if currency_id is not None:
+            return currency_id
+
+        with self._lock:
+            currency_id = self.ids.get(code)
+            if currency_id is None:
+                currency_id = len(self.codes)
+                self.codes.append(code)
+                self.ids[code] = currency_id
+            return currency_id
+
+    def lookup(self, code: str) -> int:
+        """Get the id of a code, or -1 if no rate table has listed it"""
+        return self.ids.get(code, -1)
+
+    def code(self, currency_id: int) -> str:
+        return self.codes[currency_id]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+# Shared by all snapshots so their arrays can be combined directly
+CURRENCIES = CurrencyIndex()
+
+
+class RateSnapshot:
+    __slots__ = ('base_currency', 'base_id', 'values', 'timestamp', 'fetched_at', '_list',
+                 '_rates')
+
+    def __init__(self, base_currency: str, rates: Dict[str, float], timestamp=None):
+        """
+        Hold a full rate table for one base currency.
+
+        Every N x N pair is derived from the table by triangulation through the
+        base, e.g. EUR->JPY = USD->JPY / USD->EUR for a USD snapshot. Rates are
+        stored in one float64 array indexed by CURRENCIES id (NaN where the
+        table has no rate).
+        """
+        self.base_currency = base_currency.upper()
+        self.base_id = CURRENCIES.id(self.base_currency)
+        ids = [(CURRENCIES.id(code.upper()), float(rate)) for code, rate in rates.items() if rate]
+
+        self.values = np.full(len(CURRENCIES), np.nan)
+        for currency_id, rate in ids:
+            self.values[currency_id] = rate
+        self.values[self.base_id] = 1.0
+        self.timestamp = timestamp
+        self.fetched_at = time.monotonic()
+        self._list = None
+        self._rates = None
+
+    @classmethod
+    def from_array(cls, base_currency: str, values: "np.ndarray", timestamp=None,
+                   copy: bool = True) -> "RateSnapshot":
+        """
+        Build a snapshot directly from an array indexed by CURRENCIES id
+
+        With ``copy=False`` the array is used as is (it may be read-only and
+        shorter than CURRENCIES) and must already hold 1.0 for the base.
+        """
+        snapshot = cls(base_currency, {}, timestamp)
+        if not copy:
+            snapshot.values = values
+            return snapshot
+        values = np.asarray(values, dtype=np.float64)
+        snapshot.values = np.full(max(len(values), len(snapshot.values)), np.nan)
+        snapshot.values[:len(values)] = values
+        snapshot.values[snapshot.base_id] = 1.0
+        snapshot._list = None
+        return snapshot
+
+    def _value(self, currency: str) -> Optional[float]:
+        # Scalar reads go through a list copy: indexing numpy per call is slow
+        values = self._list
+        if values is None:
+            values = self._list = self.values.tolist()
+
+        ids = CURRENCIES.ids
+        currency_id = ids.get(currency)
+        if currency_id is None:
+            currency_id = ids.get(currency.upper(), len(values))
+        if currency_id >= len(values):
+            return None
+        value = values[currency_id]
+        return None if value != value else value
+
+    def rate(self, from_currency: str, to_currency: str) -> Optional[float]:
+        """Get the cross rate for a pair, or None if either currency is unknown"""
+        values = self._list
+        if values is None:
+            values = self._list = self.values.tolist()
+
+        ids = CURRENCIES.ids
+        missing = len(values)
+        from_id = ids.get(from_currency)
+        if from_id is None:
+            from_id = ids.get(from_currency.upper(), missing)
+        to_id = ids.get(to_currency)
+        if to_id is None:
+            to_id = ids.get(to_currency.upper(), missing)
+        if from_id >= missing or to_id >= missing:
+            return None
+
+        rate = values[to_id] / values[from_id]
+        return None if rate != rate else rate
+
+    def cross_rates(self, from_ids: Iterable[int], to_ids: Iterable[int]) -> "np.ndarray":
+        """
+        Get the cross rates for many id pairs at once (NaN where unknown)
+
+        Ids of -1 (CurrencyIndex.lookup misses) pick up the trailing NaN slot.
+        """
+        from_ids = np.asarray(from_ids, dtype=np.int64)
+        to_ids = np.asarray(to_ids, dtype=np.int64)
+        values = np.concatenate([self.values,
+                                 np.full(len(CURRENCIES) - len(self.values) + 1, np.nan)])
+        return values[to_ids] / values[from_ids]
+
+    def matrix(self) -> "np.ndarray":
+        """Get the full cross-rate matrix, matrix[from_id, to_id]"""
+        return self.values[np.newaxis, :] / self.values[:, np.newaxis]
+
+    @property
+    def rates(self) -> Dict[str, float]:
+        """Dict view of the table, code -> rate against the base"""
+        if self._rates is None:
+            self._rates = {CURRENCIES.code(currency_id): float(self.values[currency_id])
+                           for currency_id in np.flatnonzero(~np.isnan(self.values))}
+        return self._rates
+
+    def rebase(self, base_currency: str) -> Optional["RateSnapshot"]:
+        """Get the same table expressed against another base currency"""
+        base_rate = self._value(base_currency)
+        if base_rate is None:
+            return None
+
+        snapshot = RateSnapshot.from_array(base_currency, self.values / base_rate, self.timestamp)
+        snapshot.fetched_at = self.fetched_at
+        return snapshot
+
+    def age(self) -> float:
+        """Seconds since the table was fetched"""
+        return time.monotonic() - self.fetched_at
+
+    def is_fresh(self, ttl: float) -> bool:
+        return self.age() <= ttl
+
+    def currencies(self) -> List[str]:
+        return sorted(self.rates)
+
+    def __contains__(self, currency: str) -> bool:
+        return self._value(currency) is not None
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(~np.isnan(self.values)))
@@ -0,0 +1,100 @@
+"""
+Compact result records for conversions and history rows
+"""
+
+from sys import intern
+from typing import Dict, Tuple
+
+
+class _Record:
+    """
+    Base for __slots__ records that also read like the dicts they replace
+
+    ``record['key']``, ``record.get('key')``, ``dict(record)`` and
+    ``record.as_dict()`` work with the keys of ``_keys``; ``_aliases`` maps
+    legacy dict keys onto attribute names.
+    """
+
+    __slots__ = ()
+    _keys: Tuple[str, ...] = ()
+    _aliases: Dict[str, str] = {}
+
+    def __getitem__(self, key: str):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, self._aliases.get(key, key))
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> Tuple[str, ...]:
+        return self._keys
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._keys
+
+    def as_dict(self) -> Dict:
+        return {key: self[key] for key in self._keys}
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, _Record):
+            return type(self) is type(other) and self.as_dict() == other.as_dict()
+        if isinstance(other, dict):
+            return self.as_dict() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class ConversionResult(_Record):
+    """
+    A successful conversion; reads as the dict CurrencyAPI used to return
+
+    ``source`` says where the rate came from: 'cache' (in-memory pair cache),
+    'snapshot' (fresh rate table), 'stale_snapshot' (expired table served
+    while a refresh runs), 'fetched' (table fetched by this call) or
+    'database' (stored rate, provider unreachable). ``age`` is the age of
+    the rate in seconds, None when unknown.
+    """
+
+    __slots__ = ('amount', 'from_currency', 'to_currency', 'converted_amount', 'rate',
+                 'timestamp', 'source', 'age')
+    _keys = ('success', 'original_amount', 'from_currency', 'to_currency', 'converted_amount',
+             'exchange_rate', 'timestamp', 'source', 'age')
+    _aliases = {'original_amount': 'amount', 'exchange_rate': 'rate'}
+
+    success = True
+
+    def __init__(self, amount: float, from_currency: str, to_currency: str,
+                 converted_amount: float, rate: float, timestamp=None,
+                 source: str = None, age: float = None):
+        self.amount = amount
+        self.from_currency = intern(from_currency)
+        self.to_currency = intern(to_currency)
+        self.converted_amount = converted_amount
+        self.rate = rate
+        self.timestamp = timestamp
+        self.source = source
+        self.age = age
+
+
+class HistoryRecord(_Record):
+    """One row of the conversion_history table"""
+
+    __slots__ = ('amount', 'from_currency', 'to_currency', 'converted_amount', 'rate',
+                 'timestamp')
+    _keys = __slots__
+
+    def __init__(self, amount: float, from_currency: str, to_currency: str,
+                 converted_amount: float, rate: float, timestamp: str = None):
+        self.amount = amount
+        self.from_currency = intern(from_currency)
+        self.to_currency = intern(to_currency)
+        self.converted_amount = converted_amount
+        self.rate = rate
+        self.timestamp = timestamp
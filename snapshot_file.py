@@ -0,0 +1,222 @@
+"""
+Binary rate-snapshot file shared by converter processes through mmap
+
+Layout (little-endian):
+    header     magic 'CCRS', version u16, code width u16, currencies u32,
+               rows u32, base currency (8 bytes)
+    codes      one 8-byte ASCII code per currency, in column order (the writing
+               process's currency id order)
+    row index  per row: date 'YYYY-MM-DD' (10 bytes), 6 pad bytes,
+               written-at Unix time (float64)
+    rates      rows x currencies float64, rates against the base (NaN = none)
+
+Every section is a multiple of 8 bytes, so the rate block is mapped straight
+into a NumPy array. A reader whose currency ids match the column order (any
+process that first learns the codes from this file) gets rows as read-only
+views of the map without copying. Writers build a new file and os.replace()
+it over the old one; readers notice the new inode and remap, while mappings
+of the old file stay valid until they are dropped.
+"""
+
+import contextlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from lazy_import import lazy_module
+from rate_snapshot import RateSnapshot, CURRENCIES
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, writers may race
+    fcntl = None
+
+np = lazy_module('numpy')
+
+MAGIC = b'CCRS'
+VERSION = 1
+CODE_WIDTH = 8
+_HEADER = struct.Struct('<4sHHII8s')
+_ROW = struct.Struct('<10s6xd')
+
+
+class RateSnapshotFile:
+    def __init__(self, path: str):
+        """
+        Read and write daily pivot rate tables in ``path``
+
+        Reads are served from a read-only memory map, so any number of
+        processes share one copy of the table history.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._stat = None
+        self._mmap = None
+        self.base_currency: Optional[str] = None
+        self.codes: List[str] = []
+        self.dates: List[str] = []
+        self.written_at: List[float] = []
+        self.matrix: Optional["np.ndarray"] = None
+
+    def _reload(self):
+        """Map the current file if it was replaced since the last read"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key == self._stat:
+            return
+
+        if stat.st_size < _HEADER.size:
+            raise ValueError(f"{self.path} is not a rate snapshot file (truncated)")
+        with open(self.path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, code_width, count, rows, base = _HEADER.unpack_from(mapped, 0)
+            if magic != MAGIC or version != VERSION or code_width != CODE_WIDTH:
+                raise ValueError('bad header')
+
+            offset = _HEADER.size
+            codes = [mapped[offset + i * CODE_WIDTH:offset + (i + 1) * CODE_WIDTH]
+                     .rstrip(b'\0').decode('ascii') for i in range(count)]
+            offset += count * CODE_WIDTH
+
+            dates, written_at = [], []
+            for i in range(rows):
+                date, written = _ROW.unpack_from(mapped, offset + i * _ROW.size)
+                dates.append(date.decode('ascii'))
+                written_at.append(written)
+            offset += rows * _ROW.size
+
+            matrix = np.frombuffer(mapped, dtype='<f8', count=rows * count,
+                                   offset=offset).reshape(rows, count)
+            base_currency = base.rstrip(b'\0').decode('ascii')
+        except (struct.error, ValueError) as e:
+            mapped.close()
+            raise ValueError(f"{self.path} is not a rate snapshot file ({e})") from None
+
+        self.matrix = matrix
+        self.base_currency = base_currency
+        self.codes, self.dates, self.written_at = codes, dates, written_at
+        # The previous map is left to the garbage collector: arrays handed out
+        # earlier may still point into it
+        self._mmap = mapped
+        self._stat = key
+
+    def snapshot(self, date: Optional[str] = None) -> Optional[RateSnapshot]:
+        """Get the table for ``date`` (the latest one by default), or None"""
+        with self._lock:
+            self._reload()
+            if not self.dates:
+                return None
+            if date is None:
+                row = len(self.dates) - 1
+            elif date in self.dates:
+                row = self.dates.index(date)
+            else:
+                return None
+
+            ids = [CURRENCIES.id(code) for code in self.codes]
+            values = self.matrix[row]
+            base_id = CURRENCIES.id(self.base_currency)
+            if (ids == list(range(len(ids))) and base_id < len(ids)
+                    and values[base_id] == 1.0):
+                # Columns are in this process's id order: hand out the mapped
+                # row itself (read-only, it stays valid after a file swap)
+                snapshot = RateSnapshot.from_array(self.base_currency, values, self.dates[row],
+                                                   copy=False)
+            else:
+                # Only this row is copied, reordered into the process's currency ids
+                reordered = np.full(len(CURRENCIES), np.nan)
+                reordered[np.array(ids, dtype=np.int64)] = values
+                snapshot = RateSnapshot.from_array(self.base_currency, reordered,
+                                                   self.dates[row])
+            snapshot.fetched_at = time.monotonic() - max(0.0, time.time() - self.written_at[row])
+            return snapshot
+
+    def write(self, snapshot: RateSnapshot, date: Optional[str] = None):
+        """Store ``snapshot`` as the table for ``date`` (today) and swap the file in"""
+        date = date or datetime.now().strftime('%Y-%m-%d')
+        written = time.time() - snapshot.age()
+
+        with self._lock:
+            try:
+                self._reload()
+            except (OSError, ValueError) as e:
+                # A corrupt or truncated file must not block every later
+                # refresh: start over and replace it
+                print(f"Overwriting unreadable rate snapshot file: {e}")
+                self.matrix = None
+                self.base_currency = None
+                self.codes, self.dates, self.written_at = [], [], []
+                self._mmap = None
+                self._stat = None
+            tables: Dict[str, Dict[str, float]] = {}
+            stamps: Dict[str, float] = {}
+            if self.matrix is not None and self.base_currency == snapshot.base_currency:
+                for row, existing in enumerate(self.dates):
+                    tables[existing] = dict(zip(self.codes, self.matrix[row].tolist()))
+                    stamps[existing] = self.written_at[row]
+            tables[date] = snapshot.rates
+            stamps[date] = written
+
+            # Columns in currency id order let readers map rows without copying
+            codes = sorted({code for table in tables.values() for code in table},
+                           key=CURRENCIES.id)
+            dates = sorted(tables)
+            matrix = np.full((len(dates), len(codes)), np.nan, dtype='<f8')
+            column = {code: i for i, code in enumerate(codes)}
+            for row, day in enumerate(dates):
+                for code, rate in tables[day].items():
+                    matrix[row, column[code]] = rate
+
+            self._write_atomic(snapshot.base_currency, codes, dates,
+                               [stamps[day] for day in dates], matrix)
+
+    def _write_atomic(self, base: str, codes: List[str], dates: List[str],
+                      stamps: List[float], matrix: "np.ndarray"):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.rates-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_HEADER.pack(MAGIC, VERSION, CODE_WIDTH, len(codes), len(dates),
+                                     base.encode('ascii')))
+                for code in codes:
+                    f.write(code.encode('ascii').ljust(CODE_WIDTH, b'\0')[:CODE_WIDTH])
+                for day, stamp in zip(dates, stamps):
+                    f.write(_ROW.pack(day.encode('ascii'), stamp))
+                f.write(matrix.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+    @contextlib.contextmanager
+    def lock(self):
+        """Hold an exclusive lock shared by every process using this file"""
+        if fcntl is None:
+            yield
+            return
+
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def close(self):
+        with self._lock:
+            self.matrix = None
+            self._mmap = None
+            self._stat = None
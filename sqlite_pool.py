@@ -0,0 +1,130 @@
+"""
+Bounded SQLite connection pool so one converter can serve many threads
+"""
+
+import contextlib
+import itertools
+import queue
+import sqlite3
+import threading
+from typing import Dict, Iterator, List
+
+from db_schema import migrate
+
+_memory_ids = itertools.count()
+
+
+class SQLiteConnectionPool:
+    def __init__(self, db_path: str = 'currency_data.db', synchronous: str = 'NORMAL',
+                 max_size: int = 8, timeout: float = 30.0):
+        """
+        Lend connections to ``db_path`` to threads, at most ``max_size`` at once
+
+        ``with pool.connection() as conn:`` checks a connection out for the
+        block and returns it afterwards. Idle connections are reused, so any
+        number of threads shares at most ``max_size`` connections; when all
+        are in use callers wait up to ``timeout`` seconds. A nested checkout
+        on the same thread gets the connection that thread already holds.
+
+        Connections are opened lazily in WAL mode, so readers never wait for
+        each other. Pending schema migrations run when the first connection is
+        opened; an up-to-date schema costs one PRAGMA read, and creating a
+        pool touches no file at all. ``':memory:'`` gives a private in-memory
+        database shared by all connections of this pool.
+        """
+        self.db_path = db_path
+        self.synchronous = synchronous
+        self._uri = False
+        if db_path == ':memory:':
+            self.db_path = f"file:currency_memory_{next(_memory_ids)}?mode=memory&cache=shared"
+            self._uri = True
+
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._connections: List[sqlite3.Connection] = []
+        self._held = threading.local()
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.checkouts = 0
+        self._migrated = False
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Check a connection out for the duration of a with block"""
+        held = getattr(self._held, 'connection', None)
+        if held is not None:
+            yield held
+            return
+
+        conn = self._checkout()
+        self._held.connection = conn
+        try:
+            yield conn
+        finally:
+            self._held.connection = None
+            self._checkin(conn)
+
+    def _checkout(self) -> sqlite3.Connection:
+        self.checkouts += 1
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._connections) < self.max_size:
+                return self._open()
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"No database connection became free within {self.timeout}s") from None
+
+    def _checkin(self, conn: sqlite3.Connection):
+        with self._lock:
+            if conn not in self._connections:
+                return  # closed by close() while checked out
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def _open(self) -> sqlite3.Connection:
+        # Connections move between threads, so same-thread checks are off
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, uri=self._uri)
+        # Only takes effect on a new file; db_maintenance converts older ones
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        if not self._migrated:
+            migrate(conn)
+            self._migrated = True
+
+        self._connections.append(conn)
+        self.connections_opened += 1
+        return conn
+
+    def stats(self) -> Dict:
+        return {
+            'max_size': self.max_size,
+            'open': len(self._connections),
+            'idle': self._idle.qsize(),
+            'connections_opened': self.connections_opened,
+            'checkouts': self.checkouts
+        }
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def close(self):
+        """Close every connection of the pool; later checkouts open new ones"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            while True:
+                try:
+                    self._idle.get_nowait()
+                except queue.Empty:
+                    break
@@ -2,8 +2,59 @@
 Test script for the currency converter
 """
 
-from currency_converter import CurrencyConverter
+from currency_converter import CurrencyConverter, INSERT_HISTORY_SQL
+from rate_cache import RateCache
+from rate_snapshot import RateSnapshot
+from cli_interface import stream_conversions, export_history
+from http_transport import HttpTransport
+from async_converter import AsyncCurrencyConverter
+from db_schema import MIGRATIONS, SCHEMA_VERSION
+from rate_providers import (FileRateProvider, ExchangeRateHostProvider, ExchangeRateApiProvider,
+                            RateProvider, RateProviderError)
+from mock_rate_server import MockRateServer
+from currency_api import CurrencyAPI
+from benchmarks import run_benchmarks
+import asyncio
+import pytest
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
 import os
+import sqlite3
+import threading
+import time
+
+class MockRates:
+    """A MockRateServer, one shared transport and the converters built against them"""
+    
+    def __init__(self, server, transport, tmp_path):
+        self.server = server
+        self.transport = transport
+        self.tmp_path = tmp_path
+        self.converters = []
+    
+    def provider(self):
+        return ExchangeRateHostProvider(self.server.url, self.transport)
+    
+    def converter(self, **kwargs):
+        """Build a converter fetching from the mock server, in its own database by default"""
+        kwargs.setdefault('db_path', str(self.tmp_path / f'mock{len(self.converters)}.db'))
+        converter = CurrencyConverter(provider=self.provider(), **kwargs)
+        self.converters.append(converter)
+        return converter
+
+@pytest.fixture
+def mock_rates(tmp_path):
+    """Offline rate API; every converter built from it is closed after the test"""
+    with MockRateServer() as server:
+        transport = HttpTransport(pool_maxsize=32)
+        rates = MockRates(server, transport, tmp_path)
+        try:
+            yield rates
+        finally:
+            for converter in rates.converters:
+                converter.close()
+            transport.close()
 
 def test_currency_converter():
     """Test basic functionality of the currency converter"""
@@ -16,7 +67,7 @@ def test_currency_converter():
         print("\n1. Testing basic conversion...")
         result = converter.convert_currency(100, 'USD', 'EUR')
         if result:
-            print(f"✅ 100 USD = {result:.2f} EUR")
+            print(f"✅ 100 USD = {result.converted_amount:.2f} EUR")
         else:
             print("❌ Basic conversion failed")
         
@@ -54,5 +105,1047 @@ def test_currency_converter():
         if os.path.exists('currency_data.db'):
             os.remove('currency_data.db')
 
+def test_rate_cache():
+    """Test TTL expiry and LRU eviction of the in-memory rate cache"""
+    cache = RateCache(max_size=2, ttl=0.05)
+    
+    cache.set('usd', 'eur', 0.9)
+    cache.set('USD', 'GBP', 0.8)
+    assert cache.get('USD', 'EUR') == 0.9
+    
+    # USD/GBP is now least recently used and gets evicted
+    cache.set('EUR', 'JPY', 160.0)
+    assert cache.get('USD', 'GBP') is None
+    assert cache.get('EUR', 'JPY') == 160.0
+    
+    time.sleep(0.06)
+    assert cache.get('USD', 'EUR') is None
+    
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+    assert stats['evictions'] == 1
+    
+    # Ages count from when the rate was fetched, not from when it was cached
+    cache = RateCache(ttl=60)
+    cache.set('USD', 'EUR', 0.9, time.monotonic() - 100, '2024-01-02')
+    cache.set('USD', 'GBP', 0.8, float('-inf'))
+    rate, age, timestamp = cache.get_with_age('USD', 'EUR')
+    assert rate == 0.9 and age >= 100 and timestamp == '2024-01-02'
+    assert cache.get_with_age('USD', 'GBP') == (0.8, None, None)
+
+def test_rate_snapshot_triangulation():
+    """Test that any pair is derived from a single base table"""
+    snapshot = RateSnapshot('USD', {'EUR': 0.5, 'JPY': 150.0})
+    
+    assert snapshot.rate('USD', 'EUR') == 0.5
+    assert snapshot.rate('EUR', 'USD') == 2.0
+    assert snapshot.rate('EUR', 'JPY') == 300.0
+    assert snapshot.rate('EUR', 'XXX') is None
+    assert snapshot.rebase('EUR').rate('EUR', 'JPY') == 300.0
+
+def test_compact_rates_and_records():
+    """Test the array-backed rate table and the dict view of result records"""
+    from rate_snapshot import CURRENCIES
+    from records import ConversionResult, HistoryRecord
+    import numpy as np
+    
+    snapshot = RateSnapshot('USD', {'EUR': 0.5, 'JPY': 150.0})
+    ids = [CURRENCIES.id(code) for code in ('USD', 'EUR', 'JPY')]
+    assert snapshot.values.dtype == np.float64
+    assert snapshot.cross_rates(ids[1:2], ids[2:3]).tolist() == [300.0]
+    assert CURRENCIES.lookup('NOT-A-CODE') == -1 and 'NOT-A-CODE' not in CURRENCIES.ids
+    assert np.isnan(snapshot.cross_rates([ids[1], -1], [-1, ids[2]])).all()
+    assert snapshot.matrix()[ids[1], ids[2]] == 300.0
+    assert snapshot.rates == {'USD': 1.0, 'EUR': 0.5, 'JPY': 150.0}
+    
+    result = ConversionResult(100, 'EUR', 'JPY', 30000.0, 300.0)
+    assert result['success'] and result['exchange_rate'] == 300.0
+    assert dict(result)['original_amount'] == 100
+    assert not hasattr(result, '__dict__')
+    
+    record = HistoryRecord(1.0, 'USD', 'EUR', 0.5, 0.5, '2024-01-01 00:00:00')
+    assert record['converted_amount'] == 0.5 and record.get('missing') is None
+    assert json.loads(json.dumps(record.as_dict()))['from_currency'] == 'USD'
+
+def test_convert_many(tmp_path, monkeypatch):
+    """Test vectorized batch conversion against a preloaded snapshot"""
+    from rate_snapshot import CURRENCIES
+    import numpy as np
+    
+    monkeypatch.chdir(tmp_path)
+    converter = CurrencyConverter()
+    converter.snapshot = RateSnapshot('USD', {'EUR': 0.5, 'JPY': 150.0})
+    
+    try:
+        result = converter.convert_many([10, 20, 30, 40], ['usd', 'EUR', 'USD', 'XXX'],
+                                        ['EUR', 'JPY', 'EUR', 'EUR'])
+        assert result[:3].tolist() == [5.0, 6000.0, 15.0]
+        assert str(result[3]) == 'nan'
+        assert len(converter.get_conversion_history(10)) == 3
+        
+        result = converter.convert_many([1, 2], 'EUR', 'USD', save_history=False)
+        assert result.tolist() == [2.0, 4.0]
+        assert len(converter.get_conversion_history(10)) == 3
+        
+        # Garbage input codes do not widen every rate table
+        known = len(CURRENCIES)
+        result = converter.convert_many([1] * 3, ['EUR', 'Q1', '??'], ['ZZ9', 'EUR', 'JPY'],
+                                        save_history=False)
+        assert np.isnan(result).all()
+        assert len(CURRENCIES) == known
+    finally:
+        converter.close()
+    
+    class DownProvider(RateProvider):
+        calls = 0
+        
+        def get_snapshot(self, base_currency):
+            DownProvider.calls += 1
+            raise RateProviderError('unreachable')
+    
+    # One failed fetch per call; every pair then falls back to stored rates
+    converter = CurrencyConverter(provider=DownProvider(), db_path=str(tmp_path / 'down.db'))
+    try:
+        converter._cache_rate('USD', 'EUR', 0.5)
+        result = converter.convert_many([10] * 6, ['USD', 'EUR', 'GBP', 'JPY', 'CAD', 'AUD'], 'EUR',
+                                        save_history=False)
+        assert result[0] == 5.0 and str(result[2]) == 'nan'
+        assert DownProvider.calls == 1
+    finally:
+        converter.close()
+
+def test_stream_conversions(tmp_path, monkeypatch):
+    """Test chunked CSV -> JSONL bulk conversion"""
+    monkeypatch.chdir(tmp_path)
+    converter = CurrencyConverter()
+    converter.snapshot = RateSnapshot('USD', {'EUR': 0.5, 'JPY': 150.0})
+    
+    input_stream = io.StringIO("amount,from,to\n100,USD,EUR\nabc,USD,EUR\n5,eur,jpy\n"
+                               "nan,USD,EUR\n1,USD,XXX\n2,,EUR\n")
+    output_stream = io.StringIO()
+    errors = io.StringIO()
+    
+    try:
+        total, rejected = stream_conversions(converter, input_stream, output_stream,
+                                             output_format='jsonl', chunk_size=2,
+                                             error_stream=errors)
+        lines = output_stream.getvalue().splitlines()
+        assert (total, rejected) == (3, 3)
+        assert '"converted_amount": 50.0' in lines[0]
+        assert '"from_currency": "EUR"' in lines[1]
+        assert '"converted_amount": null' in lines[2]
+        assert errors.getvalue().splitlines() == [
+            "Rejected input line 3: invalid amount 'abc'",
+            "Rejected input line 5: invalid amount 'nan'",
+            "Rejected input line 7: missing 'from' currency"]
+        
+        output_stream = io.StringIO()
+        assert stream_conversions(converter, io.StringIO('{"amount": 1, "from": "USD", "to": "EUR"}\n'
+                                                         '{"amount": 1,\n[1]\n'),
+                                  output_stream, 'jsonl', 'jsonl', error_stream=errors) == (1, 2)
+    finally:
+        converter.close()
+    
+    # Only malformed rows: nothing on stdout but the header, a count on stderr, exit 1
+    import subprocess
+    import sys
+    (tmp_path / 'bad.csv').write_text("amount,from,to\nabc,USD,EUR\n")
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli_interface.py')
+    result = subprocess.run([sys.executable, script, '--input', 'bad.csv', '--output', '-'],
+                            cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 1
+    assert result.stdout.splitlines() == ['amount,from_currency,to_currency,converted_amount']
+    assert 'Rejected 1 malformed rows' in result.stderr
+
+def test_historical_rates_db_first(tmp_path, monkeypatch):
+    """Test that only missing dates are fetched and fetched dates and misses are persisted"""
+    from datetime import datetime, timedelta
+    
+    monkeypatch.chdir(tmp_path)
+    converter = CurrencyConverter()
+    fetched_dates = []
+    no_data = (datetime.now() - timedelta(days=8)).strftime('%Y-%m-%d')
+    
+    def fake_fetch(base_currency, target_currency, date):
+        fetched_dates.append(date)
+        return (None if date == no_data else 0.9), True
+    
+    monkeypatch.setattr(converter, '_fetch_timeseries', lambda *args: {})
+    monkeypatch.setattr(converter, '_try_fetch_historical_rate', fake_fetch)
+    
+    try:
+        first = converter.get_historical_rates('USD', 'EUR', 5)
+        converter._store_rates('USD', 'EUR', {first[0]['date']: 0.95})
+        
+        fetched_dates.clear()
+        second = converter.get_historical_rates('usd', 'eur', 7)
+        
+        assert len(first) == 5
+        assert len(second) == 7
+        assert second[0]['rate'] == 0.95
+        assert len(fetched_dates) == 2
+        
+        # A date the provider has no rate for is asked about once
+        fetched_dates.clear()
+        assert len(converter.get_historical_rates('USD', 'EUR', 10)) == 9
+        assert len(converter.get_historical_rates('USD', 'EUR', 10)) == 9
+        assert sorted(fetched_dates) == sorted(
+            (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d') for days in (7, 8, 9))
+    finally:
+        converter.close()
+
+def test_http_transport_retries_and_reuse():
+    """Test retry on 503 and keep-alive connection reuse"""
+    calls = []
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def do_GET(self):
+            calls.append(self.path)
+            status = 503 if len(calls) == 1 else 200
+            body = b'{"success": true}'
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    transport = HttpTransport(backoff_factor=0.01)
+    url = f"http://127.0.0.1:{server.server_address[1]}/latest"
+    
+    try:
+        assert transport.get(url).status_code == 200
+        assert transport.get(url).status_code == 200
+        stats = transport.stats()
+        assert stats['retries'] == 1
+        assert stats['connections_opened'] == 1
+        assert stats['connections_reused'] == 2
+    finally:
+        transport.close()
+        server.shutdown()
+        server.server_close()
+
+def test_rate_limiter(tmp_path):
+    """Test token-bucket pacing, 429 backoff and a bucket shared through SQLite"""
+    from rate_limiter import RateLimiter
+    
+    calls = []
+    # Retry-After values to answer the next requests with
+    limits = ['0.3']
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def do_GET(self):
+            calls.append(time.monotonic())
+            retry_after = limits.pop() if limits else None
+            body = b'{"success": true}'
+            self.send_response(429 if retry_after else 200)
+            if retry_after:
+                self.send_header('Retry-After', retry_after)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"127.0.0.1:{server.server_address[1]}"
+    limiter = RateLimiter(host_rates={host: 20.0}, burst=1)
+    transport = HttpTransport(rate_limiter=limiter)
+    
+    try:
+        assert transport.get(f"http://{host}/latest").status_code == 200
+        assert calls[1] - calls[0] >= 0.29
+        bucket = limiter.bucket(f"http://{host}/")
+        assert bucket.throttles == 1 and 10.0 <= bucket.rate < 20.0
+        
+        start = time.monotonic()
+        for _ in range(4):
+            transport.get(f"http://{host}/latest")
+        assert time.monotonic() - start >= 0.25
+        assert transport.stats()['rate_limits'][host]['throttles'] == 1
+        
+        # The aiohttp path draws from the same kind of bucket and honours Retry-After
+        async def run():
+            limiter = RateLimiter(host_rates={host: 20.0}, burst=1)
+            async with AsyncCurrencyConverter(base_url=f"http://{host}", rate_limiter=limiter,
+                                              db_path=str(tmp_path / 'async.db')) as converter:
+                del calls[:]
+                limits.append('0.3')
+                assert await converter._get_json(f"http://{host}/latest", {}) == {'success': True}
+                assert calls[1] - calls[0] >= 0.29 and converter.upstream_requests == 2
+                assert limiter.bucket(f"http://{host}/").throttles == 1
+                
+                start = time.monotonic()
+                for _ in range(4):
+                    await converter._get_json(f"http://{host}/latest", {})
+                assert time.monotonic() - start >= 0.25
+        
+        asyncio.run(run())
+    finally:
+        transport.close()
+        server.shutdown()
+        server.server_close()
+    
+    shared = [RateLimiter(default_rate=5.0, burst=1, shared_db=str(tmp_path / 'limits.db'))
+              for _ in range(2)]
+    try:
+        assert shared[0].acquire('http://example.test/') == 0.0
+        assert shared[1].acquire('http://example.test/') > 0.1
+    finally:
+        for limiter in shared:
+            limiter.close()
+
+def test_async_converter_coalesces_requests(tmp_path, monkeypatch):
+    """Test that simultaneous identical lookups trigger one upstream fetch"""
+    monkeypatch.chdir(tmp_path)
+    
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(0.05)
+            body = json.dumps({'success': True, 'date': '2024-01-02',
+                               'rates': {'USD': 1.0, 'EUR': 0.5}}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    
+    async def run():
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        async with AsyncCurrencyConverter(base_url=base_url,
+                                          db_path=str(tmp_path / 'async.db')) as converter:
+            results = await asyncio.gather(*(converter.convert_currency(10, 'USD', 'EUR')
+                                             for _ in range(1000)))
+            assert {result.converted_amount for result in results} == {5.0}
+            assert results[0].source == 'fetched'
+            assert converter.upstream_requests == 1
+            
+            historical = await converter.get_historical_rates('USD', 'EUR', 5)
+            # Today's rate was stored by the conversion, so four dates are fetched
+            assert len(historical) == 5
+            assert converter.upstream_requests == 5
+            await converter.get_historical_rates('USD', 'EUR', 5)
+            assert converter.upstream_requests == 5
+        assert (tmp_path / 'async.db').exists()
+        assert not (tmp_path / 'currency_data.db').exists()
+        
+        # Any RateProvider works too, e.g. rate files for offline use
+        (tmp_path / 'rates').mkdir()
+        (tmp_path / 'rates' / '2024-01-02.json').write_text(
+            json.dumps({'base': 'USD', 'rates': {'EUR': 0.5, 'GBP': 0.25}}))
+        provider = FileRateProvider(str(tmp_path / 'rates'))
+        async with AsyncCurrencyConverter(provider=provider,
+                                          db_path=str(tmp_path / 'async.db')) as converter:
+            result = await converter.convert_currency(10, 'EUR', 'GBP')
+            assert result.converted_amount == 5.0
+            assert await converter.get_real_time_rate('USD', 'XXX') is None
+    
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_write_behind_history(tmp_path, monkeypatch):
+    """Test that history rows are buffered and flushed in batches"""
+    monkeypatch.chdir(tmp_path)
+    converter = CurrencyConverter(write_batch_size=3, write_flush_interval=0)
+    
+    try:
+        with converter.db_pool.connection() as conn:
+            journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        assert journal_mode == 'wal'
+        
+        converter._save_conversion_history(1, 'USD', 'EUR', 0.5, 0.5)
+        converter._save_conversion_history(2, 'USD', 'EUR', 1.0, 0.5)
+        assert converter._writer.pending() == 2
+        
+        converter._save_conversion_history(3, 'USD', 'EUR', 1.5, 0.5)
+        assert converter._writer.pending() == 0
+        assert converter._writer.flushes == 1
+        
+        converter._save_conversion_history(4, 'USD', 'EUR', 2.0, 0.5)
+        assert len(converter.get_conversion_history(10)) == 4
+        
+        # NaN conversions are never buffered
+        converter.snapshot = RateSnapshot('USD', {'EUR': 0.5})
+        converter.convert_currency(float('nan'), 'USD', 'EUR')
+        assert len(converter.get_conversion_history(10)) == 4
+        
+        # A row that cannot be written is dropped without blocking the rest
+        converter._writer.add_many(INSERT_HISTORY_SQL, [(5, 'USD', 'EUR', 2.5, 0.5),
+                                                        (6, 'USD', 'EUR', None, 0.5)])
+        converter._save_conversion_history(7, 'USD', 'EUR', 3.5, 0.5)
+        assert converter._writer.pending() == 0
+        assert converter._writer.rows_dropped == 1
+        assert [r.amount for r in converter.get_conversion_history(2)] == [7, 5]
+    finally:
+        converter.close()
+    
+    # While flushes keep failing the buffer stays bounded and add() does not raise
+    from write_behind import WriteBehindBuffer
+    conn = sqlite3.connect(':memory:')
+    writer = WriteBehindBuffer(conn, max_rows=3, flush_interval=0, max_pending=5)
+    for i in range(8):
+        writer.add('INSERT INTO missing_table VALUES (?)', (i,))
+    assert writer.pending() == 5 and writer.rows_dropped == 3
+    conn.execute('CREATE TABLE missing_table (value INTEGER)')
+    writer.flush()
+    assert writer.pending() == 0
+    assert [row[0] for row in conn.execute('SELECT value FROM missing_table')] == [0, 1, 2, 3, 4]
+    conn.close()
+
+def test_schema_migration_deduplicates_rates(tmp_path, monkeypatch):
+    """Test upgrading an unversioned database with duplicate rate rows"""
+    monkeypatch.chdir(tmp_path)
+    conn = sqlite3.connect('currency_data.db')
+    for statement in MIGRATIONS[0]:
+        conn.execute(statement)
+    conn.executemany('''
+        INSERT INTO exchange_rates (base_currency, target_currency, rate, date) VALUES (?, ?, ?, ?)
+    ''', [('USD', 'EUR', 0.8, '2024-01-01'), ('USD', 'EUR', 0.9, '2024-01-01'),
+          ('USD', 'EUR', 0.7, '2024-01-02')])
+    conn.commit()
+    conn.close()
+    
+    converter = CurrencyConverter()
+    try:
+        with converter.db_pool.connection() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            rows = conn.execute('SELECT date, rate FROM exchange_rates ORDER BY date').fetchall()
+        assert version == SCHEMA_VERSION
+        assert rows == [('2024-01-01', 0.9), ('2024-01-02', 0.7)]
+        
+        converter._store_rates('USD', 'EUR', {'2024-01-02': 0.75})
+        assert converter._get_stored_rates('USD', 'EUR', '2024-01-01', '2024-01-02') == {
+            '2024-01-01': 0.9, '2024-01-02': 0.75}
+    finally:
+        converter.close()
+
+def test_file_rate_provider(tmp_path):
+    """Test JSON and CSV snapshot files on disk"""
+    (tmp_path / '2024-01-01.json').write_text(json.dumps(
+        {'base': 'USD', 'rates': {'EUR': 0.5, 'JPY': 150.0}}))
+    (tmp_path / '2024-01-02.csv').write_text(
+        "base,currency,rate\nEUR,USD,2.5\nEUR,JPY,300\n")
+    provider = FileRateProvider(str(tmp_path))
+    
+    assert provider.get_rate('EUR', 'JPY', '2024-01-01') == 300.0
+    assert provider.get_rate('USD', 'EUR', '2024-01-02') == 0.4
+    assert provider.get_rate('USD', 'EUR', '2024-01-03') is None
+    assert provider.get_snapshot('USD').rate('USD', 'JPY') == 120.0
+    assert provider.get_range('USD', 'EUR', '2024-01-01', '2024-01-03') == {
+        '2024-01-01': 0.5, '2024-01-02': 0.4}
+    
+    # A missing path is a provider error, so the converter falls back to SQLite
+    missing = FileRateProvider(str(tmp_path / 'missing'))
+    with pytest.raises(RateProviderError):
+        missing.get_snapshot('USD')
+    converter = CurrencyConverter(provider=missing, db_path=str(tmp_path / 'fallback.db'))
+    try:
+        converter._cache_rate('USD', 'EUR', 0.5)
+        result = converter.convert_currency(10, 'USD', 'EUR')
+        assert result.converted_amount == 5.0 and result.source == 'database'
+        assert converter.get_historical_rates('USD', 'EUR', 3)[0]['rate'] == 0.5
+    finally:
+        converter.close()
+    
+    # Providers need only get_snapshot; past dates are then unavailable, not a crash
+    with pytest.raises(TypeError):
+        RateProvider()
+    
+    class LatestOnly(RateProvider):
+        def get_snapshot(self, base_currency):
+            return RateSnapshot('USD', {'EUR': 0.5}).rebase(base_currency)
+    
+    converter = CurrencyConverter(provider=LatestOnly(), db_path=str(tmp_path / 'latest.db'))
+    try:
+        assert converter.get_historical_rates('USD', 'EUR', 3) == [
+            {'date': time.strftime('%Y-%m-%d'), 'rate': 0.5}]
+        assert converter.convert_on_date(10, 'USD', 'EUR', '2024-01-02', date_policy='exact') is None
+    finally:
+        converter.close()
+    
+    # Malformed payloads are provider errors, not KeyErrors
+    class Response:
+        def __init__(self, data):
+            self.data, self.status_code = data, 200
+        
+        def raise_for_status(self):
+            pass
+        
+        def json(self):
+            return self.data
+    
+    class Transport:
+        data = None
+        
+        def get(self, url, params=None):
+            return Response(self.data)
+    
+    transport = Transport()
+    host = ExchangeRateHostProvider('http://rates.invalid', transport)
+    api = ExchangeRateApiProvider('http://rates.invalid/', transport=transport)
+    for data, call in (({'success': True}, lambda: host.get_rate('USD', 'EUR', '2024-01-02')),
+                       ([1, 2], lambda: host.get_snapshot('USD')),
+                       ({'rates': {'EUR': 0.5}}, lambda: api.get_snapshot('USD')),
+                       ({'base': 'USD', 'rates': {'EUR': 'x'}}, lambda: api.get_snapshot('USD'))):
+        transport.data = data
+        with pytest.raises(RateProviderError):
+            call()
+
+def test_converter_against_mock_server(mock_rates):
+    """Test conversions and historical backfill without network access"""
+    converter = mock_rates.converter()
+    api = CurrencyAPI(provider=mock_rates.provider())
+    
+    first = converter.convert_currency(100, 'EUR', 'JPY')
+    second = converter.convert_currency(100, 'GBP', 'CHF')
+    assert first and second
+    assert mock_rates.server.requests == 1
+    
+    result = api.convert_currency(100, 'EUR', 'JPY')
+    assert abs(result['converted_amount'] - first.converted_amount) < 1e-6
+    
+    historical = converter.get_historical_rates('EUR', 'JPY', 7)
+    assert len(historical) == 7
+    assert mock_rates.server.requests == 3
+    
+    # CurrencyAPI fetches missing dates with one time-series request and keeps
+    # past dates in a bounded cache
+    api = CurrencyAPI(provider=mock_rates.provider(), historical_cache_size=10)
+    assert [row['rate'] for row in api.get_historical_rates('EUR', 'JPY', 7)] == \
+        [row['rate'] for row in historical]
+    assert mock_rates.server.requests == 4
+    assert len(api.get_historical_rates('EUR', 'JPY', 7)) == 7
+    assert mock_rates.server.requests == 5  # today only
+    api.get_historical_rates('USD', 'GBP', 7)
+    assert len(api._historical_cache) == 10
+
+def test_convert_currency_result(mock_rates):
+    """Test that one lookup reports the rate, its source and its age"""
+    converter = mock_rates.converter()
+    
+    fetched = converter.convert_currency(100, 'usd', 'EUR')
+    assert fetched.source == 'fetched' and fetched.from_currency == 'USD'
+    assert fetched.converted_amount == pytest.approx(100 * fetched.rate)
+    
+    cached = converter.convert_currency(50, 'USD', 'EUR')
+    other = converter.convert_currency(50, 'GBP', 'JPY')
+    assert (cached.source, other.source) == ('cache', 'snapshot')
+    assert cached.rate == fetched.rate and 0 <= cached.age < 60
+    assert other['exchange_rate'] == other.rate
+    
+    assert mock_rates.server.requests == 1
+    assert converter.stats()['cache']['hits'] == 1
+    
+    # A cached rate keeps the age and timestamp of the table it came from,
+    # even after the converter has moved on to a newer table
+    old = RateSnapshot('USD', {'EUR': 0.5}, '2024-01-02')
+    old.fetched_at -= 100
+    converter = mock_rates.converter()
+    converter.snapshot = old
+    first = converter.convert_currency(10, 'USD', 'EUR')
+    converter.snapshot = RateSnapshot('USD', {'EUR': 0.6}, '2024-01-03')
+    again = converter.convert_currency(10, 'USD', 'EUR')
+    assert (first.source, again.source) == ('snapshot', 'cache')
+    assert again.rate == 0.5 and again.timestamp == '2024-01-02' and again.age >= 100
+
+def test_benchmark_suite_smoke():
+    """Test that the benchmark suite runs offline and reports JSON-ready results"""
+    report = run_benchmarks(['single', 'historical'], days_list=[3])
+    
+    names = [result['benchmark'] for result in report['results']]
+    assert names.count('single_conversion') == 2
+    assert names.count('historical_rates') == 2
+    json.dumps(report)
+
+def test_converter_stats(mock_rates):
+    """Test latency histograms, counters and the Prometheus dump"""
+    converter = mock_rates.converter(transport=mock_rates.transport)
+    
+    converter.convert_currency(100, 'USD', 'EUR')
+    converter.convert_currency(100, 'USD', 'EUR')
+    converter.get_conversion_history(5)
+    
+    stats = converter.stats()
+    assert stats['histograms']['conversion_seconds']['count'] == 2
+    assert stats['histograms']['http_fetch_seconds']['count'] == 1
+    assert stats['histograms']['sqlite_write_seconds']['count'] == 1
+    assert stats['counters']['conversions'] == 2
+    assert stats['cache']['hits'] == 1
+    assert stats['transport']['connections_opened'] == 1
+    
+    text = converter.prometheus_metrics()
+    assert 'currency_converter_conversions_total 2' in text
+    assert '# TYPE currency_converter_cache_hits_total counter' in text
+    assert 'currency_converter_cache_hits_total 1' in text
+    assert 'currency_converter_http_connections_opened_total 1' in text
+    assert '# TYPE currency_converter_cache_size gauge' in text
+    assert 'currency_converter_conversion_seconds_count 2' in text
+
+def test_converter_shared_across_threads(mock_rates, tmp_path):
+    """Test one converter instance serving 32 threads"""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    converter = mock_rates.converter(db_path=str(tmp_path / 'shared.db'))
+    
+    def work(worker):
+        results = [converter.convert_currency(1, 'USD', code)
+                   for code in ('EUR', 'GBP', 'JPY') * 20]
+        converter.get_conversion_history(5)
+        return results
+    
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = [r for batch in pool.map(work, range(32)) for r in batch]
+    
+    assert None not in results
+    assert mock_rates.server.requests == 1
+    converter._writer.flush()
+    with converter.db_pool.connection() as conn:
+        count = conn.execute('SELECT COUNT(*) FROM conversion_history').fetchone()[0]
+    assert count == 32 * 60
+    # 32 threads shared the pool's few connections instead of opening one each
+    assert converter.db_pool.connections_opened <= converter.db_pool.max_size
+    assert os.path.exists(tmp_path / 'shared.db')
+
+def test_sqlite_connection_pool(tmp_path):
+    """Test that short-lived threads borrow from a bounded set of connections"""
+    from sqlite_pool import SQLiteConnectionPool
+
+    pool = SQLiteConnectionPool(str(tmp_path / 'pool.db'), max_size=3, timeout=0.2)
+
+    def work():
+        with pool.connection() as conn:
+            conn.execute('SELECT COUNT(*) FROM conversion_history').fetchone()
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=work) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool.connections_opened <= 3
+    assert pool.stats()['checkouts'] == 50
+
+    with pool.connection() as conn:
+        # Nested checkouts on one thread share its connection
+        with pool.connection() as nested:
+            assert nested is conn
+        # An open transaction is rolled back when the connection is returned
+        conn.execute("INSERT INTO missing_rates VALUES ('USD', 'EUR', '2024-01-01')")
+    with pool.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM missing_rates').fetchone()[0] == 0
+
+    # With every connection lent out, a further checkout times out
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.connection():
+            held.set()
+            release.wait()
+
+    holders = [threading.Thread(target=hold) for _ in range(3)]
+    for thread in holders:
+        held.clear()
+        thread.start()
+        assert held.wait(5)
+    with pytest.raises(sqlite3.OperationalError):
+        with pool.connection():
+            pass
+    release.set()
+    for thread in holders:
+        thread.join()
+    assert len(pool) == 3
+
+    pool.close()
+    assert len(pool) == 0
+
+def test_conversion_service(mock_rates):
+    """Test the HTTP service's single, streamed batch and history endpoints"""
+    from urllib.error import HTTPError
+    from urllib.request import urlopen, Request
+    from conversion_service import ConversionService
+    
+    service = ConversionService(mock_rates.converter(), port=0, batch_chunk_size=1000)
+    service.warm_up()
+    thread = threading.Thread(target=service._server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with urlopen(f"{service.url}/convert?amount=100&from=usd&to=EUR") as response:
+            single = json.loads(response.read())
+        assert single['to_currency'] == 'EUR' and single['converted_amount'] > 0
+        
+        rows = [{'amount': i, 'from': 'USD', 'to': ('EUR', 'GBP', 'XXX')[i % 3]}
+                for i in range(3000)]
+        request = Request(f"{service.url}/convert/batch?save_history=false",
+                          data=json.dumps(rows).encode(), method='POST')
+        with urlopen(request) as response:
+            assert response.headers['Transfer-Encoding'] == 'chunked'
+            results = json.loads(response.read())
+        assert len(results) == 3000
+        assert results[1]['converted_amount'] > 0
+        assert results[2]['converted_amount'] is None
+        assert mock_rates.server.requests == 1
+        
+        with urlopen(f"{service.url}/history?limit=5") as response:
+            history = json.loads(response.read())
+        assert len(history) == 1 and history[0]['from_currency'] == 'USD'
+        
+        # Requests run on the worker pool and reuse its database connections
+        for _ in range(50):
+            with urlopen(f"{service.url}/history?limit=1") as response:
+                response.read()
+        pool = service.converter.db_pool
+        assert pool.connections_opened <= pool.max_size
+        
+        for amount in ('nan', 'inf', '-Infinity'):
+            with pytest.raises(HTTPError) as error:
+                urlopen(f"{service.url}/convert?amount={amount}&from=USD&to=EUR")
+            assert error.value.code == 400
+        request = Request(f"{service.url}/convert/batch",
+                          data=b'[{"amount": NaN, "from": "USD", "to": "EUR"}]', method='POST')
+        with pytest.raises(HTTPError) as error:
+            urlopen(request)
+        assert error.value.code == 400
+    finally:
+        service.shutdown()
+
+def test_background_refresher(mock_rates, tmp_path):
+    """Test refresh-ahead, stale reads while refreshing, and the SQLite fallback"""
+    db_path = str(tmp_path / 'refresh.db')
+    server = mock_rates.server
+    converter = mock_rates.converter(cache_ttl=0.3, db_path=db_path, background_refresh=True,
+                                     max_stale=30)
+    assert converter.convert_currency(100, 'USD', 'EUR')
+    time.sleep(1.0)
+    assert converter.refresher.refreshes >= 3
+    assert server.requests == converter.refresher.refreshes
+    
+    # An expired table is still served while the refresher is running
+    converter.snapshot.fetched_at -= 10
+    before = server.requests
+    assert converter.convert_currency(100, 'EUR', 'GBP').source == 'stale_snapshot'
+    assert server.requests == before
+    assert converter.stats()['counters']['stale_snapshot_reads'] >= 1
+    
+    # ...but not beyond max_stale: stored rates are used instead
+    converter.snapshot.fetched_at -= 60
+    assert converter.convert_currency(100, 'USD', 'JPY').source == 'database'
+    assert server.requests == before
+    assert converter.stats()['counters']['stale_snapshot_rejections'] >= 1
+    
+    # A rate looked up in the previous cache generation is not cached after a swap
+    generation = converter.rate_cache.generation
+    converter._install_snapshot(RateSnapshot('USD', {'EUR': 0.5}))
+    converter.rate_cache.set('USD', 'CHF', 0.9, generation=generation)
+    assert converter.rate_cache.get('USD', 'CHF') is None
+    
+    # Once the API is gone, a new process starts from the rates stored in SQLite
+    converter.close()
+    
+    class DownProvider(RateProvider):
+        def get_snapshot(self, base_currency):
+            raise RateProviderError('provider is down')
+    
+    converter = CurrencyConverter(provider=DownProvider(), db_path=db_path,
+                                  background_refresh=True)
+    try:
+        time.sleep(0.2)
+        assert converter.refresher.failures >= 1
+        assert converter.snapshot is not None
+        assert converter.convert_currency(100, 'USD', 'JPY')
+    finally:
+        converter.close()
+
+def test_shared_snapshot_file(mock_rates, tmp_path):
+    """Test one fetch per host through the memory-mapped snapshot file"""
+    import subprocess
+    import sys
+    from snapshot_file import RateSnapshotFile
+    
+    path = str(tmp_path / 'rates.bin')
+    server = mock_rates.server
+    converters = [mock_rates.converter(snapshot_file=path) for _ in range(3)]
+    reader = RateSnapshotFile(path)
+    assert reader.snapshot() is None
+    
+    results = [converter.convert_currency(100, 'EUR', 'JPY') for converter in converters]
+    assert server.requests == 1
+    amounts = [result.converted_amount for result in results]
+    assert max(amounts) - min(amounts) < 1e-9
+    
+    # Readers pick up an atomically swapped file on their next access
+    first = reader.snapshot()
+    assert first.rate('EUR', 'JPY') * 100 == pytest.approx(amounts[0])
+    reader.write(RateSnapshot('USD', {'EUR': 0.5, 'JPY': 100.0}), '2020-01-01')
+    assert reader.snapshot('2020-01-01').rate('EUR', 'JPY') == 200.0
+    assert reader.dates[0] == '2020-01-01' and len(reader.dates) == 2
+    
+    # A fresh process learns the codes in column order and maps rows without copying
+    code = ("from snapshot_file import RateSnapshotFile; "
+            f"snapshot = RateSnapshotFile({path!r}).snapshot('2020-01-01'); "
+            "print(snapshot.rate('EUR', 'JPY'), snapshot.values.flags.writeable)")
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    assert output.stdout.strip() == '200.0 False'
+    
+    # A corrupt or truncated file is replaced on the next fetch instead of failing forever
+    for damage in (b'garbage' * 10, b'CCRS'):
+        with open(path, 'wb') as f:
+            f.write(damage)
+        with pytest.raises(ValueError):
+            RateSnapshotFile(path).snapshot()
+        converter = mock_rates.converter(snapshot_file=path)
+        assert converter.convert_currency(100, 'EUR', 'JPY') is not None
+        assert RateSnapshotFile(path).snapshot().rate('EUR', 'JPY') > 0
+
+# Import budget for the read-only CLI commands, well above the ~40ms they take
+# without NumPy and requests and well below the ~200ms they took with them
+CLI_IMPORT_BUDGET_US = 120000
+
+def test_cli_read_only_startup(tmp_path):
+    """Test that --history/--cached skip the HTTP stack, NumPy and schema setup cost"""
+    import subprocess
+    import sys
+    
+    converter = CurrencyConverter(db_path=str(tmp_path / 'currency_data.db'))
+    converter._store_rates('USD', 'EUR', {'2024-01-02': 0.9})
+    converter.close()
+    
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli_interface.py')
+    for command in (['--history'], ['--cached', '--amount', '10', '--from', 'USD', '--to', 'EUR']):
+        result = subprocess.run([sys.executable, '-X', 'importtime', script] + command,
+                                cwd=tmp_path, capture_output=True, text=True, check=True)
+        
+        imported = {}
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and '|' in line:
+                _, cumulative, name = line.split('|')
+                if cumulative.strip().isdigit():
+                    imported[name.strip()] = int(cumulative)
+        
+        assert not {'numpy', 'requests', 'aiohttp'} & set(imported)
+        assert imported['currency_converter'] < CLI_IMPORT_BUDGET_US
+    
+    assert 'from 2024-01-02' in result.stdout
+
+def test_convert_historical_many(mock_rates):
+    """Test per-row booking dates, the business-day policy and one backfill per pair"""
+    import numpy as np
+    
+    server = mock_rates.server
+    converter = mock_rates.converter()
+    
+    # 2024-03-08 is a Friday, 2024-03-09/10 the weekend after it
+    dates = ['2024-03-08', '2024-03-09', '2024-03-10', '2024-03-11'] * 500
+    result = converter.convert_historical_many(
+        np.ones(len(dates)), (['USD'] * 4 + ['EUR'] * 4) * 250, 'JPY', dates)
+    assert not np.isnan(result).any()
+    assert result[0] == result[1] == result[2] != result[3]
+    assert server.requests == 2
+    
+    again = converter.convert_historical_many([1.0, 1.0], 'USD', 'JPY',
+                                              np.array(['2024-03-10', '2024-03-08'],
+                                                       dtype='datetime64[D]'))
+    assert again[0] == again[1] == result[0]
+    assert server.requests == 2
+    
+    holiday = converter.convert_historical_many([1.0], 'USD', 'JPY', '2024-03-11',
+                                                holidays=['2024-03-11'])
+    assert holiday[0] == result[0]
+    exact = converter.convert_on_date(1.0, 'USD', 'JPY', '2024-03-09', date_policy='exact')
+    assert exact is not None and exact != result[0]
+    
+    with pytest.raises(ValueError):
+        converter.convert_historical_many([1.0], 'USD', 'JPY', '2024-03-11',
+                                          date_policy='nearest')
+
+def test_rate_analytics(tmp_path):
+    """Test rolling analytics against numpy recomputation and incremental updates"""
+    import numpy as np
+    from datetime import date, timedelta
+    
+    (tmp_path / 'rates').mkdir()
+    recent = [(date.today() - timedelta(days=i)).isoformat() for i in range(30)]
+    for i, day in enumerate(recent):
+        (tmp_path / 'rates' / f'{day}.json').write_text(
+            json.dumps({'base': 'EUR', 'rates': {'CHF': 0.9 + i / 1000}}))
+    converter = CurrencyConverter(provider=FileRateProvider(str(tmp_path / 'rates')),
+                                  db_path=str(tmp_path / 'analytics.db'))
+    try:
+        start = date(2022, 1, 1)
+        days = [(start + timedelta(days=i)).isoformat() for i in range(400)]
+        rates = 1.1 + 0.05 * np.sin(np.arange(400) / 9.0)
+        converter._store_rates('EUR', 'USD', dict(zip(days[:-1], rates[:-1].tolist())))
+        
+        analytics = converter.analytics
+        latest = analytics.latest('eur', 'usd', window=20)
+        assert latest['count'] == 20 and latest['last'] == rates[-2]
+        
+        # One new day only feeds the rolling window and the series tail
+        converter._store_rates('EUR', 'USD', {days[-1]: float(rates[-1])})
+        latest = analytics.latest('EUR', 'USD', window=20)
+        window = rates[-20:]
+        returns = np.diff(np.log(rates[-21:]))
+        assert latest['mean'] == pytest.approx(window.mean())
+        assert latest['min'] == window.min() and latest['max'] == window.max()
+        assert latest['volatility'] == pytest.approx(np.std(returns, ddof=1))
+        
+        # A revised rate for the last day replaces it
+        converter._store_rates('EUR', 'USD', {days[-1]: 2.0})
+        assert analytics.latest('EUR', 'USD', window=20)['max'] == 2.0
+        converter._store_rates('EUR', 'USD', {days[-1]: float(rates[-1])})
+        
+        series = analytics.series('EUR', 'USD')
+        assert len(series) == 400
+        average = series.moving_average(7)
+        assert np.isnan(average[:6]).all()
+        assert average[-1] == pytest.approx(rates[-7:].mean())
+        assert series.rolling_min(7)[-1] == rates[-7:].min()
+        assert series.percent_change(1)[-1] == pytest.approx((rates[-1] / rates[-2] - 1) * 100)
+        
+        report = analytics.report('EUR', 'USD', days=30, window=7, backfill=False)
+        assert [row['date'] for row in report['rows']] == days[-30:]
+        assert report['rows'][0]['moving_average'] is not None
+        assert report['summary']['max'] == pytest.approx(rates[-30:].max())
+        assert report['summary']['change_pct'] == pytest.approx((rates[-1] / rates[-30] - 1) * 100)
+        
+        # A past date revised by another writer shows up in the next report
+        converter._store_rates('EUR', 'USD', {days[-10]: 5.0})
+        report = analytics.report('EUR', 'USD', days=30, window=7, backfill=False)
+        assert report['rows'][-10]['rate'] == 5.0 and report['summary']['max'] == 5.0
+        
+        # A longer report backfills dates before the held ones and includes them
+        assert len(analytics.report('EUR', 'CHF', days=5)['rows']) == 5
+        report = analytics.report('EUR', 'CHF', days=30, window=5)
+        assert [row['date'] for row in report['rows']] == recent[::-1]
+        assert report['rows'][0]['rate'] == pytest.approx(0.929)
+        assert analytics.latest('EUR', 'CHF', window=5)['min'] == pytest.approx(0.9)
+    finally:
+        converter.close()
+
+def test_history_export(tmp_path):
+    """Test keyset-paginated history iteration, its filters and CSV/JSONL export"""
+    converter = CurrencyConverter(db_path=str(tmp_path / 'export.db'))
+    try:
+        # Three rows share each timestamp, so pages split between equal keys
+        with converter.db_pool.connection() as conn:
+            conn.executemany('''
+                INSERT INTO conversion_history
+                (amount, from_currency, to_currency, converted_amount, rate, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(i, ['USD', 'GBP'][i % 2], 'EUR', i * 0.9, 0.9,
+                   f'2024-01-{1 + i // 3:02d} 12:00:00') for i in range(60)])
+            conn.commit()
+        converter._save_conversion_history(1000, 'USD', 'EUR', 900, 0.9)
+        
+        amounts = [r.amount for r in converter.iter_conversion_history(batch_size=4)]
+        assert amounts == list(range(60)) + [1000]
+        
+        ranged = list(converter.iter_conversion_history('2024-01-05', '2024-01-10',
+                                                        from_currency='usd', batch_size=2))
+        assert [r.amount for r in ranged] == [i for i in range(12, 27) if i % 2 == 0]
+        assert all(r.from_currency == 'USD' for r in ranged)
+        
+        output = io.StringIO()
+        assert export_history(converter, output, 'csv', end='2024-01-02') == 3
+        lines = output.getvalue().splitlines()
+        assert lines[0] == 'amount,from_currency,to_currency,converted_amount,rate,timestamp'
+        assert lines[1] == '0.0,USD,EUR,0.0,0.9,2024-01-01 12:00:00'
+        
+        output = io.StringIO()
+        assert export_history(converter, output, 'jsonl', start='2024-01-20', to_currency='EUR') == 4
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert rows[0] == {'amount': 57.0, 'from_currency': 'GBP', 'to_currency': 'EUR',
+                           'converted_amount': 57 * 0.9, 'rate': 0.9,
+                           'timestamp': '2024-01-20 12:00:00'}
+        assert rows[-1]['amount'] == 1000
+    finally:
+        converter.close()
+
+def test_database_maintenance(tmp_path):
+    """Test history roll-up, rate retention and space reclamation"""
+    from datetime import datetime, timedelta, timezone
+    from db_maintenance import run_maintenance
+    
+    def days_ago(days):
+        return datetime.now(timezone.utc) - timedelta(days=days)
+    
+    converter = CurrencyConverter(db_path=str(tmp_path / 'maintenance.db'))
+    try:
+        with converter.db_pool.connection() as conn:
+            conn.executemany('''
+                INSERT INTO conversion_history
+                (amount, from_currency, to_currency, converted_amount, rate, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(10.0, 'USD', ['EUR', 'GBP'][i % 2], 9.0, 0.9 + (i % 3) / 100,
+                   (days_ago(100 + i % 50) + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S'))
+                  for i in range(20000)])
+            conn.commit()
+        converter._store_rates('USD', 'EUR', {days_ago(days).date().isoformat(): 0.9
+                                              for days in range(0, 800)})
+        for _ in range(5):
+            converter._save_conversion_history(10, 'USD', 'EUR', 9, 0.9)
+        converter._writer.flush()
+        
+        # Small batches split days across transactions; their totals still merge
+        with converter.db_pool.connection() as conn:
+            result = run_maintenance(conn, retention_days=90, rate_retention_days=365,
+                                     batch_rows=777)
+        assert result['history_rows_rolled_up'] == 20000
+        assert result['rate_rows_deleted'] == 800 - 366
+        assert result['vacuum'] == 'incremental'
+        assert result['bytes_reclaimed'] > 0
+        assert result['bytes_after'] == result['bytes_before'] - result['bytes_reclaimed']
+        
+        assert len(converter.get_conversion_history(100)) == 5
+        daily = converter.get_daily_history(from_currency='usd', to_currency='eur')
+        assert len(daily) == 25
+        assert sum(day['conversions'] for day in daily) == 10000
+        assert daily[0]['total_amount'] == 10.0 * daily[0]['conversions']
+        assert daily[0]['min_rate'] == 0.9 and daily[0]['max_rate'] == 0.92
+        
+        again = converter.maintain()
+        assert again['history_rows_rolled_up'] == 0 and again['rate_rows_deleted'] == 0
+    finally:
+        converter.close()
+    
+    # Databases created without auto_vacuum are converted with one full VACUUM
+    legacy = sqlite3.connect(str(tmp_path / 'legacy.db'))
+    for statement in MIGRATIONS[0]:
+        legacy.execute(statement)
+    legacy.commit()
+    legacy.close()
+    converter = CurrencyConverter(db_path=str(tmp_path / 'legacy.db'))
+    try:
+        converter.start_maintenance(interval=3600)
+        deadline = time.time() + 5
+        while converter.maintenance.runs == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert converter.stats()['maintenance']['last_result']['vacuum'] == 'full'
+        with converter.db_pool.connection() as conn:
+            assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    finally:
+        converter.close()
+
 if __name__ == "__main__":
-    test_currency_converter()
\ No newline at end of file
+    test_currency_converter()
+    test_rate_cache()
+    test_rate_snapshot_triangulation()
@@ -0,0 +1,163 @@
+"""
+Write-behind buffer that groups SQLite inserts into batched transactions
+"""
+
+import contextlib
+import sqlite3
+import threading
+from typing import Optional, Dict, List, Iterable, Union
+
+from instrumentation import Metrics
+from sqlite_pool import SQLiteConnectionPool
+
+
+class WriteBehindBuffer:
+    def __init__(self, connection: Union[sqlite3.Connection, SQLiteConnectionPool],
+                 max_rows: int = 100, flush_interval: float = 0.5,
+                 metrics: Optional[Metrics] = None, max_pending: int = 10000):
+        """
+        Buffer rows for ``connection`` and write them with executemany
+
+        ``connection`` is a connection or a pool; with a pool each flush checks
+        a connection out for its transaction. A flush happens once ``max_rows`` rows are pending, every
+        ``flush_interval`` seconds from a background thread, and on close().
+        On a crash at most ``max_rows - 1`` rows, written within the last
+        ``flush_interval`` seconds, can be lost. ``max_rows=1`` writes through.
+
+        While flushes fail (e.g. a locked database) rows are kept and retried
+        on every flush, but at most ``max_pending`` of them: further rows are
+        dropped and counted in ``rows_dropped`` and the sqlite_rows_dropped
+        metric, and up to ``max_pending`` rows can be lost on a crash. Failed
+        automatic flushes are reported, not raised to the caller of add().
+
+        A single connection must be opened with ``check_same_thread=False``
+        when a flush interval is used. Flush latency is recorded in ``metrics``.
+        """
+        if isinstance(connection, SQLiteConnectionPool):
+            self._get_connection = connection.connection
+        else:
+            self._get_connection = lambda: contextlib.nullcontext(connection)
+        self.max_rows = max(1, max_rows)
+        self.max_pending = max(self.max_rows, max_pending)
+        self.flush_interval = flush_interval
+        self.metrics = metrics or Metrics(enabled=False)
+        self.lock = threading.RLock()
+        self._pending: Dict[str, List[tuple]] = {}
+        self._pending_rows = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self._overflowing = False
+        self._failing = False
+        self._stop = threading.Event()
+        self._thread = None
+
+        if flush_interval and flush_interval > 0 and self.max_rows > 1:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def add(self, sql: str, row: tuple):
+        """Queue one row for the given INSERT statement"""
+        self.add_many(sql, [row])
+
+    def add_many(self, sql: str, rows: Iterable[tuple]):
+        """Queue rows for the given INSERT statement"""
+        with self.lock:
+            rows = list(rows)
+            room = max(0, self.max_pending - self._pending_rows)
+            if len(rows) > room:
+                self._overflow(len(rows) - room)
+                rows = rows[:room]
+
+            self._pending.setdefault(sql, []).extend(rows)
+            self._pending_rows += len(rows)
+
+            if self._pending_rows >= self.max_rows:
+                self._try_flush()
+
+    def _try_flush(self):
+        """Flush, reporting errors instead of raising them; failed rows stay pending"""
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            self.metrics.inc('sqlite_flush_errors')
+            if not self._failing:
+                print(f"Error flushing buffered writes: {e}")
+                self._failing = True
+
+    def flush(self):
+        """
+        Write all pending rows in a single transaction
+
+        If a row cannot be written (a constraint or binding error), the batch
+        is rolled back and retried row by row; rows that fail again are logged
+        and dropped so they cannot block the buffer. On other errors (locked
+        database, I/O) nothing is dropped and the error is raised.
+        """
+        with self.lock:
+            if not self._pending_rows:
+                return
+
+            dropped = 0
+            with self.metrics.timer('sqlite_write_seconds'), self._get_connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    try:
+                        for sql, rows in self._pending.items():
+                            cursor.executemany(sql, rows)
+                    except (sqlite3.IntegrityError, sqlite3.InterfaceError,
+                            sqlite3.ProgrammingError):
+                        connection.rollback()
+                        dropped = self._write_rows_singly(cursor)
+                    connection.commit()
+                except sqlite3.Error:
+                    connection.rollback()
+                    raise
+
+            written = self._pending_rows - dropped
+            self.metrics.inc('sqlite_rows_written', written)
+            if dropped:
+                self.metrics.inc('sqlite_rows_dropped', dropped)
+
+            self.flushes += 1
+            self.rows_written += written
+            self.rows_dropped += dropped
+            self._pending.clear()
+            self._pending_rows = 0
+            self._overflowing = False
+            self._failing = False
+
+    def _overflow(self, count: int):
+        """Drop rows that do not fit while flushes are failing"""
+        if not self._overflowing:
+            print(f"Write-behind buffer full ({self.max_pending} rows pending), dropping new rows")
+            self._overflowing = True
+        self.rows_dropped += count
+        self.metrics.inc('sqlite_rows_dropped', count)
+
+    def _write_rows_singly(self, cursor: sqlite3.Cursor) -> int:
+        """Insert pending rows one at a time, skipping bad ones; returns the number skipped"""
+        dropped = 0
+        for sql, rows in self._pending.items():
+            for row in rows:
+                try:
+                    cursor.execute(sql, row)
+                except (sqlite3.IntegrityError, sqlite3.InterfaceError,
+                        sqlite3.ProgrammingError) as e:
+                    print(f"Dropping buffered row {row!r}: {e}")
+                    dropped += 1
+        return dropped
+
+    def pending(self) -> int:
+        return self._pending_rows
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._try_flush()
+
+    def close(self):
+        """Stop the flush thread and write what is left"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()